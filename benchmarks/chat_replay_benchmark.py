@@ -0,0 +1,135 @@
+"""
+End-to-end /chat latency benchmark on recorded model responses, with no network access.
+
+Each request goes through the Flask test client, so routing, prompt building, sandbox execution and serialization
+are all measured. Model calls are replayed from --recording twice: with the recorded inter-chunk delays
+(realistic end-to-end latency) and with zero delays, where what is left of a turn is our own overhead.
+
+A recording comes from a live run of this script with --record (needs GEMINI_API_KEY), or from --synthesize, which
+records canned code_gen programs streamed after --synthetic-ms of fake model latency, so the replay path can
+be exercised anywhere.
+
+Usage (from the repo root):
+  python benchmarks/chat_replay_benchmark.py --record [--recording PATH] [--mode code_gen|planner]
+  python benchmarks/chat_replay_benchmark.py --synthesize [--recording PATH]
+  python benchmarks/chat_replay_benchmark.py [--recording PATH] [--mode code_gen|planner] [--repeat N]
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import statistics
+import sys
+import time
+import warnings
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'unused')
+
+_MESSAGES = [
+  "what's my checking balance?",
+  "how much did I spend on dining out last month?",
+  "list my subscriptions",
+  "what is my income this month?",
+]
+
+_SYNTHETIC_PROGRAMS = [
+  "```python\ndef process_input():\n  df = retrieve_depository_accounts()\n  return True, df[['account_name', 'balance_current']].to_string()\n```",
+  "```python\ndef process_input():\n  df = retrieve_spending_transactions()\n  return True, f'{len(df)} rows'\n```",
+  "```python\ndef process_input():\n  df = retrieve_subscriptions()\n  return True, f'{len(df)} rows'\n```",
+  "```python\ndef process_input():\n  df = retrieve_income_transactions()\n  return True, f'{len(df)} rows'\n```",
+]
+
+
+class _SyntheticModels:
+  """Streams the canned program for each message in 16-character chunks after ``latency_ms``"""
+
+  def __init__(self, latency_ms: float):
+    self.latency_ms = latency_ms
+
+  def generate_content_stream(self, model, contents, config):
+    from google.genai import types
+    prompt = contents[-1].parts[-1].text
+    program = next((p for m, p in zip(_MESSAGES, _SYNTHETIC_PROGRAMS) if m in prompt), _SYNTHETIC_PROGRAMS[0])
+    time.sleep(self.latency_ms / 1000)
+    for start in range(0, len(program), 16):
+      time.sleep(0.005)
+      yield types.GenerateContentResponse(candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part.from_text(text=program[start:start + 16])]))])
+    yield types.GenerateContentResponse(usage_metadata=types.GenerateContentResponseUsageMetadata(prompt_token_count=5000, candidates_token_count=40))
+
+
+def _chat(client, mode: str, model: str, username: str) -> list[dict]:
+  timings = []
+  for message in _MESSAGES:
+    with contextlib.redirect_stdout(io.StringIO()):
+      response = client.post('/chat', json={'message': message, 'username': username, 'model': model, 'mode': mode,
+                                            'messages': [{'role': 'user', 'content': message}]})
+    body = response.get_json()
+    if response.status_code != 200:
+      raise RuntimeError(body.get('error'))
+    timings.append({**body['timing'], 'execution_success': body.get('execution_success')})
+  return timings
+
+
+def _summary(timings: list[dict]) -> str:
+  total = [t['total_processing_time'] for t in timings]
+  model = [sum(call['duration_ms'] for call in t['gemini_api_calls']) for t in timings]
+  succeeded = sum(1 for t in timings if t['execution_success'])
+  return f"{succeeded}/{len(timings)} ok  mean /chat {statistics.mean(total):7.1f}ms  p50 {statistics.median(total):7.1f}ms  max {max(total):7.1f}ms  (model stream {statistics.mean(model):7.1f}ms)"
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--recording', default='benchmarks/chat_recording.jsonl', help='JSONL recording to write or replay')
+  parser.add_argument('--record', action='store_true', help='record live model responses (needs GEMINI_API_KEY)')
+  parser.add_argument('--synthesize', action='store_true', help='record canned responses from a fake model')
+  parser.add_argument('--synthetic-ms', type=float, default=800.0, help='fake model latency before the first chunk')
+  parser.add_argument('--mode', default='code_gen', choices=['code_gen', 'planner'], help='/chat mode')
+  parser.add_argument('--model', default='gemini-2.0-flash', help='model name sent to /chat')
+  parser.add_argument('--user', default='HeavyDataUser', help='seeded username to chat as')
+  parser.add_argument('--repeat', type=int, default=3, help='passes over the messages per replay timing')
+  args = parser.parse_args()
+  warnings.filterwarnings('ignore')
+
+  # The transport is chosen before any client exists; replays tolerate prompts that embed a different date
+  recording_run = args.record or args.synthesize
+  if recording_run and os.path.exists(args.recording):
+    os.remove(args.recording)
+  os.environ['PENNY_LLM_TRANSPORT'] = 'record' if recording_run else 'replay'
+  os.environ['PENNY_LLM_RECORDING'] = args.recording
+  os.environ['PENNY_LLM_REPLAY_STRICT'] = '0'
+  os.environ.setdefault('PENNY_PROMPT_CACHE', 'off')
+  os.environ.setdefault('PENNY_CODE_CACHE_SIZE', '0')
+
+  with contextlib.redirect_stdout(io.StringIO()):
+    import flask_app
+  from penny.tool_funcs import llm_transport
+  logging.disable(logging.INFO)
+
+  client = flask_app.app.test_client()
+  if args.synthesize:
+    transport = llm_transport.get_llm_transport()
+    fake = _SyntheticModels(args.synthetic_ms)
+    agent = flask_app.create_gemini_agent_code_gen(args.model)
+    agent.client = llm_transport.TransportClient(transport, lambda: SimpleNamespace(models=fake))
+  if recording_run:
+    timings = _chat(client, args.mode, args.model, args.user)
+    print(f"recorded {llm_transport.get_llm_transport_stats()['recorded']} model calls to {args.recording}")
+    print(f"live      {_summary(timings)}")
+    return
+
+  transport = llm_transport.get_llm_transport()
+  for timing in ('recorded', 'zero'):
+    transport.replay_timing = timing
+    timings = []
+    for _ in range(args.repeat):
+      transport.rewind()
+      timings += _chat(client, args.mode, args.model, args.user)
+    print(f"{timing:<9} {_summary(timings)}")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,118 @@
+"""
+Benchmark forecast_utils._consolidate_parent_categories against the previous per-date/per-parent loop.
+
+Builds synthetic forecasts the way the retrieve_*_forecasts_function_code_gen functions return them
+(category names, parent adjustment applied) for a 12-month x 40-category and a 52-week x 40-category
+horizon, checks both implementations produce the same frame, and prints the timings.
+
+Usage (from the repo root):
+  python benchmarks/forecast_consolidation_benchmark.py [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from categories import get_name, get_parents_with_leaves_as_dict_categories
+from penny.tool_funcs.forecast_utils import _consolidate_parent_categories
+from penny.tool_funcs.retrieve_forecasts import _adjust_parent_forecasts
+from penny.tool_funcs.sandbox_logging import clear_logs
+from penny.tools.utils import to_all_category_name
+
+
+def _reference_consolidate_parent_categories(df: pd.DataFrame) -> tuple[pd.DataFrame, set[int]]:
+  """The loop implementation _consolidate_parent_categories replaced, kept for comparison"""
+  total_count = len(df)
+  consolidated_parent_ids = set()
+  parent_to_leaf_categories = get_parents_with_leaves_as_dict_categories()
+  df_consolidated = df.copy()
+  rows_to_remove = []
+  rows_to_add = []
+  for start_date, date_group in df.groupby('start_date'):
+    for parent_id, children_ids in parent_to_leaf_categories.items():
+      child_ids = [cid for cid in children_ids if cid != parent_id]
+      if not child_ids:
+        continue
+      children_in_group = date_group[date_group['ai_category_id'].isin(child_ids)]
+      if len(children_in_group) == len(child_ids):
+        parent_in_df = date_group[date_group['ai_category_id'] == parent_id]
+        if total_count > 10 or parent_in_df.empty:
+          if not parent_in_df.empty and 'original_forecasted_amount' in parent_in_df.columns:
+            parent_forecast = parent_in_df['original_forecasted_amount'].iloc[0]
+          else:
+            parent_forecast = children_in_group['forecasted_amount'].sum()
+          parent_category_name = get_name(parent_id)
+          if not parent_category_name:
+            continue
+          rows_to_remove.extend(children_in_group.index.tolist())
+          parent_row = children_in_group.iloc[0].copy()
+          parent_row['ai_category_id'] = parent_id
+          parent_row['category'] = parent_category_name
+          parent_row['forecasted_amount'] = parent_forecast
+          if 'original_forecasted_amount' in parent_row:
+            parent_row['original_forecasted_amount'] = parent_forecast
+          rows_to_add.append(parent_row)
+          consolidated_parent_ids.add(parent_id)
+  if rows_to_remove:
+    df_consolidated = df_consolidated.drop(index=rows_to_remove)
+    if rows_to_add:
+      df_consolidated = pd.concat([df_consolidated, pd.DataFrame(rows_to_add)], ignore_index=True)
+  return df_consolidated, consolidated_parent_ids
+
+
+def _synthetic_forecasts(start_dates: pd.DatetimeIndex, n_categories: int, seed: int = 0) -> pd.DataFrame:
+  """Adjusted forecasts for the first ``n_categories`` named category IDs on every start date"""
+  rng = np.random.default_rng(seed)
+  category_ids = [cid for cid in range(-1, 100) if get_name(cid)][:n_categories]
+  df = pd.DataFrame({
+    'user_id': 1,
+    'ai_category_id': np.tile(category_ids, len(start_dates)),
+    'start_date': np.repeat(start_dates.values, len(category_ids)),
+    'forecasted_amount': rng.integers(100, 200000, len(start_dates) * len(category_ids)) / 100,
+  })
+  df['category'] = df['ai_category_id'].apply(to_all_category_name)
+  df['category'] = df['category'].apply(lambda x: x.replace("top_", "") if x.startswith("top_") else x)
+  return _adjust_parent_forecasts(df)
+
+
+def _time(func, df: pd.DataFrame, repeat: int) -> float:
+  """Best wall time in milliseconds over ``repeat`` runs"""
+  best = float('inf')
+  for _ in range(repeat):
+    clear_logs()
+    start = time.perf_counter()
+    func(df)
+    best = min(best, time.perf_counter() - start)
+  clear_logs()
+  return best * 1000
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--repeat', type=int, default=5, help='runs per implementation (best time is reported)')
+  args = parser.parse_args()
+
+  scenarios = {
+    '12 months x 40 categories': _synthetic_forecasts(pd.date_range('2026-01-01', periods=12, freq='MS'), 40),
+    '52 weeks x 40 categories': _synthetic_forecasts(pd.date_range('2026-01-04', periods=52, freq='W-SUN'), 40),
+  }
+  print(f"{'scenario':<28}{'rows':>7}{'loop (ms)':>12}{'vectorized (ms)':>18}{'speedup':>10}")
+  for name, df in scenarios.items():
+    expected, expected_ids = _reference_consolidate_parent_categories(df)
+    actual, actual_ids = _consolidate_parent_categories(df)
+    pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+    assert actual_ids == expected_ids, (actual_ids, expected_ids)
+
+    loop_ms = _time(_reference_consolidate_parent_categories, df, args.repeat)
+    vectorized_ms = _time(_consolidate_parent_categories, df, args.repeat)
+    print(f"{name:<28}{len(df):>7}{loop_ms:>12.2f}{vectorized_ms:>18.2f}{loop_ms / vectorized_ms:>9.1f}x")
+
+
+if __name__ == '__main__':
+  main()
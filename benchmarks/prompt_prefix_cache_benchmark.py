@@ -0,0 +1,108 @@
+"""
+Benchmark provider-side prompt prefix caching offline, with the fake cache backend and a fake model.
+
+The fake model "ingests" every uncached prompt token at --ms-per-1k-tokens and cached tokens at --cached-cost of
+that rate before streaming a short program, which approximates how prompt ingestion dominates time-to-first-token on
+the lite models. The code-gen agent answers --turns requests for the heavy seeded user without the prefix cache and
+with it, and the mean time-to-first-token of each is printed. Halfway through the cached run the handle is deleted
+behind the cache's back, to exercise the fallback and re-creation path.
+
+Usage (from the repo root):
+  python benchmarks/prompt_prefix_cache_benchmark.py [--user HeavyDataUser] [--turns N] [--ms-per-1k-tokens MS]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+import warnings
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'unused')
+
+from database import Database
+from gemini_agent_code_gen import GeminiAgentCodeGen
+from penny.tool_funcs.prompt_cache import prompt_section_stats
+from penny.tool_funcs.prompt_prefix_cache import FakeCacheBackend, PromptPrefixCache
+
+_RESPONSE = "```python\ndef process_input():\n  df = retrieve_depository_accounts()\n  print(len(df))\n  return True, {}\n```"
+
+
+class _FakeModels:
+  """``generate_content_stream`` that sleeps for prompt ingestion, resolving cached prefixes through ``backend``"""
+
+  def __init__(self, backend: FakeCacheBackend, ms_per_1k_tokens: float, cached_cost: float):
+    self.backend = backend
+    self.ms_per_1k_tokens = ms_per_1k_tokens
+    self.cached_cost = cached_cost
+
+  def generate_content_stream(self, model, contents, config):
+    texts = [part.text for part in config.system_instruction or []]
+    texts += [part.text for content in contents for part in content.parts]
+    tokens = prompt_section_stats({'prompt': "\n".join(texts)})['prompt']['estimated_tokens']
+    cached = 0
+    if config.cached_content is not None:
+      cached = self.backend.cached_tokens(config.cached_content)
+      if cached is None:
+        raise RuntimeError(f"404 NOT_FOUND: {config.cached_content}")
+    time.sleep((tokens + cached * self.cached_cost) * self.ms_per_1k_tokens / 1e6)
+    for start in range(0, len(_RESPONSE), 16):
+      yield SimpleNamespace(text=_RESPONSE[start:start + 16], usage_metadata=None, candidates=None)
+    usage = SimpleNamespace(output_token_count=30, prompt_token_count=tokens + cached)
+    yield SimpleNamespace(text=None, usage_metadata=usage, candidates=None)
+
+
+def _run(agent: GeminiAgentCodeGen, user_id: int, turns: int, on_turn=None) -> list[float]:
+  ttft = []
+  for turn in range(turns):
+    if on_turn is not None:
+      on_turn(turn)
+    timing_data = {'gemini_api_calls': [], 'execution_time': []}
+    with contextlib.redirect_stdout(io.StringIO()):
+      agent.generate_response([{'role': 'user', 'content': f'how much is in my checking account? ({turn})'}], timing_data, user_id)
+    ttft.append(timing_data['time_to_first_token_ms'])
+  return ttft
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--user', default='HeavyDataUser', help='seeded username to answer for')
+  parser.add_argument('--turns', type=int, default=20, help='requests per configuration')
+  parser.add_argument('--ms-per-1k-tokens', type=float, default=40.0, help='fake ingestion time of 1000 uncached prompt tokens')
+  parser.add_argument('--cached-cost', type=float, default=0.1, help='ingestion cost of a cached token relative to an uncached one')
+  args = parser.parse_args()
+  warnings.filterwarnings('ignore')
+
+  user = next((u for u in Database().get_all_users() if u['username'] == args.user), None)
+  if user is None:
+    sys.exit(f"User {args.user!r} not found; run user_seeder first")
+
+  backend = FakeCacheBackend()
+  agent = GeminiAgentCodeGen("gemini-flash-lite-latest")
+  agent.client = SimpleNamespace(models=_FakeModels(backend, args.ms_per_1k_tokens, args.cached_cost))
+
+  agent.prompt_prefix_cache = None
+  uncached = _run(agent, user['id'], args.turns)
+
+  cache = PromptPrefixCache(backend)
+  agent.prompt_prefix_cache = cache
+
+  def drop_handle_halfway(turn):
+    if turn == args.turns // 2:
+      for name in list(backend._entries):
+        backend.delete(name)
+
+  cached = _run(agent, user['id'], args.turns, drop_handle_halfway)
+
+  print(f"{args.turns} turns for {args.user}, {args.ms_per_1k_tokens:g} ms per 1k uncached tokens")
+  print(f"{'full prompt':<16}{statistics.mean(uncached):>10.1f} ms mean time to first token")
+  print(f"{'cached prefix':<16}{statistics.mean(cached):>10.1f} ms mean time to first token ({statistics.mean(uncached) / statistics.mean(cached):.2f}x)")
+  print(f"prefix cache: {cache.stats()}")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,81 @@
+"""
+Benchmark execute_batch against one execute_agent_with_tools call per program.
+
+Runs every few-shot program from gemini_agent_code_gen (repeated --copies times, as an optimizer regression run
+would) for the heavy seeded user, first sequentially with execute_agent_with_tools (each call loads its datasets),
+then with execute_batch on threads and on the process pool, and checks that all three agree.
+The warm DataFrame cache is disabled so each sequential call pays for its own loads, as with a fresh database.
+
+Usage (from the repo root):
+  python benchmarks/sandbox_batch_benchmark.py [--user HeavyDataUser] [--copies N] [--workers N]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'unused')
+
+import sandbox
+from database import Database
+from gemini_agent_code_gen import GeminiAgentCodeGen
+from penny.tool_funcs.dataframe_cache import disable_dataframe_cache
+
+
+def _few_shot_programs() -> list[str]:
+  examples = GeminiAgentCodeGen._create_few_shot_examples(None)
+  return re.findall(r"```python\n(.*?)```", examples, re.S)
+
+
+def _run_one(code: str, user_id: int) -> str:
+  """Success flag and output of one program, or the error it raised (as reported by execute_batch)"""
+  try:
+    return repr(sandbox.execute_agent_with_tools(code, user_id)[:2])
+  except Exception as e:
+    return f"{type(e).__name__}: {e}"
+
+
+def _batch_outputs(batch: list) -> list[str]:
+  return [item.error if item.error is not None else repr(item.result[:2]) for item in batch]
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--user', default='HeavyDataUser', help='seeded username to run the programs for')
+  parser.add_argument('--copies', type=int, default=5, help='times each few-shot program appears in the batch')
+  parser.add_argument('--workers', type=int, default=None, help='programs running at once (default: pool size)')
+  args = parser.parse_args()
+  warnings.filterwarnings('ignore')
+  disable_dataframe_cache()
+
+  user = next((u for u in Database().get_all_users() if u['username'] == args.user), None)
+  if user is None:
+    sys.exit(f"User {args.user!r} not found; run user_seeder first")
+  programs = _few_shot_programs() * args.copies
+
+  start = time.perf_counter()
+  sequential = [_run_one(code, user['id']) for code in programs]
+  sequential_ms = (time.perf_counter() - start) * 1000
+
+  timings = {}
+  for name, processes in (('batch (threads)', False), ('batch (processes)', True)):
+    if processes:
+      # Start the workers outside the timed region
+      sandbox.get_sandbox_pool()
+    start = time.perf_counter()
+    batch = sandbox.execute_batch(programs, user['id'], max_workers=args.workers, processes=processes)
+    timings[name] = (time.perf_counter() - start) * 1000
+    assert _batch_outputs(batch) == sequential, name
+
+  print(f"{len(programs)} programs for {args.user}")
+  print(f"{'sequential':<20}{sequential_ms:>10.1f} ms")
+  for name, elapsed_ms in timings.items():
+    print(f"{name:<20}{elapsed_ms:>10.1f} ms{sequential_ms / elapsed_ms:>8.2f}x")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,199 @@
+"""
+Benchmark sandbox globals construction: the prebuilt template copy against rebuilding everything per run.
+
+The reference rebuilds the merged builtins, defines one closure per tool and assembles the globals dict the way
+_get_safe_globals / _get_safe_globals_planner did before the template (closure bodies forward to the module-level
+tools; a def costs the same regardless of body size). Both variants must expose the same global names.
+
+Usage (from the repo root):
+  python benchmarks/sandbox_globals_benchmark.py [--number N] [--repeat N]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sandbox
+
+
+def _reference_safe_globals(user_id, use_full_datetime=False):
+  """Per-run construction _get_safe_globals used to perform, kept for comparison"""
+  all_builtins = sandbox.safe_builtins.copy()
+  all_builtins.update(sandbox.safe_globals)
+  all_builtins.update(sandbox.utility_builtins)
+  all_builtins.update(sandbox.limited_builtins)
+  all_builtins["__import__"] = sandbox._DataFrameGuard.restricted_import
+  additional_builtins = {
+    "sum": sum, "len": len, "range": range, "enumerate": enumerate, "sorted": sorted, "reversed": reversed,
+    "any": any, "all": all, "abs": abs, "round": round, "pow": pow, "divmod": divmod, "isinstance": isinstance,
+    "type": type, "str": str, "int": int, "float": float, "bool": bool, "list": list, "tuple": tuple, "set": set,
+    "dict": dict,
+  }
+  all_builtins.update(additional_builtins)
+
+  def retrieve_depository_accounts_wrapper():
+    return sandbox.retrieve_depository_accounts(user_id)
+  def retrieve_credit_accounts_wrapper():
+    return sandbox.retrieve_credit_accounts(user_id)
+  def account_names_and_balances_wrapper(df, template):
+    return sandbox.account_names_and_balances(df, template)
+  def utter_account_totals_wrapper(df, template):
+    return sandbox.utter_account_totals(df, template)
+  def retrieve_income_transactions_wrapper(start_date=None, end_date=None):
+    return sandbox.retrieve_income_transactions(user_id, start_date, end_date)
+  def retrieve_spending_transactions_wrapper(start_date=None, end_date=None):
+    return sandbox.retrieve_spending_transactions(user_id, start_date, end_date)
+  def retrieve_spending_forecasts_wrapper(granularity='monthly'):
+    return sandbox.retrieve_spending_forecasts(user_id, granularity)
+  def retrieve_income_forecasts_wrapper(granularity='monthly'):
+    return sandbox.retrieve_income_forecasts(user_id, granularity)
+  def retrieve_subscriptions_wrapper():
+    return sandbox.retrieve_subscriptions(user_id)
+  def subscription_names_and_amounts_wrapper(df, template):
+    return sandbox.subscription_names_and_amounts(df, template)
+  def utter_subscription_totals_wrapper(df, template):
+    return sandbox.utter_subscription_totals(df, template)
+  def transaction_names_and_amounts_wrapper(df, template):
+    return sandbox.transaction_names_and_amounts(df, template)
+  def utter_transaction_total_wrapper(df, template):
+    return sandbox.utter_transaction_total(df, template)
+  def forecast_dates_and_amount_wrapper(df, template):
+    return sandbox.forecast_dates_and_amount(df, template)
+  def utter_forecast_amount_wrapper(amount, template):
+    return sandbox.utter_forecast_amount(amount, template)
+  def utter_absolute_amount_wrapper(amount, template):
+    return sandbox.utter_absolute_amount(amount, template)
+  def compare_income_or_spending_wrapper(df, template, metadata=None):
+    return sandbox.compare_income_or_spending(df, template, metadata)
+  def respond_to_app_inquiry_wrapper(inquiry):
+    return sandbox.respond_to_app_inquiry(inquiry)
+  def create_budget_or_goal_wrapper(category="", granularity="", start_date="", end_date="", amount=0.0, title="", **kwargs):
+    cat = kwargs.pop("match_category", None) or category
+    return sandbox.create_budget_or_goal(cat, granularity, start_date, end_date, amount, title)
+  def create_category_spending_limit_wrapper(category, granularity, start_date, end_date, amount, title):
+    return sandbox.create_category_spending_limit(category, granularity, start_date, end_date, amount, title)
+  def create_income_goal_wrapper(category, granularity, start_date, end_date, amount, title):
+    return sandbox.create_income_goal(category, granularity, start_date, end_date, amount, title)
+  def create_savings_goal_wrapper(amount, end_date, title, goal_type="save_X_amount", granularity=None, start_date="", account_ids=None):
+    return sandbox.create_savings_goal(amount, end_date, title, goal_type=goal_type, granularity=granularity, start_date=start_date, account_ids=account_ids)
+  def validate_budget_or_goal(*args, **kwargs):
+    return sandbox.validate_budget_or_goal(*args, **kwargs)
+  def create_reminder_wrapper(what, when):
+    return sandbox.create_reminder(what, when)
+
+  return {
+    "__builtins__": all_builtins,
+    "pd": sandbox.pd,
+    "pandas": sandbox.pd,
+    "dateutil": sandbox.dateutil,
+    "datetime": sandbox.dt if use_full_datetime else sandbox.datetime,
+    "relativedelta": sandbox.relativedelta,
+    "_getitem_": sandbox._getitem_,
+    "_hasattr_": sandbox._hasattr_,
+    "_write_": sandbox._write_,
+    "_iter_unpack_sequence_": sandbox.guarded_iter_unpack_sequence,
+    "_unpack_sequence_": sandbox.guarded_unpack_sequence,
+    "_getattr_": sandbox._DataFrameGuard._getattr_,
+    "_getiter_": sandbox._DataFrameGuard._getiter_,
+    "_inplacevar_": sandbox._DataFrameGuard._inplacevar_,
+    "_print_": sandbox.get_print_collector,
+    "filter": sandbox.guarded_filter,
+    "reduce": sandbox.guarded_reduce,
+    "max": sandbox.guarded_max,
+    "min": sandbox.guarded_min,
+    "map": sandbox.guarded_map,
+    "timedelta": sandbox.timedelta,
+    "zip": sandbox.guarded_zip,
+    "retrieve_depository_accounts": retrieve_depository_accounts_wrapper,
+    "retrieve_credit_accounts": retrieve_credit_accounts_wrapper,
+    "account_names_and_balances": account_names_and_balances_wrapper,
+    "utter_account_totals": utter_account_totals_wrapper,
+    "retrieve_income_transactions": retrieve_income_transactions_wrapper,
+    "retrieve_spending_transactions": retrieve_spending_transactions_wrapper,
+    "retrieve_spending_forecasts": retrieve_spending_forecasts_wrapper,
+    "retrieve_income_forecasts": retrieve_income_forecasts_wrapper,
+    "retrieve_subscriptions": retrieve_subscriptions_wrapper,
+    "subscription_names_and_amounts": subscription_names_and_amounts_wrapper,
+    "utter_subscription_totals": utter_subscription_totals_wrapper,
+    "transaction_names_and_amounts": transaction_names_and_amounts_wrapper,
+    "utter_transaction_total": utter_transaction_total_wrapper,
+    "forecast_dates_and_amount": forecast_dates_and_amount_wrapper,
+    "utter_forecast_amount": utter_forecast_amount_wrapper,
+    "utter_absolute_amount": utter_absolute_amount_wrapper,
+    "compare_income_or_spending": compare_income_or_spending_wrapper,
+    "respond_to_app_inquiry": respond_to_app_inquiry_wrapper,
+    "utter_delta_from_now": sandbox.utter_delta_from_now,
+    "reminder_data": sandbox.reminder_data,
+    "log": sandbox.sandbox_log,
+    "get_date": sandbox._get_date_for_transaction_dataframe,
+    "get_start_of_month": sandbox.get_start_of_month,
+    "get_end_of_month": sandbox.get_end_of_month,
+    "get_start_of_year": sandbox.get_start_of_year,
+    "get_end_of_year": sandbox.get_end_of_year,
+    "get_start_of_week": sandbox.get_start_of_week,
+    "get_end_of_week": sandbox.get_end_of_week,
+    "get_after_periods": sandbox.get_after_periods,
+    "get_date_string": sandbox.get_date_string,
+    "create_budget_or_goal": create_budget_or_goal_wrapper,
+    "create_category_spending_limit": create_category_spending_limit_wrapper,
+    "create_income_goal": create_income_goal_wrapper,
+    "create_savings_goal": create_savings_goal_wrapper,
+    "create_category_budget": create_category_spending_limit_wrapper,
+    "validate_budget_or_goal": validate_budget_or_goal,
+    "create_reminder": create_reminder_wrapper,
+  }
+
+
+def _reference_safe_globals_planner(user_id, use_full_datetime=False):
+  """Planner variant: the full agent globals rebuilt, then four more closures"""
+  safe_globals_dict = _reference_safe_globals(user_id, use_full_datetime)
+
+  def lookup_wrapper(lookup_request, input_info=None):
+    return sandbox.lookup_user_accounts_transactions_income_and_spending_patterns(lookup_request, input_info)
+  def create_budget_wrapper(creation_request, input_info=None):
+    return sandbox.create_budget_or_goal_from_request(creation_request, input_info)
+  def research_wrapper(strategize_request, input_info=None):
+    return sandbox.research_and_strategize_financial_outcomes(strategize_request, input_info)
+  def update_category_wrapper(categorize_request, input_info=None):
+    return sandbox.update_transaction_category_or_create_category_rules(categorize_request, input_info)
+
+  safe_globals_dict.update({
+    "lookup_user_accounts_transactions_income_and_spending_patterns": lookup_wrapper,
+    "create_budget_or_goal_or_reminder": create_budget_wrapper,
+    "research_and_strategize_financial_outcomes": research_wrapper,
+    "update_transaction_category_or_create_category_rules": update_category_wrapper,
+  })
+  return safe_globals_dict
+
+
+def _best_us(func, number: int, repeat: int) -> float:
+  """Best per-call time in microseconds"""
+  return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--number', type=int, default=20000, help='constructions per timing run')
+  parser.add_argument('--repeat', type=int, default=5, help='timing runs (best is reported)')
+  args = parser.parse_args()
+
+  variants = {
+    'agent': (lambda: _reference_safe_globals(1), lambda: sandbox._get_safe_globals()),
+    'planner': (lambda: _reference_safe_globals_planner(1), lambda: sandbox._get_safe_globals_planner()),
+  }
+  print(f"{'globals':<10}{'keys':>6}{'rebuild (us)':>15}{'template (us)':>16}{'speedup':>10}")
+  for name, (reference, template) in variants.items():
+    expected, actual = reference(), template()
+    assert expected.keys() == actual.keys(), expected.keys() ^ actual.keys()
+    assert expected['__builtins__'] == actual['__builtins__']
+
+    rebuild_us = _best_us(reference, args.number, args.repeat)
+    template_us = _best_us(template, args.number, args.repeat)
+    print(f"{name:<10}{len(actual):>6}{rebuild_us:>15.2f}{template_us:>16.2f}{rebuild_us / template_us:>9.1f}x")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,123 @@
+"""
+Benchmark the sandbox attribute/item/iteration guards: per-type fast path against the always-checked guards.
+
+Runs every few-shot program from gemini_agent_code_gen (plus one row-loop program that is dominated by guard calls)
+against the heavy seeded user, once with the current guards and once with the checked guards alone (the behaviour
+before the per-type cache), and prints the best execution time of ``process_input`` for each. Compilation and data
+loading are excluded: programs are compiled once and retrievals are served from the warm DataFrame cache.
+
+Usage (from the repo root):
+  python benchmarks/sandbox_guard_benchmark.py [--user HeavyDataUser] [--repeat N]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('GEMINI_API_KEY', 'unused')
+
+import sandbox
+from database import Database
+from gemini_agent_code_gen import GeminiAgentCodeGen
+
+_ROW_LOOP_PROGRAM = '''
+def process_input():
+  df = retrieve_spending_transactions()
+  totals = {}
+  for index, row in df.iterrows():
+    category = row['category']
+    if row['amount'] > 0 and row['date'].year >= 2000:
+      totals[category] = totals.get(category, 0) + row['amount']
+  names = sorted(totals.keys())
+  return True, ', '.join([name + ': ' + str(round(totals[name], 2)) for name in names])
+'''
+
+
+def _reference_getiter_(obj):
+  """_getiter_ without the per-type fast path"""
+  try:
+    if hasattr(obj, '__class__') and obj.__class__.__module__.startswith('pandas'):
+      return iter(obj)
+    if hasattr(obj, '__iter__'):
+      return iter(obj)
+    raise TypeError(f"_getiter_ guard: Object of type {type(obj)} is not iterable")
+  except Exception as e:
+    raise TypeError(f"_getiter_ guard: Failed to iterate over {type(obj).__name__}. Error: {e}") from e
+
+
+def _reference_hasattr_(obj, name):
+  """_hasattr_ with the pandas module check it used to run on every call"""
+  try:
+    if hasattr(obj, '__class__') and obj.__class__.__module__.startswith('pandas'):
+      return hasattr(obj, name)
+    return hasattr(obj, name)
+  except Exception:
+    return False
+
+
+_CHECKED_GUARDS = {
+  '_getattr_': sandbox._DataFrameGuard._checked_getattr,
+  '_getitem_': sandbox._checked_getitem,
+  '_getiter_': _reference_getiter_,
+  '_hasattr_': _reference_hasattr_,
+}
+
+
+def _few_shot_programs() -> list[str]:
+  examples = GeminiAgentCodeGen._create_few_shot_examples(None)
+  return re.findall(r"```python\n(.*?)```", examples, re.S)
+
+
+def _time_program(code: str, user_id: int, guards: dict, repeat: int) -> tuple[float, object]:
+  """Best ``process_input()`` time in milliseconds and the last result (or exception) for ``code``"""
+  best = float('inf')
+  result = None
+  with sandbox.sandbox_context(user_id):
+    process_input = sandbox._create_restricted_process_input(code, user_id, guards)
+    for _ in range(repeat):
+      with sandbox.user_data_snapshot(user_id):
+        start = time.perf_counter()
+        try:
+          result = process_input()
+        except Exception as e:
+          result = f"{type(e).__name__}: {e}"
+        best = min(best, time.perf_counter() - start)
+  return best * 1000, result
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--user', default='HeavyDataUser', help='seeded username to run the programs for')
+  parser.add_argument('--repeat', type=int, default=20, help='runs per program and guard set (best time is reported)')
+  args = parser.parse_args()
+  warnings.filterwarnings('ignore')
+
+  user = next((u for u in Database().get_all_users() if u['username'] == args.user), None)
+  if user is None:
+    sys.exit(f"User {args.user!r} not found; run user_seeder first")
+
+  programs = {f'few-shot #{i}': code for i, code in enumerate(_few_shot_programs())}
+  programs['row loop'] = _ROW_LOOP_PROGRAM
+  print(f"{'program':<14}{'checked (ms)':>14}{'fast path (ms)':>16}{'speedup':>10}")
+  checked_total = fast_total = 0.0
+  for name, code in programs.items():
+    try:
+      sandbox.compile_restricted_cached(code)
+    except SyntaxError:
+      print(f"{name:<14}{'(does not compile, skipped)':>40}")
+      continue
+    checked_ms, checked_result = _time_program(code, user['id'], _CHECKED_GUARDS, args.repeat)
+    fast_ms, fast_result = _time_program(code, user['id'], None, args.repeat)
+    assert repr(checked_result) == repr(fast_result), (name, checked_result, fast_result)
+    checked_total += checked_ms
+    fast_total += fast_ms
+    print(f"{name:<14}{checked_ms:>14.2f}{fast_ms:>16.2f}{checked_ms / fast_ms:>9.2f}x")
+  print(f"{'total':<14}{checked_total:>14.2f}{fast_total:>16.2f}{checked_total / fast_total:>9.2f}x")
+
+
+if __name__ == '__main__':
+  main()
@@ -1,8 +1,12 @@
+import itertools
 import sqlite3
 import os
+import threading
+import numpy as np
 import pandas as pd
-from datetime import date, datetime
-from typing import List, Dict, Optional
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Iterator, Optional, Tuple, Union
 
 
 def _transaction_date_to_iso(value) -> str:
@@ -23,150 +27,530 @@ def default_chatbot_db_path() -> str:
   return os.path.join(os.path.dirname(os.path.abspath(__file__)), "chatbot.db")
 
 
+# Category name to ID mapping for transaction rows
+_TRANSACTION_CATEGORY_NAME_TO_ID = {
+  'meals': 1,
+  'meals_groceries': 4,
+  'meals_dining_out': 2,
+  'meals_delivered_food': 3,
+  'leisure': 5,
+  'leisure_entertainment': 6,
+  'leisure_travel': 7,
+  'bills': 9,
+  'bills_connectivity': 10,
+  'bills_insurance': 11,
+  'bills_tax': 12,
+  'bills_service_fees': 13,
+  'shelter': 14,
+  'shelter_home': 15,
+  'shelter_utilities': 16,
+  'shelter_upkeep': 17,
+  'education': 18,
+  'education_kids_activities': 19,
+  'education_tuition': 20,
+  'shopping': 21,
+  'shopping_clothing': 22,
+  'shopping_gadgets': 23,
+  'shopping_kids': 24,
+  'shopping_pets': 8,
+  'transportation': 25,
+  'transportation_public': 27,
+  'transportation_car': 26,
+  'health': 28,
+  'health_medical_pharmacy': 29,
+  'health_gym_wellness': 30,
+  'health_personal_care': 31,
+  'donations_gifts': 32,
+  'income': 47,
+  'income_salary': 36,
+  'income_sidegig': 37,
+  'income_business': 38,
+  'income_interest': 39,
+  'uncategorized': -1,
+  'transfers': 45,
+  'miscellaneous': 33,
+}
+
+
+_TRANSACTION_COLUMNS_SQL = "transaction_id, user_id, account_id, date, transaction_name, amount, category"
+# Columnar reads trim the date to YYYY-MM-DD in SQL so pandas can parse it with a fixed format.
+_TRANSACTION_FRAME_COLUMNS_SQL = "transaction_id, user_id, account_id, substr(date, 1, 10) AS date, transaction_name, amount, category"
+
+# Seeded lookup amount-band fixtures (user_seeder) keep their literal calendar dates when demo dates are rolled.
+_DATE_ROLL_EXEMPT_TRANSACTION_IDS = (900001, 900009)
+# Transaction date shifted by a bound '+N days' modifier; bound parameters: first/last exempt id, modifier.
+_ROLLED_DATE_SQL = "CASE WHEN transaction_id BETWEEN ? AND ? THEN substr(date, 1, 10) ELSE date(substr(date, 1, 10), ?) END"
+_ROLLED_TRANSACTION_FRAME_COLUMNS_SQL = f"transaction_id, user_id, account_id, {_ROLLED_DATE_SQL} AS date, transaction_name, amount, category"
+
+
+def _build_transactions_query(select_columns: str, user_id: int, start, end, categories, exclude_categories,
+                              name_contains, amount_min, amount_max, limit, order,
+                              date_offset_days: int = 0) -> Tuple[str, list]:
+  """Parameterized SELECT over a user's transactions for ``Database.query_transactions`` / ``query_transactions_df``.
+
+  With ``date_offset_days``, ``select_columns`` must be ``_ROLLED_TRANSACTION_FRAME_COLUMNS_SQL`` and the
+  start/end bounds apply to the rolled dates.
+  """
+  if order not in ("desc", "asc"):
+    raise ValueError(f"order must be 'desc' or 'asc', got {order!r}")
+  if date_offset_days < 0:
+    raise ValueError(f"date_offset_days must be >= 0, got {date_offset_days}")
+  
+  rolled_date_params = [*_DATE_ROLL_EXEMPT_TRANSACTION_IDS, f"+{int(date_offset_days)} days"]
+  select_params = rolled_date_params if date_offset_days else []
+  clauses = ["user_id = ?"]
+  params: list = [user_id]
+  if start is not None:
+    start_iso = _transaction_date_to_iso(start)
+    # Rolled dates are never earlier than stored ones, so the stored-date bound (which can use the
+    # index) is widened by the offset and the exact bound is applied to the rolled date.
+    clauses.append("date >= ?")
+    params.append(
+      (datetime.strptime(start_iso, "%Y-%m-%d") - timedelta(days=date_offset_days)).strftime("%Y-%m-%d")
+      if date_offset_days else start_iso
+    )
+    if date_offset_days:
+      clauses.append(f"{_ROLLED_DATE_SQL} >= ?")
+      params.extend([*rolled_date_params, start_iso])
+  if end is not None:
+    # Compare against the next day so rows stored with a time component still match the end date
+    clauses.append("date < ?")
+    end_exclusive = datetime.strptime(_transaction_date_to_iso(end), "%Y-%m-%d") + timedelta(days=1)
+    params.append(end_exclusive.strftime("%Y-%m-%d"))
+    if date_offset_days:
+      clauses.append(f"{_ROLLED_DATE_SQL} < ?")
+      params.extend([*rolled_date_params, end_exclusive.strftime("%Y-%m-%d")])
+  if categories is not None:
+    clauses.append(f"category IN ({', '.join('?' for _ in categories)})")
+    params.extend(categories)
+  if exclude_categories:
+    clauses.append(f"category NOT IN ({', '.join('?' for _ in exclude_categories)})")
+    params.extend(exclude_categories)
+  if name_contains:
+    escaped = name_contains.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    clauses.append("transaction_name LIKE ? ESCAPE '\\'")
+    params.append(f"%{escaped}%")
+  if amount_min is not None:
+    clauses.append("amount >= ?")
+    params.append(amount_min)
+  if amount_max is not None:
+    clauses.append("amount <= ?")
+    params.append(amount_max)
+  
+  # transaction_id breaks same-day ties deterministically (it is the rowid, so the date index still avoids a sort).
+  # Qualified so a rolled ``... AS date`` output column does not take over the ordering.
+  query = f"SELECT {select_columns} FROM transactions WHERE {' AND '.join(clauses)} ORDER BY transactions.date {order.upper()}, transaction_id"
+  if limit is not None:
+    query += " LIMIT ?"
+    params.append(int(limit))
+  return query, select_params + params
+
+
+# Explicit dtypes for the columnar (DataFrame) read path.
+_TRANSACTION_FRAME_DTYPES = {
+  'transaction_id': 'int32',
+  'user_id': 'int32',
+  'account_id': 'int32',
+  'transaction_name': 'object',
+  'amount': 'float64',
+  # Generated code treats `category` as str (groupby on a categorical would also emit unused categories)
+  'category': 'object',
+}
+_ACCOUNT_FRAME_DTYPES = {
+  'account_id': 'int32',
+  'user_id': 'int32',
+  'account_type': 'object',
+  'balance_available': 'float64',
+  'balance_current': 'float64',
+  'balance_limit': 'float64',
+  'account_name': 'object',
+  'account_mask': 'object',
+}
+_SUBSCRIPTION_TRANSACTION_FRAME_DTYPES = {
+  **_TRANSACTION_FRAME_DTYPES,
+  'subscription_name': 'object',
+  'confidence_score_bills': 'float64',
+  'reviewer_bills': 'boolean',
+}
+
+
+def _frame_from_cursor(cursor: sqlite3.Cursor, dtypes: Dict[str, str], date_columns: Tuple[str, ...] = ('date',)) -> pd.DataFrame:
+  """Build a typed DataFrame straight from an executed cursor, one array per column, without per-row dicts.
+
+  ``date_columns`` must already be ``YYYY-MM-DD`` strings (see ``substr`` in the SELECT) and become ``datetime64[ns]``.
+  """
+  columns = [description[0] for description in cursor.description]
+  rows = cursor.fetchall()
+  values_by_column = list(zip(*rows)) if rows else [()] * len(columns)
+  data = {}
+  for column, values in zip(columns, values_by_column):
+    dtype = dtypes.get(column, 'object')
+    if column in date_columns:
+      try:
+        data[column] = np.array(values, dtype='datetime64[D]').astype('datetime64[ns]')
+      except ValueError:
+        data[column] = pd.to_datetime(pd.Series(values, dtype='object'), format="%Y-%m-%d", errors="coerce").to_numpy()
+    elif dtype == 'boolean':
+      data[column] = pd.array(values, dtype='boolean')
+    else:
+      data[column] = np.array(values, dtype=dtype)
+  return pd.DataFrame(data, columns=columns)
+
+
+def _with_ai_category_id(df: pd.DataFrame) -> pd.DataFrame:
+  """Add the ``ai_category_id`` column derived from ``category`` (uncategorized when unknown)."""
+  df['ai_category_id'] = (
+    df['category'].map(_TRANSACTION_CATEGORY_NAME_TO_ID).astype('float64').fillna(-1).astype('int32')
+  )
+  return df
+
+
+# Pragmas applied once to every pooled connection. WAL lets readers run alongside the single writer,
+# NORMAL sync is durable across app crashes in WAL mode, and the mmap / page cache sizes keep the hot
+# transactions table in memory for repeated per-user reads.
+_CONNECTION_PRAGMAS = (
+  "PRAGMA journal_mode=WAL",
+  "PRAGMA synchronous=NORMAL",
+  "PRAGMA mmap_size=268435456",
+  "PRAGMA cache_size=-32768",
+  "PRAGMA temp_store=MEMORY",
+)
+
+# Idle connections kept per database file; extra connections are closed when released.
+_MAX_IDLE_CONNECTIONS = 8
+
+
+class ConnectionPool:
+  """Process-wide pool of tuned SQLite connections, keyed by database path.
+
+  Each checked-out connection is used by exactly one thread at a time, then returned to the idle list
+  so the next caller (on any thread) skips connect and pragma setup.
+  """
+
+  def __init__(self, max_idle: int = _MAX_IDLE_CONNECTIONS):
+    self.max_idle = max_idle
+    self._lock = threading.Lock()
+    self._idle: Dict[str, List[sqlite3.Connection]] = {}
+    self._generation: Dict[str, int] = {}
+
+  def _open(self, db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    for pragma in _CONNECTION_PRAGMAS:
+      conn.execute(pragma)
+    return conn
+
+  def _acquire(self, db_path: str) -> Tuple[sqlite3.Connection, int]:
+    with self._lock:
+      generation = self._generation.get(db_path, 0)
+      idle = self._idle.get(db_path)
+      if idle:
+        return idle.pop(), generation
+    return self._open(db_path), generation
+
+  def _release(self, db_path: str, conn: sqlite3.Connection, generation: int) -> None:
+    if conn.in_transaction:
+      conn.rollback()
+    with self._lock:
+      idle = self._idle.setdefault(db_path, [])
+      if generation == self._generation.get(db_path, 0) and len(idle) < self.max_idle:
+        idle.append(conn)
+        return
+    conn.close()
+
+  @contextmanager
+  def connection(self, db_path: str) -> Iterator[sqlite3.Connection]:
+    """Check out a connection for ``db_path``; uncommitted work is rolled back on error or release."""
+    conn, generation = self._acquire(db_path)
+    try:
+      yield conn
+    except BaseException:
+      conn.rollback()
+      raise
+    finally:
+      self._release(db_path, conn, generation)
+
+  def close_all(self, db_path: Optional[str] = None) -> None:
+    """Close idle connections (for one path or all) and retire any currently checked out."""
+    with self._lock:
+      paths = [db_path] if db_path is not None else list(self._idle.keys())
+      to_close = []
+      for path in paths:
+        to_close.extend(self._idle.pop(path, []))
+        self._generation[path] = self._generation.get(path, 0) + 1
+    for conn in to_close:
+      conn.close()
+
+
+_POOL = ConnectionPool()
+
+# Database files whose schema has already been created/checked by this process.
+_SCHEMA_READY_PATHS = set()
+_SCHEMA_LOCK = threading.Lock()
+
+
+# Versioned schema migrations applied on top of the base tables created in ``init_database``.
+# Append new entries with the next version number; never edit or reorder an applied migration.
+_MIGRATIONS = [
+  (1, "Composite indexes for per-user and per-account transaction, account and forecast reads", [
+    "CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (user_id, date DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_account_date ON transactions (account_id, date)",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_user_category_date ON transactions (user_id, category, date)",
+    "CREATE INDEX IF NOT EXISTS idx_accounts_user_type_name ON accounts (user_id, account_type, account_name)",
+    "CREATE INDEX IF NOT EXISTS idx_monthly_forecasts_user_month ON ai_monthly_forecasts (user_id, month_date, ai_category_id)",
+    "CREATE INDEX IF NOT EXISTS idx_weekly_forecasts_user_sunday ON ai_weekly_forecasts (user_id, sunday_date, ai_category_id)",
+    "ANALYZE",
+  ]),
+]
+
+
+def _get_schema_version(conn: sqlite3.Connection) -> int:
+  """Highest applied migration version, or 0 for databases created before migrations existed."""
+  row = conn.execute(
+    "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+  ).fetchone()
+  if row is None:
+    return 0
+  version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0]
+  return version or 0
+
+
+def _apply_migrations(conn: sqlite3.Connection) -> int:
+  """Apply every pending migration in order, each in its own transaction, and return the new version.
+
+  Each migration takes the write lock (BEGIN IMMEDIATE) and re-reads the schema version before applying, so
+  processes starting at the same time apply each migration exactly once; the others skip it.
+  """
+  conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+      version INTEGER PRIMARY KEY,
+      description TEXT NOT NULL,
+      applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+  ''')
+  current_version = _get_schema_version(conn)
+  for version, description, statements in _MIGRATIONS:
+    if version <= current_version:
+      continue
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+      current_version = _get_schema_version(conn)
+      if version <= current_version:
+        # Another process applied it while we waited for the lock
+        conn.rollback()
+        continue
+      for statement in statements:
+        conn.execute(statement)
+      conn.execute(
+        "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+        (version, description)
+      )
+      conn.commit()
+    except Exception:
+      conn.rollback()
+      raise
+    current_version = version
+  return current_version
+
+
+# Per-user data versions, bumped by this process's writes so cached reads keyed on them go stale.
+# Values come from one monotonic counter, so a path-wide reset (``_PATH_DATA_VERSIONS``) always compares
+# newer than any earlier per-user bump and the effective version is simply the max of the two.
+_DATA_VERSION_COUNTER = itertools.count(1)
+_USER_DATA_VERSIONS: Dict[Tuple[str, int], int] = {}
+_PATH_DATA_VERSIONS: Dict[Optional[str], int] = {}
+_DATA_VERSION_LOCK = threading.Lock()
+
+
+def _bump_data_version(db_path: Optional[str], user_id: Optional[int] = None) -> None:
+  """Invalidate cached reads for ``user_id`` (every user of ``db_path`` when None; every path when both are None)."""
+  with _DATA_VERSION_LOCK:
+    version = next(_DATA_VERSION_COUNTER)
+    if user_id is None:
+      _PATH_DATA_VERSIONS[db_path] = version
+    else:
+      _USER_DATA_VERSIONS[(db_path, user_id)] = version
+
+
+def reset_connection_pool(db_path: Optional[str] = None) -> None:
+  """Drop pooled connections and the one-time schema check, e.g. before deleting the database file."""
+  _POOL.close_all(db_path)
+  with _SCHEMA_LOCK:
+    if db_path is None:
+      _SCHEMA_READY_PATHS.clear()
+    else:
+      _SCHEMA_READY_PATHS.discard(db_path)
+  _bump_data_version(db_path)
+
+
 class Database:
   def __init__(self, db_path: Optional[str] = None):
     if db_path is None:
       db_path = default_chatbot_db_path()
     self.db_path = db_path
-    self.init_database()
-  
+    if self.db_path not in _SCHEMA_READY_PATHS:
+      with _SCHEMA_LOCK:
+        if self.db_path not in _SCHEMA_READY_PATHS:
+          self.init_database()
+          _SCHEMA_READY_PATHS.add(self.db_path)
+
+  def _connection(self):
+    """Pooled connection context for this database file"""
+    return _POOL.connection(self.db_path)
+
+  def get_data_version(self, user_id: int) -> int:
+    """Version of ``user_id``'s data as written through this process; changes after every create_* for the user.
+
+    Writes made by other processes are not tracked, so caches keyed on it should also expire by age.
+    """
+    with _DATA_VERSION_LOCK:
+      return max(
+        _USER_DATA_VERSIONS.get((self.db_path, user_id), 0),
+        _PATH_DATA_VERSIONS.get(self.db_path, 0),
+        _PATH_DATA_VERSIONS.get(None, 0),
+      )
+
   def init_database(self):
     """Initialize the database with required tables"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute('''
-      CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-      )
-    ''')
-
-    # Create accounts table
-    cursor.execute('''
-      CREATE TABLE IF NOT EXISTS accounts (
-        account_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        account_type TEXT NOT NULL CHECK (account_type IN ('deposit_savings', 'deposit_money_market', 'deposit_checking', 'credit_card', 'loan_home_equity', 'loan_line_of_credit', 'loan_mortgage', 'loan_auto')),
-        balance_available REAL DEFAULT 0,
-        balance_current REAL DEFAULT 0,
-        balance_limit REAL DEFAULT 0,
-        account_name TEXT NOT NULL,
-        account_mask TEXT NOT NULL,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-      )
-    ''')
-    
-    # Create transactions table
-    cursor.execute('''
-      CREATE TABLE IF NOT EXISTS transactions (
-        transaction_id INTEGER PRIMARY KEY,
-        user_id INTEGER NOT NULL,
-        account_id INTEGER NOT NULL,
-        date DATE NOT NULL,
-        transaction_name TEXT NOT NULL,
-        amount REAL NOT NULL,
-        category TEXT NOT NULL,
-        FOREIGN KEY (user_id) REFERENCES users (id),
-        FOREIGN KEY (account_id) REFERENCES accounts (account_id)
-      )
-    ''')
-    
-    # Create ai_monthly_forecasts table
-    cursor.execute('''
-      CREATE TABLE IF NOT EXISTS ai_monthly_forecasts (
-        user_id INTEGER NOT NULL,
-        ai_category_id INTEGER NOT NULL,
-        month_date DATE NOT NULL,
-        forecasted_amount REAL NOT NULL,
-        PRIMARY KEY (user_id, ai_category_id, month_date),
-        FOREIGN KEY (user_id) REFERENCES users (id)
-      )
-    ''')
-    
-    # Create ai_weekly_forecasts table
-    cursor.execute('''
-      CREATE TABLE IF NOT EXISTS ai_weekly_forecasts (
-        user_id INTEGER NOT NULL,
-        ai_category_id INTEGER NOT NULL,
-        sunday_date DATE NOT NULL,
-        forecasted_amount REAL NOT NULL,
-        PRIMARY KEY (user_id, ai_category_id, sunday_date),
-        FOREIGN KEY (user_id) REFERENCES users (id)
-      )
-    ''')
-    
-    # Create user_recurring_transactions table
-    cursor.execute('''
-      CREATE TABLE IF NOT EXISTS user_recurring_transactions (
-        user_id INTEGER NOT NULL,
-        name TEXT NOT NULL,
-        last_reviewed_datetime TIMESTAMP,
-        recurrence_json TEXT NOT NULL,
-        confidence_score_bills REAL,
-        confidence_score_salary REAL,
-        confidence_score_sidegig REAL,
-        reviewer_bills INTEGER DEFAULT 0,
-        reviewer_salary INTEGER DEFAULT 0,
-        reviewer_sidegig INTEGER DEFAULT 0,
-        user_not_bills INTEGER,
-        user_not_salary INTEGER,
-        user_not_sidegig INTEGER,
-        user_need_level TEXT CHECK (user_need_level IN ('need', 'want', 'trial')),
-        necessity TEXT CHECK (necessity IN ('need', 'want', 'trial')),
-        next_user_remind_datetime TIMESTAMP,
-        user_remind_last_response TEXT,
-        user_cancelled_date DATE,
-        next_likely_payment_date DATE,
-        next_earliest_payment_date DATE,
-        next_latest_payment_date DATE,
-        next_payment_date_debug TEXT,
-        next_amount REAL,
-        last_transaction_date TIMESTAMP,
-        awaiting_new_transaction INTEGER,
-        necessity_update_date TIMESTAMP,
-        necessity_prompt_date TIMESTAMP,
-        frequency TEXT CHECK (frequency IN ('weekly', 'biweekly', 'monthly', 'quarterly', 'biannual', 'yearly', 'irregular', 'no_pattern')),
-        PRIMARY KEY (user_id, name),
-        FOREIGN KEY (user_id) REFERENCES users (id)
-      )
-    ''')
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    conn.commit()
-    conn.close()
+      # Create users table
+      cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          username TEXT UNIQUE NOT NULL,
+          email TEXT UNIQUE NOT NULL,
+          created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+      ''')
+
+      # Create accounts table
+      cursor.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+          account_id INTEGER PRIMARY KEY AUTOINCREMENT,
+          user_id INTEGER NOT NULL,
+          account_type TEXT NOT NULL CHECK (account_type IN ('deposit_savings', 'deposit_money_market', 'deposit_checking', 'credit_card', 'loan_home_equity', 'loan_line_of_credit', 'loan_mortgage', 'loan_auto')),
+          balance_available REAL DEFAULT 0,
+          balance_current REAL DEFAULT 0,
+          balance_limit REAL DEFAULT 0,
+          account_name TEXT NOT NULL,
+          account_mask TEXT NOT NULL,
+          FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+      ''')
+    
+      # Create transactions table
+      cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+          transaction_id INTEGER PRIMARY KEY,
+          user_id INTEGER NOT NULL,
+          account_id INTEGER NOT NULL,
+          date DATE NOT NULL,
+          transaction_name TEXT NOT NULL,
+          amount REAL NOT NULL,
+          category TEXT NOT NULL,
+          FOREIGN KEY (user_id) REFERENCES users (id),
+          FOREIGN KEY (account_id) REFERENCES accounts (account_id)
+        )
+      ''')
+    
+      # Create ai_monthly_forecasts table
+      cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_monthly_forecasts (
+          user_id INTEGER NOT NULL,
+          ai_category_id INTEGER NOT NULL,
+          month_date DATE NOT NULL,
+          forecasted_amount REAL NOT NULL,
+          PRIMARY KEY (user_id, ai_category_id, month_date),
+          FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+      ''')
+    
+      # Create ai_weekly_forecasts table
+      cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_weekly_forecasts (
+          user_id INTEGER NOT NULL,
+          ai_category_id INTEGER NOT NULL,
+          sunday_date DATE NOT NULL,
+          forecasted_amount REAL NOT NULL,
+          PRIMARY KEY (user_id, ai_category_id, sunday_date),
+          FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+      ''')
+    
+      # Create user_recurring_transactions table
+      cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_recurring_transactions (
+          user_id INTEGER NOT NULL,
+          name TEXT NOT NULL,
+          last_reviewed_datetime TIMESTAMP,
+          recurrence_json TEXT NOT NULL,
+          confidence_score_bills REAL,
+          confidence_score_salary REAL,
+          confidence_score_sidegig REAL,
+          reviewer_bills INTEGER DEFAULT 0,
+          reviewer_salary INTEGER DEFAULT 0,
+          reviewer_sidegig INTEGER DEFAULT 0,
+          user_not_bills INTEGER,
+          user_not_salary INTEGER,
+          user_not_sidegig INTEGER,
+          user_need_level TEXT CHECK (user_need_level IN ('need', 'want', 'trial')),
+          necessity TEXT CHECK (necessity IN ('need', 'want', 'trial')),
+          next_user_remind_datetime TIMESTAMP,
+          user_remind_last_response TEXT,
+          user_cancelled_date DATE,
+          next_likely_payment_date DATE,
+          next_earliest_payment_date DATE,
+          next_latest_payment_date DATE,
+          next_payment_date_debug TEXT,
+          next_amount REAL,
+          last_transaction_date TIMESTAMP,
+          awaiting_new_transaction INTEGER,
+          necessity_update_date TIMESTAMP,
+          necessity_prompt_date TIMESTAMP,
+          frequency TEXT CHECK (frequency IN ('weekly', 'biweekly', 'monthly', 'quarterly', 'biannual', 'yearly', 'irregular', 'no_pattern')),
+          PRIMARY KEY (user_id, name),
+          FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+      ''')
+    
+      conn.commit()
+
+      # Bring indexes and later schema changes up to date (also upgrades existing chatbot.db files)
+      _apply_migrations(conn)
+
+  def get_schema_version(self) -> int:
+    """Get the highest migration version applied to this database"""
+    with self._connection() as conn:
+      return _get_schema_version(conn)
   
   def create_user(self, username: str, email: str) -> int:
     """Create a new user and return user ID"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    try:
-      cursor.execute(
-        "INSERT INTO users (username, email) VALUES (?, ?)",
-        (username, email)
-      )
-      user_id = cursor.lastrowid
-      conn.commit()
-      return user_id
-    except sqlite3.IntegrityError:
-      # User already exists, get their ID
-      cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-      result = cursor.fetchone()
-      return result[0] if result else None
-    finally:
-      conn.close()
-  
+      try:
+        cursor.execute(
+          "INSERT INTO users (username, email) VALUES (?, ?)",
+          (username, email)
+        )
+        user_id = cursor.lastrowid
+        conn.commit()
+        return user_id
+      except sqlite3.IntegrityError:
+        # User already exists, get their ID
+        conn.rollback()
+        cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+
   def get_user(self, username: str) -> Optional[Dict]:
     """Get user by username"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-    result = cursor.fetchone()
-    conn.close()
+      cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
+      result = cursor.fetchone()
     
     if result:
       return {
@@ -179,12 +563,11 @@ class Database:
   
   def get_all_users(self) -> List[Dict]:
     """Get all users from the database"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM users ORDER BY username")
-    results = cursor.fetchall()
-    conn.close()
+      cursor.execute("SELECT * FROM users ORDER BY username")
+      results = cursor.fetchall()
     
     users = []
     for result in results:
@@ -202,27 +585,26 @@ class Database:
                     balance_available: float, balance_current: float, 
                     account_name: str, account_mask: str, balance_limit: Optional[float] = None) -> int:
     """Create a new account and return account ID"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute(
-      "INSERT INTO accounts (user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask) VALUES (?, ?, ?, ?, ?, ?, ?)",
-      (user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask)
-    )
-    account_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+      cursor.execute(
+        "INSERT INTO accounts (user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask)
+      )
+      account_id = cursor.lastrowid
+      conn.commit()
+    _bump_data_version(self.db_path, user_id)
     
     return account_id
 
   def get_account(self, account_id: int) -> Optional[Dict]:
     """Get account by ID"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute("SELECT account_id, user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask FROM accounts WHERE account_id = ?", (account_id,))
-    result = cursor.fetchone()
-    conn.close()
+      cursor.execute("SELECT account_id, user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask FROM accounts WHERE account_id = ?", (account_id,))
+      result = cursor.fetchone()
     
     if result:
       return {
@@ -239,12 +621,11 @@ class Database:
 
   def get_accounts_by_user(self, user_id: int) -> List[Dict]:
     """Get all accounts for a specific user"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute("SELECT account_id, user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask FROM accounts WHERE user_id = ? ORDER BY account_type, account_name", (user_id,))
-    results = cursor.fetchall()
-    conn.close()
+      cursor.execute("SELECT account_id, user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask FROM accounts WHERE user_id = ? ORDER BY account_type, account_name", (user_id,))
+      results = cursor.fetchall()
     
     accounts = []
     for result in results:
@@ -261,14 +642,24 @@ class Database:
     
     return accounts
 
+  def get_accounts_df_by_user(self, user_id: int) -> pd.DataFrame:
+    """Get all accounts for a specific user as a typed DataFrame"""
+    with self._connection() as conn:
+      df = _frame_from_cursor(
+        conn.execute("SELECT account_id, user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask FROM accounts WHERE user_id = ? ORDER BY account_type, account_name", (user_id,)),
+        _ACCOUNT_FRAME_DTYPES,
+        date_columns=()
+      )
+    
+    return df
+
   def get_all_accounts(self) -> List[Dict]:
     """Get all accounts from the database"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute("SELECT account_id, user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask FROM accounts ORDER BY user_id, account_type, account_name")
-    results = cursor.fetchall()
-    conn.close()
+      cursor.execute("SELECT account_id, user_id, account_type, balance_available, balance_current, balance_limit, account_name, account_mask FROM accounts ORDER BY user_id, account_type, account_name")
+      results = cursor.fetchall()
     
     accounts = []
     for result in results:
@@ -289,26 +680,25 @@ class Database:
   def create_transaction(self, user_id: int, account_id: int, transaction_id: int,
                         date: str, transaction_name: str, amount: float, category: str) -> int:
     """Create a new transaction and return transaction ID"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute(
-      "INSERT INTO transactions (transaction_id, user_id, account_id, date, transaction_name, amount, category) VALUES (?, ?, ?, ?, ?, ?, ?)",
-      (transaction_id, user_id, account_id, date, transaction_name, amount, category)
-    )
-    conn.commit()
-    conn.close()
+      cursor.execute(
+        "INSERT INTO transactions (transaction_id, user_id, account_id, date, transaction_name, amount, category) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (transaction_id, user_id, account_id, date, transaction_name, amount, category)
+      )
+      conn.commit()
+    _bump_data_version(self.db_path, user_id)
     
     return transaction_id
 
   def get_transaction(self, transaction_id: int) -> Optional[Dict]:
     """Get transaction by ID"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute("SELECT * FROM transactions WHERE transaction_id = ?", (transaction_id,))
-    result = cursor.fetchone()
-    conn.close()
+      cursor.execute("SELECT * FROM transactions WHERE transaction_id = ?", (transaction_id,))
+      result = cursor.fetchone()
     
     if result:
       return {
@@ -324,61 +714,50 @@ class Database:
 
   def get_transactions_by_user(self, user_id: int) -> List[Dict]:
     """Get all transactions for a specific user"""
-    # Category name to ID mapping
-    _CATEGORY_NAME_TO_ID = {
-      'meals': 1,
-      'meals_groceries': 4,
-      'meals_dining_out': 2,
-      'meals_delivered_food': 3,
-      'leisure': 5,
-      'leisure_entertainment': 6,
-      'leisure_travel': 7,
-      'bills': 9,
-      'bills_connectivity': 10,
-      'bills_insurance': 11,
-      'bills_tax': 12,
-      'bills_service_fees': 13,
-      'shelter': 14,
-      'shelter_home': 15,
-      'shelter_utilities': 16,
-      'shelter_upkeep': 17,
-      'education': 18,
-      'education_kids_activities': 19,
-      'education_tuition': 20,
-      'shopping': 21,
-      'shopping_clothing': 22,
-      'shopping_gadgets': 23,
-      'shopping_kids': 24,
-      'shopping_pets': 8,
-      'transportation': 25,
-      'transportation_public': 27,
-      'transportation_car': 26,
-      'health': 28,
-      'health_medical_pharmacy': 29,
-      'health_gym_wellness': 30,
-      'health_personal_care': 31,
-      'donations_gifts': 32,
-      'income': 47,
-      'income_salary': 36,
-      'income_sidegig': 37,
-      'income_business': 38,
-      'income_interest': 39,
-      'uncategorized': -1,
-      'transfers': 45,
-      'miscellaneous': 33,
-    }
-    
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT transaction_id, user_id, account_id, date, transaction_name, amount, category FROM transactions WHERE user_id = ? ORDER BY date DESC", (user_id,))
-    results = cursor.fetchall()
-    conn.close()
+    return self.query_transactions(user_id)
+
+  def query_transactions(self, user_id: int,
+                         start: Optional[Union[str, date]] = None,
+                         end: Optional[Union[str, date]] = None,
+                         categories: Optional[List[str]] = None,
+                         exclude_categories: Optional[List[str]] = None,
+                         name_contains: Optional[str] = None,
+                         amount_min: Optional[float] = None,
+                         amount_max: Optional[float] = None,
+                         limit: Optional[int] = None,
+                         order: str = "desc") -> List[Dict]:
+    """Get a user's transactions with filters evaluated in SQL rather than after loading.
+
+    Args:
+      user_id: The user to read transactions for
+      start: Inclusive lower bound on ``date`` (``YYYY-MM-DD`` string or date)
+      end: Inclusive upper bound on ``date`` (``YYYY-MM-DD`` string or date)
+      categories: Only include these category names
+      exclude_categories: Drop these category names
+      name_contains: Case-insensitive substring match on ``transaction_name``
+      amount_min: Inclusive lower bound on ``amount``
+      amount_max: Inclusive upper bound on ``amount``
+      limit: Maximum number of rows to return
+      order: ``"desc"`` (newest first, default) or ``"asc"`` by date
+
+    Returns:
+      List of transaction dicts, same shape as ``get_transactions_by_user``
+    """
+    query, params = _build_transactions_query(
+      _TRANSACTION_COLUMNS_SQL, user_id, start, end, categories, exclude_categories,
+      name_contains, amount_min, amount_max, limit, order
+    )
+    
+    with self._connection() as conn:
+      cursor = conn.cursor()
+    
+      cursor.execute(query, params)
+      results = cursor.fetchall()
     
     transactions = []
     for result in results:
       category_name = result[6]
-      ai_category_id = _CATEGORY_NAME_TO_ID.get(category_name, -1)  # Default to uncategorized if not found
+      ai_category_id = _TRANSACTION_CATEGORY_NAME_TO_ID.get(category_name, -1)  # Default to uncategorized if not found
       transactions.append({
         'transaction_id': result[0],
         'user_id': result[1],
@@ -392,14 +771,50 @@ class Database:
     
     return transactions
 
+  def query_transactions_df(self, user_id: int,
+                            start: Optional[Union[str, date]] = None,
+                            end: Optional[Union[str, date]] = None,
+                            categories: Optional[List[str]] = None,
+                            exclude_categories: Optional[List[str]] = None,
+                            name_contains: Optional[str] = None,
+                            amount_min: Optional[float] = None,
+                            amount_max: Optional[float] = None,
+                            limit: Optional[int] = None,
+                            order: str = "desc",
+                            date_offset_days: int = 0) -> pd.DataFrame:
+    """Columnar variant of ``query_transactions``: same filters, typed DataFrame built directly from the cursor.
+
+    Dtypes: ``date`` datetime64[ns], ``category`` object (str), int32 ids, float64 ``amount``.
+    ``date_offset_days`` shifts returned dates forward in SQL (demo date roll);
+    rows are still ordered by stored date and ``start``/``end`` compare against the shifted dates.
+    """
+    query, params = _build_transactions_query(
+      _ROLLED_TRANSACTION_FRAME_COLUMNS_SQL if date_offset_days else _TRANSACTION_FRAME_COLUMNS_SQL,
+      user_id, start, end, categories, exclude_categories,
+      name_contains, amount_min, amount_max, limit, order, date_offset_days
+    )
+    
+    with self._connection() as conn:
+      df = _frame_from_cursor(conn.execute(query, params), _TRANSACTION_FRAME_DTYPES)
+    
+    return _with_ai_category_id(df)
+
+  def get_latest_transaction_date(self, user_id: int) -> Optional[str]:
+    """Get the most recent transaction date (``YYYY-MM-DD``) for a user, or None if they have none"""
+    with self._connection() as conn:
+      result = conn.execute("SELECT MAX(date) FROM transactions WHERE user_id = ?", (user_id,)).fetchone()
+    
+    if result and result[0] is not None:
+      return _transaction_date_to_iso(result[0])
+    return None
+
   def get_transactions_by_account(self, account_id: int) -> List[Dict]:
     """Get all transactions for a specific account"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute("SELECT transaction_id, user_id, account_id, date, transaction_name, amount, category FROM transactions WHERE account_id = ? ORDER BY date DESC", (account_id,))
-    results = cursor.fetchall()
-    conn.close()
+      cursor.execute("SELECT transaction_id, user_id, account_id, date, transaction_name, amount, category FROM transactions WHERE account_id = ? ORDER BY date DESC", (account_id,))
+      results = cursor.fetchall()
     
     transactions = []
     for result in results:
@@ -417,12 +832,11 @@ class Database:
 
   def get_all_transactions(self) -> List[Dict]:
     """Get all transactions from the database"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute("SELECT transaction_id, user_id, account_id, date, transaction_name, amount, category FROM transactions ORDER BY date DESC")
-    results = cursor.fetchall()
-    conn.close()
+      cursor.execute("SELECT transaction_id, user_id, account_id, date, transaction_name, amount, category FROM transactions ORDER BY date DESC")
+      results = cursor.fetchall()
     
     transactions = []
     for result in results:
@@ -438,83 +852,95 @@ class Database:
     
     return transactions
 
+  def get_transactions_df_by_account(self, account_id: int) -> pd.DataFrame:
+    """Get all transactions for a specific account as a typed DataFrame"""
+    with self._connection() as conn:
+      df = _frame_from_cursor(
+        conn.execute(f"SELECT {_TRANSACTION_FRAME_COLUMNS_SQL} FROM transactions WHERE account_id = ? ORDER BY date DESC", (account_id,)),
+        _TRANSACTION_FRAME_DTYPES
+      )
+    
+    return df
+
+  def get_all_transactions_df(self) -> pd.DataFrame:
+    """Get all transactions from the database as a typed DataFrame"""
+    with self._connection() as conn:
+      df = _frame_from_cursor(
+        conn.execute(f"SELECT {_TRANSACTION_FRAME_COLUMNS_SQL} FROM transactions ORDER BY date DESC"),
+        _TRANSACTION_FRAME_DTYPES
+      )
+    
+    return df
+
   # AI Monthly Forecasts management methods
   def create_monthly_forecast(self, user_id: int, ai_category_id: int, month_date: str, forecasted_amount: float) -> None:
     """Create or update a monthly forecast"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute(
-      "INSERT OR REPLACE INTO ai_monthly_forecasts (user_id, ai_category_id, month_date, forecasted_amount) VALUES (?, ?, ?, ?)",
-      (user_id, ai_category_id, month_date, forecasted_amount)
-    )
-    conn.commit()
-    conn.close()
+      cursor.execute(
+        "INSERT OR REPLACE INTO ai_monthly_forecasts (user_id, ai_category_id, month_date, forecasted_amount) VALUES (?, ?, ?, ?)",
+        (user_id, ai_category_id, month_date, forecasted_amount)
+      )
+      conn.commit()
+    _bump_data_version(self.db_path, user_id)
 
   def get_monthly_forecasts_by_user(self, user_id: int) -> pd.DataFrame:
     """Get all monthly forecasts for a specific user"""
-    conn = sqlite3.connect(self.db_path)
-    
-    df = pd.read_sql_query(
-      "SELECT user_id, ai_category_id, month_date AS start_date, forecasted_amount FROM ai_monthly_forecasts WHERE user_id = ? ORDER BY month_date ASC, ai_category_id ASC",
-      conn,
-      params=(user_id,),
-      parse_dates=['start_date']
-    )
-    conn.close()
+    with self._connection() as conn:
+      df = pd.read_sql_query(
+        "SELECT user_id, ai_category_id, month_date AS start_date, forecasted_amount FROM ai_monthly_forecasts WHERE user_id = ? ORDER BY month_date ASC, ai_category_id ASC",
+        conn,
+        params=(user_id,),
+        parse_dates=['start_date']
+      )
     
     return df
 
   def get_all_monthly_forecasts(self) -> pd.DataFrame:
     """Get all monthly forecasts from the database"""
-    conn = sqlite3.connect(self.db_path)
-    
-    df = pd.read_sql_query(
-      "SELECT user_id, ai_category_id, month_date AS start_date, forecasted_amount FROM ai_monthly_forecasts ORDER BY month_date ASC, ai_category_id ASC",
-      conn,
-      parse_dates=['start_date']
-    )
-    conn.close()
+    with self._connection() as conn:
+      df = pd.read_sql_query(
+        "SELECT user_id, ai_category_id, month_date AS start_date, forecasted_amount FROM ai_monthly_forecasts ORDER BY month_date ASC, ai_category_id ASC",
+        conn,
+        parse_dates=['start_date']
+      )
     
     return df
 
   # AI Weekly Forecasts management methods
   def create_weekly_forecast(self, user_id: int, ai_category_id: int, sunday_date: str, forecasted_amount: float) -> None:
     """Create or update a weekly forecast"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    cursor.execute(
-      "INSERT OR REPLACE INTO ai_weekly_forecasts (user_id, ai_category_id, sunday_date, forecasted_amount) VALUES (?, ?, ?, ?)",
-      (user_id, ai_category_id, sunday_date, forecasted_amount)
-    )
-    conn.commit()
-    conn.close()
+      cursor.execute(
+        "INSERT OR REPLACE INTO ai_weekly_forecasts (user_id, ai_category_id, sunday_date, forecasted_amount) VALUES (?, ?, ?, ?)",
+        (user_id, ai_category_id, sunday_date, forecasted_amount)
+      )
+      conn.commit()
+    _bump_data_version(self.db_path, user_id)
 
   def get_weekly_forecasts_by_user(self, user_id: int) -> pd.DataFrame:
     """Get all weekly forecasts for a specific user"""
-    conn = sqlite3.connect(self.db_path)
-    
-    df = pd.read_sql_query(
-      "SELECT user_id, ai_category_id, sunday_date AS start_date, forecasted_amount FROM ai_weekly_forecasts WHERE user_id = ? ORDER BY sunday_date ASC, ai_category_id ASC",
-      conn,
-      params=(user_id,),
-      parse_dates=['start_date']
-    )
-    conn.close()
+    with self._connection() as conn:
+      df = pd.read_sql_query(
+        "SELECT user_id, ai_category_id, sunday_date AS start_date, forecasted_amount FROM ai_weekly_forecasts WHERE user_id = ? ORDER BY sunday_date ASC, ai_category_id ASC",
+        conn,
+        params=(user_id,),
+        parse_dates=['start_date']
+      )
     
     return df
 
   def get_all_weekly_forecasts(self) -> pd.DataFrame:
     """Get all weekly forecasts from the database"""
-    conn = sqlite3.connect(self.db_path)
-    
-    df = pd.read_sql_query(
-      "SELECT user_id, ai_category_id, sunday_date AS start_date, forecasted_amount FROM ai_weekly_forecasts ORDER BY sunday_date ASC, ai_category_id ASC",
-      conn,
-      parse_dates=['start_date']
-    )
-    conn.close()
+    with self._connection() as conn:
+      df = pd.read_sql_query(
+        "SELECT user_id, ai_category_id, sunday_date AS start_date, forecasted_amount FROM ai_weekly_forecasts ORDER BY sunday_date ASC, ai_category_id ASC",
+        conn,
+        parse_dates=['start_date']
+      )
     
     return df
 
@@ -527,43 +953,42 @@ class Database:
                          frequency: Optional[str] = None,
                          next_likely_payment_date: Optional[str] = None) -> None:
     """Create or update a subscription"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
+    with self._connection() as conn:
+      cursor = conn.cursor()
     
-    import json
-    recurrence_json_str = json.dumps(recurrence_json)
+      import json
+      recurrence_json_str = json.dumps(recurrence_json)
     
-    cursor.execute('''
-      INSERT OR REPLACE INTO user_recurring_transactions 
-      (user_id, name, recurrence_json, confidence_score_bills, confidence_score_salary, 
-       confidence_score_sidegig, next_amount, frequency, next_likely_payment_date)
-      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (user_id, name.lower(), recurrence_json_str, confidence_score_bills,
-          confidence_score_salary, confidence_score_sidegig, next_amount, frequency, next_likely_payment_date))
+      cursor.execute('''
+        INSERT OR REPLACE INTO user_recurring_transactions 
+        (user_id, name, recurrence_json, confidence_score_bills, confidence_score_salary, 
+         confidence_score_sidegig, next_amount, frequency, next_likely_payment_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+      ''', (user_id, name.lower(), recurrence_json_str, confidence_score_bills,
+            confidence_score_salary, confidence_score_sidegig, next_amount, frequency, next_likely_payment_date))
     
-    conn.commit()
-    conn.close()
+      conn.commit()
+    _bump_data_version(self.db_path, user_id)
 
   def get_subscription_transactions(self, user_id: int, confidence_score_bills_threshold: float = 0.5) -> List[Dict]:
     """Get subscription transactions by joining transactions with user_recurring_transactions"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-      SELECT DISTINCT t.transaction_id, t.user_id, t.account_id, t.date, t.transaction_name, t.amount, t.category,
-             urt.name as subscription_name, urt.confidence_score_bills, urt.reviewer_bills
-      FROM transactions t
-      INNER JOIN user_recurring_transactions urt
-          ON lower(t.transaction_name) = urt.name
-      WHERE t.user_id = ?
-          AND t.user_id = urt.user_id
-          AND ((urt.confidence_score_bills > ?)
-          OR (urt.reviewer_bills = 1))
-      ORDER BY t.date DESC
-    ''', (user_id, confidence_score_bills_threshold))
-    
-    results = cursor.fetchall()
-    conn.close()
+    with self._connection() as conn:
+      cursor = conn.cursor()
+    
+      cursor.execute('''
+        SELECT DISTINCT t.transaction_id, t.user_id, t.account_id, t.date, t.transaction_name, t.amount, t.category,
+               urt.name as subscription_name, urt.confidence_score_bills, urt.reviewer_bills
+        FROM transactions t
+        INNER JOIN user_recurring_transactions urt
+            ON lower(t.transaction_name) = urt.name
+        WHERE t.user_id = ?
+            AND t.user_id = urt.user_id
+            AND ((urt.confidence_score_bills > ?)
+            OR (urt.reviewer_bills = 1))
+        ORDER BY t.date DESC
+      ''', (user_id, confidence_score_bills_threshold))
+    
+      results = cursor.fetchall()
     
     transactions = []
     for result in results:
@@ -582,28 +1007,45 @@ class Database:
     
     return transactions
 
+  def get_subscription_transactions_df(self, user_id: int, confidence_score_bills_threshold: float = 0.5) -> pd.DataFrame:
+    """Columnar variant of ``get_subscription_transactions``, built directly from the cursor"""
+    with self._connection() as conn:
+      df = _frame_from_cursor(conn.execute('''
+        SELECT DISTINCT t.transaction_id, t.user_id, t.account_id, substr(t.date, 1, 10) AS date, t.transaction_name, t.amount, t.category,
+               urt.name as subscription_name, urt.confidence_score_bills, urt.reviewer_bills
+        FROM transactions t
+        INNER JOIN user_recurring_transactions urt
+            ON lower(t.transaction_name) = urt.name
+        WHERE t.user_id = ?
+            AND t.user_id = urt.user_id
+            AND ((urt.confidence_score_bills > ?)
+            OR (urt.reviewer_bills = 1))
+        ORDER BY t.date DESC
+      ''', (user_id, confidence_score_bills_threshold)), _SUBSCRIPTION_TRANSACTION_FRAME_DTYPES)
+    
+    return df
+
   def get_subscriptions(self, user_id: int) -> List[Dict]:
     """Get all subscriptions for a specific user"""
-    conn = sqlite3.connect(self.db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-      SELECT user_id, name, last_reviewed_datetime, recurrence_json, 
-             confidence_score_bills, confidence_score_salary, confidence_score_sidegig,
-             reviewer_bills, reviewer_salary, reviewer_sidegig,
-             user_not_bills, user_not_salary, user_not_sidegig,
-             user_need_level, necessity, next_user_remind_datetime,
-             user_remind_last_response, user_cancelled_date,
-             next_likely_payment_date, next_earliest_payment_date, next_latest_payment_date,
-             next_payment_date_debug, next_amount, last_transaction_date,
-             awaiting_new_transaction, necessity_update_date, necessity_prompt_date
-      FROM user_recurring_transactions 
-      WHERE user_id = ? 
-      ORDER BY name ASC
-    ''', (user_id,))
-    
-    results = cursor.fetchall()
-    conn.close()
+    with self._connection() as conn:
+      cursor = conn.cursor()
+    
+      cursor.execute('''
+        SELECT user_id, name, last_reviewed_datetime, recurrence_json, 
+               confidence_score_bills, confidence_score_salary, confidence_score_sidegig,
+               reviewer_bills, reviewer_salary, reviewer_sidegig,
+               user_not_bills, user_not_salary, user_not_sidegig,
+               user_need_level, necessity, next_user_remind_datetime,
+               user_remind_last_response, user_cancelled_date,
+               next_likely_payment_date, next_earliest_payment_date, next_latest_payment_date,
+               next_payment_date_debug, next_amount, last_transaction_date,
+               awaiting_new_transaction, necessity_update_date, necessity_prompt_date
+        FROM user_recurring_transactions 
+        WHERE user_id = ? 
+        ORDER BY name ASC
+      ''', (user_id,))
+    
+      results = cursor.fetchall()
     
     import json
     subscriptions = []
@@ -1,7 +1,16 @@
 from database import Database
 from flask import Flask, request, jsonify
 from gemini_agent_code_gen import create_gemini_agent_code_gen
+from penny.tool_funcs.dataframe_cache import get_dataframe_cache_stats
+from penny.tool_funcs.genai_clients import get_genai_client_stats
+from penny.tool_funcs.llm_transport import get_llm_transport_stats
+from penny.tool_funcs.prompt_cache import get_user_prompt_cache_stats
+from penny.tool_funcs.prompt_prefix_cache import get_prompt_prefix_cache_stats
+from penny.tool_funcs.semantic_code_cache import get_semantic_code_cache_stats
+from penny.tool_funcs.restricted_compile_cache import get_compile_cache_stats
+from penny.tool_funcs.sandbox_result_cache import get_sandbox_result_cache_stats
 from planner_code_gen import create_planner_code_gen
+from sandbox_pool import get_sandbox_pool_stats
 from user_seeder import seed_users
 import json
 import logging
@@ -132,7 +141,18 @@ def get_users():
 @app.route('/health', methods=['GET'])
 def health_check():
   """Health check endpoint"""
-  return jsonify({'status': 'healthy'})
+  return jsonify({
+    'status': 'healthy',
+    'dataframe_cache': get_dataframe_cache_stats(),
+    'compile_cache': get_compile_cache_stats(),
+    'sandbox_pool': get_sandbox_pool_stats(),
+    'sandbox_result_cache': get_sandbox_result_cache_stats(),
+    'genai_clients': get_genai_client_stats(),
+    'llm_transport': get_llm_transport_stats(),
+    'user_prompt_cache': get_user_prompt_cache_stats(),
+    'prompt_prefix_cache': get_prompt_prefix_cache_stats(),
+    'semantic_code_cache': get_semantic_code_cache_stats(),
+  })
 
 if __name__ == '__main__':
   app.run(debug=True, host='0.0.0.0', port=5001)
@@ -1,23 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
 from google import genai
 from google.genai import types
+import hashlib
+import logging
 import os
+import threading
 import time
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 from datetime import datetime
 import sandbox
 from database import Database
+from penny.tool_funcs.genai_clients import get_genai_client
+from penny.tool_funcs.prompt_cache import cached_user_prompt, prompt_section_stats
+from penny.tool_funcs.prompt_prefix_cache import get_prompt_prefix_cache, start_stream
+from penny.tool_funcs.semantic_code_cache import get_semantic_code_cache
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Reads the rest of a response stream while its code is already executing
+_STREAM_READER = ThreadPoolExecutor(max_workers=8, thread_name_prefix="penny-stream-reader")
+
+
+def _read_rest_of_stream(stream) -> tuple:
+  """Remaining chunks of ``stream`` and the time it ended"""
+  chunks = list(stream)
+  return chunks, time.time()
+
+
 class GeminiAgentCodeGen:
   """Handles all Gemini API interactions for code generation"""
   
-  def __init__(self, model_name="gemini-2.0-flash"):
-    """Initialize the Gemini agent with API configuration for code generation"""
+  def __init__(self, model_name="gemini-2.0-flash", stream_execution: Optional[bool] = None):
+    """Initialize the Gemini agent with API configuration for code generation
+
+    With ``stream_execution`` (default: PENNY_STREAM_EXECUTION, off unless "1"), generated code is executed as soon as
+    its code block is closed, with user data prefetched while the model is still writing it.
+    """
     # API Configuration
-    self.client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+    self.client = get_genai_client()
     
     # Model Configuration
     if "-thinking" in model_name:
@@ -32,6 +56,9 @@ class GeminiAgentCodeGen:
     self.top_p = 0.95
     self.max_output_tokens = 2048
     self.thinking_budget_default = 2048
+    if stream_execution is None:
+      stream_execution = os.getenv('PENNY_STREAM_EXECUTION', '0') == '1'
+    self.stream_execution = stream_execution
     
     # Safety Settings
     self.safety_settings = [
@@ -263,6 +290,19 @@ These are the valid `category` values.
     #     - Panda's dataframe columns: `device_id`, `name`, `device_type`, `room_name`, `user_id`, `is_on`, `brightness`, `color_name`, `target_temperature`
     #     - `device_id` is a str type, `is_on` is a boolean type, `brightness` is an integer (0-100), `target_temperature` is a float.
 
+    # Static prompt prefixes are built once; each request only appends the user's sections and the conversation
+    self.few_shot_examples = self._create_few_shot_examples()
+    self.system_prompt_prefix = self.system_prompt + "\n\n"
+    self.request_prefix = f"<EXAMPLES>\n{self.few_shot_examples}\n</EXAMPLES>\n\ninput: "
+    # With provider-side prompt caching, the system prompt and few-shot examples are cached as one prefix
+    self.prompt_prefix_cache = get_prompt_prefix_cache()
+    self.cached_prefix_contents = [
+      types.Content(role="user", parts=[types.Part.from_text(text=f"<EXAMPLES>\n{self.few_shot_examples}\n</EXAMPLES>")])
+    ]
+    # Programs that executed successfully are reused for repeated requests under the same prompt
+    self.code_cache = get_semantic_code_cache()
+    self.prompt_version = hashlib.sha256((self.system_prompt_prefix + self.request_prefix).encode("utf-8")).hexdigest()
+
   
   def _build_account_names_section(self, user_id: int) -> str:
     """
@@ -328,6 +368,83 @@ These are the valid `category` values.
 {subscription_names_text}
 </SUBSCRIPTION_NAMES>"""
 
+  def _build_user_prompt_suffix(self, user_id: int) -> str:
+    """
+    Build the per-user end of the system prompt (ACCOUNT_NAMES and SUBSCRIPTION_NAMES sections).
+    Cached until the user's data changes, so follow-up turns skip the account and subscription queries.
+    """
+    return cached_user_prompt(
+      "code_gen_user_sections",
+      user_id,
+      lambda: self._build_account_names_section(user_id) + "\n\n" + self._build_subscription_names_section(user_id),
+    )
+
+  def _build_request(self, user_prompt_suffix: str, recent_conversation: str, cached_content: Optional[str] = None) -> Tuple[List[types.Content], types.GenerateContentConfig]:
+    """
+    Build the contents and configuration of one request.
+    Without ``cached_content`` this is the agent's usual prompt: the user's sections end the system instruction, and
+    the few-shot examples and the conversation share one user turn. With ``cached_content`` the shared static
+    prefix is referenced instead of sent; a cached request cannot set its own system instruction, so only there do
+    the user's sections move to the request turn.
+    """
+    if cached_content is None:
+      request_text = f"{self.request_prefix}{recent_conversation}\noutput:"
+      system_instruction = [types.Part.from_text(text=self.system_prompt_prefix + user_prompt_suffix)]
+    else:
+      request_text = f"{user_prompt_suffix}\n\ninput: {recent_conversation}\noutput:"
+      system_instruction = None
+    contents = [types.Content(role="user", parts=[types.Part.from_text(text=request_text)])]
+    generate_content_config = types.GenerateContentConfig(
+      temperature=self.temperature,
+      top_p=self.top_p,
+      max_output_tokens=self.max_output_tokens,
+      safety_settings=self.safety_settings,
+      system_instruction=system_instruction,
+      cached_content=cached_content,
+      thinking_config=types.ThinkingConfig(thinking_budget=self.thinking_budget),
+    )
+    return contents, generate_content_config
+
+  def _execute_cached_program(self, scope: tuple, recent_conversation: str, timing_data: Dict, user_id: int, request_start: float) -> Optional[Dict]:
+    """
+    Execute the program cached for this conversation, skipping the model call.
+    Returns None on a miss, or when the cached program no longer executes (it is dropped and the model is asked again).
+    """
+    cached = self.code_cache.get(scope, recent_conversation)
+    if cached is None:
+      return None
+    code, similarity, cached_request = cached
+    tool_profile = []
+    execution_start = time.time()
+    try:
+      success, output_string, logs, goals_list = sandbox.execute_agent_with_tools(code, user_id, profile=tool_profile)
+    except Exception:
+      success = False
+    execution_end = time.time()
+    if not success:
+      self.code_cache.invalidate(scope, cached_request)
+      return None
+
+    timing_data['code_cache'] = {'hit': True, 'similarity': similarity, 'request': cached_request}
+    timing_data['output_tokens'] = 0
+    timing_data['prompt_tokens'] = 0
+    timing_data['time_to_first_token_ms'] = None
+    timing_data['time_to_code_complete_ms'] = (execution_start - request_start) * 1000
+    timing_data['execution_time'].append({
+      'call_number': 1,
+      'start_time': execution_start,
+      'end_time': execution_end,
+      'duration_ms': (execution_end - execution_start) * 1000,
+      'profile': tool_profile
+    })
+    return {
+      'response': output_string,
+      'function_called': None,
+      'execution_success': success,
+      'code_generated': code,
+      'logs': logs
+    }
+
   def _create_few_shot_examples(self) -> str:
     """
     Create few-shot examples for code generation.
@@ -800,46 +917,90 @@ def process_input():
     
     gemini_start = time.time()
     
-    # Create few-shot examples and request text
-    few_shot_examples = self._create_few_shot_examples()
-    request_text = types.Part.from_text(text=f"""<EXAMPLES>
-{few_shot_examples}
-</EXAMPLES>
+    # The static prefix is combined with the user's account names and subscription names and the conversation
+    user_prompt_suffix = self._build_user_prompt_suffix(user_id)
+    timing_data['prompt_sections'] = prompt_section_stats({
+      'system_prompt': self.system_prompt_prefix,
+      'user_sections': user_prompt_suffix,
+      'few_shot_examples': self.request_prefix,
+      'conversation': recent_conversation,
+    })
 
-input: {recent_conversation}
-output:""")
-    
-    # Create content and configuration
-    contents = [types.Content(role="user", parts=[request_text])]
-    
-    # Build dynamic ACCOUNT_NAMES section for this user
-    account_names_section = self._build_account_names_section(user_id)
-    # Build dynamic SUBSCRIPTION_NAMES section for this user
-    subscription_names_section = self._build_subscription_names_section(user_id)
-    # Combine system prompt with dynamic account names and subscription names
-    full_system_prompt = self.system_prompt + "\n\n" + account_names_section + "\n\n" + subscription_names_section
-    
-    generate_content_config = types.GenerateContentConfig(
-      temperature=self.temperature,
-      top_p=self.top_p,
-      max_output_tokens=self.max_output_tokens,
-      safety_settings=self.safety_settings,
-      system_instruction=[types.Part.from_text(text=full_system_prompt)],
-      thinking_config=types.ThinkingConfig(thinking_budget=self.thinking_budget),
-    )
+    # A program generated earlier for the same request under the same prompt skips the model call
+    code_cache_scope = None
+    if self.code_cache is not None:
+      user_prompt_version = hashlib.sha256(user_prompt_suffix.encode("utf-8")).hexdigest()
+      code_cache_scope = (self.model_name, self.thinking_budget, self.prompt_version, user_prompt_version)
+      cached_response = self._execute_cached_program(code_cache_scope, recent_conversation, timing_data, user_id, gemini_start)
+      if cached_response is not None:
+        return cached_response
+
+    cached_content = None
+    if self.prompt_prefix_cache is not None:
+      cached_content = self.prompt_prefix_cache.handle(self.model_name, self.system_prompt, self.cached_prefix_contents)
+
+    def open_stream(cached_content):
+      contents, generate_content_config = self._build_request(user_prompt_suffix, recent_conversation, cached_content)
+      return self.client.models.generate_content_stream(
+        model=self.model_name,
+        contents=contents,
+        config=generate_content_config,
+      )
 
-    # Generate response
+    # Generate response (in streaming mode, stop reading once the code block is closed and execute it right away)
     output_text = ""
     output_tokens = 0
+    prompt_tokens = None
     last_chunk = None
-    for chunk in self.client.models.generate_content_stream(
-      model=self.model_name,
-      contents=contents,
-      config=generate_content_config,
-    ):
+    first_token_time = None
+    code_complete_time = None
+    tool_profile = []
+    streaming = sandbox.StreamingExecution(user_id, tool_profile) if self.stream_execution else None
+    stream, cached_content = start_stream(open_stream, self.prompt_prefix_cache, cached_content)
+    timing_data['cached_prompt_prefix'] = cached_content
+    for chunk in stream:
+      last_chunk = chunk
       if chunk.text is not None:
+        if first_token_time is None:
+          first_token_time = time.time()
         output_text += chunk.text
-      last_chunk = chunk
+        if streaming is not None and streaming.feed(chunk.text):
+          code_complete_time = time.time()
+          break
+    
+    # Read the trailing tokens and usage metadata while the code runs
+    rest_of_stream = _STREAM_READER.submit(_read_rest_of_stream, stream) if code_complete_time is not None else None
+    gemini_end = time.time()
+    execution_start = code_complete_time or gemini_end
+    
+    # Execute the generated code in sandbox, profiling each tool call
+    try:
+      if streaming is not None:
+        success, output_string, logs, goals_list = streaming.execute()
+      else:
+        success, output_string, logs, goals_list = sandbox.execute_agent_with_tools(output_text, user_id, profile=tool_profile)
+    except Exception as e:
+      # Extract logs from error message if available
+      error_str = str(e)
+      logs = ""
+      if "Captured logs:" in error_str:
+        logs = error_str.split("Captured logs:")[-1].strip()
+      success = False
+      output_string = f"Error executing code: {error_str}"
+    
+    execution_end = time.time()
+    
+    if rest_of_stream is not None:
+      try:
+        trailing_chunks, gemini_end = rest_of_stream.result()
+      except Exception as e:
+        # The code has already run; losing the trailing tokens only loses the usage metadata
+        logger.warning(f"Reading the rest of the response stream failed after execution: {e}")
+        trailing_chunks, gemini_end, last_chunk = [], time.time(), None
+      for chunk in trailing_chunks:
+        if chunk.text is not None:
+          output_text += chunk.text
+        last_chunk = chunk
     
     # Extract usage metadata from the last chunk if available
     # The usage metadata is typically only available in the last chunk of a streaming response
@@ -847,31 +1008,23 @@ output:""")
       # Try different ways to access usage metadata
       if hasattr(last_chunk, 'usage_metadata') and last_chunk.usage_metadata:
         output_tokens = getattr(last_chunk.usage_metadata, 'output_token_count', 0) or getattr(last_chunk.usage_metadata, 'candidates_token_count', 0)
+        prompt_tokens = getattr(last_chunk.usage_metadata, 'prompt_token_count', None)
       elif hasattr(last_chunk, 'candidates') and last_chunk.candidates:
         # Check if usage metadata is in candidates
         for candidate in last_chunk.candidates:
           if hasattr(candidate, 'usage_metadata') and candidate.usage_metadata:
             output_tokens = getattr(candidate.usage_metadata, 'output_token_count', 0) or getattr(candidate.usage_metadata, 'candidates_token_count', 0)
+            prompt_tokens = getattr(candidate.usage_metadata, 'prompt_token_count', None)
             break
     
-    gemini_end = time.time()
-    
-    # Store output tokens in timing data
+    # Store token counts and streaming latencies in timing data
     timing_data['output_tokens'] = output_tokens
-    
-    # Execute the generated code in sandbox
-    try:
-      success, output_string, logs, goals_list = sandbox.execute_agent_with_tools(output_text, user_id)
-    except Exception as e:
-      # Extract logs from error message if available
-      error_str = str(e)
-      logs = ""
-      if "Captured logs:" in error_str:
-        logs = error_str.split("Captured logs:")[-1].strip()
-      success = False
-      output_string = f"Error executing code: {error_str}"
-    
-    execution_end = time.time()
+    timing_data['prompt_tokens'] = prompt_tokens
+    timing_data['time_to_first_token_ms'] = (first_token_time - gemini_start) * 1000 if first_token_time is not None else None
+    timing_data['time_to_code_complete_ms'] = (execution_start - gemini_start) * 1000
+    if code_cache_scope is not None:
+      stored = success is True and self.code_cache.put(code_cache_scope, recent_conversation, sandbox.extract_sandboxed_code(output_text))
+      timing_data['code_cache'] = {'hit': False, 'stored': stored}
     
     # Record timing data
     timing_data['gemini_api_calls'].append({
@@ -882,9 +1035,10 @@ output:""")
     })
     timing_data['execution_time'].append({
       'call_number': 1,
-      'start_time': gemini_end,
+      'start_time': execution_start,
       'end_time': execution_end,
-      'duration_ms': (execution_end - gemini_end) * 1000
+      'duration_ms': (execution_end - execution_start) * 1000,
+      'profile': tool_profile
     })
     
     return {
@@ -927,6 +1081,21 @@ output:""")
       raise Exception(f"Failed to get models: {str(e)}")
 
 
+_AGENTS: Dict[Tuple[str, str], GeminiAgentCodeGen] = {}
+_AGENTS_LOCK = threading.Lock()
+
+
 def create_gemini_agent_code_gen(model_name="gemini-2.0-flash"):
-  """Create a new Gemini agent code gen instance with the specified model"""
-  return GeminiAgentCodeGen(model_name)
+  """Gemini agent code gen instance for the specified model, shared across requests.
+
+  Agents keep no per-request state; one is built per model and day, as the system prompt embeds today's date.
+  """
+  today = datetime.now().strftime("%Y-%m-%d")
+  with _AGENTS_LOCK:
+    agent = _AGENTS.get((model_name, today))
+    if agent is None:
+      for key in [key for key in _AGENTS if key[1] != today]:
+        del _AGENTS[key]
+      agent = GeminiAgentCodeGen(model_name)
+      _AGENTS[(model_name, today)] = agent
+    return agent
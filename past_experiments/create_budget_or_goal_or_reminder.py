@@ -9,6 +9,7 @@ from dotenv import load_dotenv
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import sandbox
 from database import Database
+from penny.tool_funcs.genai_clients import get_genai_client
 
 # Load environment variables
 load_dotenv()
@@ -271,7 +272,7 @@ class CreateBudgetOrGoalOrReminder:
   def __init__(self, model_name="gemini-flash-lite-latest"):
     """Initialize the Gemini agent with API configuration"""
     # API Configuration
-    self.client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+    self.client = get_genai_client()
     
     # Model Configuration
     self.thinking_budget = 0
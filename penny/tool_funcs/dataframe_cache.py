@@ -0,0 +1,172 @@
+"""
+Process-wide cache of the DataFrames returned by the retrieval tools.
+Follow-up chat turns from the same user reuse the frames loaded by earlier turns instead of re-reading SQLite.
+Entries are keyed by user, dataset, call arguments and the user's data version (bumped by Database.create_*),
+evicted least-recently-used once the cache exceeds its byte budget, and expire after a TTL so writes made by
+other processes are eventually picked up. Each entry keeps the log lines of the load that produced it, which hits
+replay, so the logs a run returns do not depend on cache state.
+"""
+
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from typing import Callable, Dict, Hashable, Optional, Tuple
+import inspect
+import os
+import threading
+import time
+import pandas as pd
+from database import Database
+from penny.tool_funcs.sandbox_logging import log, log_capture
+
+# Byte budget across all cached frames (PENNY_DF_CACHE_MAX_BYTES, default 64 MiB; 0 disables the cache)
+_DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Seconds an entry stays valid regardless of data version (PENNY_DF_CACHE_TTL_SECONDS)
+_DEFAULT_TTL_SECONDS = 300.0
+
+
+class DataFrameCache:
+  """LRU cache of DataFrames bounded by total memory usage, with per-entry TTL and hit/miss counters"""
+
+  def __init__(self, max_bytes: int = _DEFAULT_MAX_BYTES, ttl_seconds: float = _DEFAULT_TTL_SECONDS):
+    self.max_bytes = max_bytes
+    self.ttl_seconds = ttl_seconds
+    self._entries: "OrderedDict[Hashable, Tuple[pd.DataFrame, int, float, Tuple[str, ...]]]" = OrderedDict()
+    self._bytes = 0
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
+
+  def get(self, key: Hashable) -> Optional[Tuple[pd.DataFrame, Tuple[str, ...]]]:
+    """Cached frame for ``key`` and the log lines of its load (marked most recently used), or None when absent or expired"""
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+        self._remove(key)
+        self.expirations += 1
+        entry = None
+      if entry is None:
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry[0], entry[3]
+
+  def put(self, key: Hashable, frame: pd.DataFrame, logs: Tuple[str, ...] = ()) -> None:
+    """Store ``frame`` (and the log lines of its load) under ``key``, evicting least recently used entries to stay within ``max_bytes``"""
+    nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+    with self._lock:
+      if key in self._entries:
+        self._remove(key)
+      if nbytes > self.max_bytes:
+        return
+      while self._entries and self._bytes + nbytes > self.max_bytes:
+        oldest_key = next(iter(self._entries))
+        self._remove(oldest_key)
+        self.evictions += 1
+      self._entries[key] = (frame, nbytes, time.monotonic(), logs)
+      self._bytes += nbytes
+
+  def discard_user(self, db_path: str, user_id: int, keep_version: Optional[int] = None) -> None:
+    """Drop ``user_id``'s entries, except those at ``keep_version`` (keys start with ``(db_path, user_id, version)``)"""
+    with self._lock:
+      stale = [k for k in self._entries if k[:2] == (db_path, user_id) and k[2] != keep_version]
+      for key in stale:
+        self._remove(key)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+      self._bytes = 0
+
+  def stats(self) -> Dict[str, float]:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        'hits': self.hits,
+        'misses': self.misses,
+        'hit_rate': self.hits / lookups if lookups else 0.0,
+        'evictions': self.evictions,
+        'expirations': self.expirations,
+        'entries': len(self._entries),
+        'bytes': self._bytes,
+        'max_bytes': self.max_bytes,
+      }
+
+  def _remove(self, key: Hashable) -> None:
+    nbytes = self._entries.pop(key)[1]
+    self._bytes -= nbytes
+
+
+_CACHE = DataFrameCache(
+  max_bytes=int(os.environ.get("PENNY_DF_CACHE_MAX_BYTES", _DEFAULT_MAX_BYTES)),
+  ttl_seconds=float(os.environ.get("PENNY_DF_CACHE_TTL_SECONDS", _DEFAULT_TTL_SECONDS)),
+)
+
+
+def get_dataframe_cache_stats() -> Dict[str, float]:
+  """Hit/miss/eviction counters and current size of the process-wide DataFrame cache"""
+  return _CACHE.stats()
+
+
+def clear_dataframe_cache() -> None:
+  """Drop every cached frame (counters are kept)"""
+  _CACHE.clear()
+
+
+def disable_dataframe_cache() -> None:
+  """Stop caching in this process, e.g. in sandbox pool workers that cannot see other processes' data versions"""
+  _CACHE.max_bytes = 0
+  _CACHE.clear()
+
+
+def _call_recording_logs(func: Callable[..., pd.DataFrame], args: tuple, kwargs: dict) -> Tuple[pd.DataFrame, Tuple[str, ...]]:
+  """``func(*args, **kwargs)`` and the log lines it wrote, which still reach the current capture (also when it raises)"""
+  buffer = None
+  try:
+    with log_capture() as buffer:
+      frame = func(*args, **kwargs)
+  finally:
+    messages = tuple(buffer.messages()) if buffer is not None else ()
+    for message in messages:
+      log(message)
+  return frame, messages
+
+
+def cached_user_frame(dataset: str) -> Callable:
+  """Decorator caching a ``retrieve_*(user_id, ...)`` function's DataFrame result across requests.
+
+  Callers always receive a copy, so generated code can mutate its frame freely, and hits log the same lines as
+  the load did. The key also carries the current day because transaction dates are rolled relative to today for
+  stale demo users.
+  """
+  def decorator(func: Callable[..., pd.DataFrame]) -> Callable[..., pd.DataFrame]:
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs) -> pd.DataFrame:
+      if _CACHE.max_bytes <= 0:
+        return func(*args, **kwargs)
+      bound = signature.bind(*args, **kwargs)
+      bound.apply_defaults()
+      arguments = dict(bound.arguments)
+      user_id = arguments.pop('user_id')
+      db = Database()
+      version = db.get_data_version(user_id)
+      key = (db.db_path, user_id, version, dataset, repr(sorted(arguments.items())), date.today().isoformat())
+      cached = _CACHE.get(key)
+      if cached is not None:
+        frame, messages = cached
+        for message in messages:
+          log(message)
+        return frame.copy()
+      # Older versions of this user's data can no longer be hit
+      _CACHE.discard_user(db.db_path, user_id, keep_version=version)
+      frame, messages = _call_recording_logs(func, args, kwargs)
+      _CACHE.put(key, frame, messages)
+      return frame.copy()
+
+    return wrapper
+  return decorator
@@ -1,4 +1,5 @@
 import re
+import numpy as np
 import pandas as pd
 from penny.tool_funcs.sandbox_logging import log
 from categories import get_all_parent_categories, get_parents_with_leaves_as_dict_categories, get_name
@@ -6,6 +7,54 @@ from categories import get_all_parent_categories, get_parents_with_leaves_as_dic
 MAX_FORECASTS = 10
 
 
+def child_to_parent_category_ids() -> dict:
+  """Map each child category ID to its parent (parents map to themselves in categories.py and are excluded)"""
+  return {
+    child_id: parent_id
+    for parent_id, leaf_ids in get_parents_with_leaves_as_dict_categories().items()
+    for child_id in leaf_ids
+    if child_id != parent_id
+  }
+
+
+def children_by_date_and_parent(df: pd.DataFrame, child_to_parent: dict) -> pd.DataFrame:
+  """Aggregate child forecast rows per (start_date, parent ai_category_id) in one pass.
+  
+  Returns a frame indexed by (start_date, ai_category_id) with ``children_count`` (child rows present),
+  ``children_sum`` (their ``forecasted_amount``, NaN counted as 0) and ``first_child_position`` (iloc
+  position of the group's first child row). Rows without a start_date are ignored, like in a groupby.
+  
+  Children are added left to right in row order, matching ``Series.sum`` over a group's rows bit for bit
+  (groupby's compensated sum and ``np.add.reduceat`` can both differ in the last place).
+  """
+  positions = np.flatnonzero((df['ai_category_id'].isin(child_to_parent.keys()) & df['start_date'].notna()).to_numpy())
+  children = df.iloc[positions]
+  keys = pd.MultiIndex.from_arrays(
+    [children['start_date'], children['ai_category_id'].map(child_to_parent).astype(df['ai_category_id'].dtype)],
+    names=['start_date', 'ai_category_id'],
+  )
+  if children.empty:
+    return pd.DataFrame({'children_count': [], 'children_sum': [], 'first_child_position': []}, index=keys)
+  
+  # Lay each group's amounts out in one row of a zero-padded (groups x max children) matrix, in row order
+  codes, unique_keys = keys.factorize()
+  order = np.argsort(codes, kind='stable')
+  sorted_codes = codes[order]
+  counts = np.bincount(sorted_codes, minlength=len(unique_keys))
+  group_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+  amounts = np.zeros((len(unique_keys), counts.max()))
+  amounts[sorted_codes, np.arange(len(sorted_codes)) - group_starts[sorted_codes]] = (
+    children['forecasted_amount'].fillna(0.0).to_numpy(dtype='float64')[order]
+  )
+  sums = amounts[:, 0].copy()
+  for column in amounts[:, 1:].T:
+    sums += column
+  return pd.DataFrame(
+    {'children_count': counts, 'children_sum': sums, 'first_child_position': positions[order[group_starts]]},
+    index=unique_keys.set_names(keys.names),
+  )
+
+
 def _consolidate_parent_categories(df: pd.DataFrame) -> tuple[pd.DataFrame, set[int]]:
   """Consolidate child categories into parent categories when all children are present.
   
@@ -24,68 +73,58 @@ def _consolidate_parent_categories(df: pd.DataFrame) -> tuple[pd.DataFrame, set[
     tuple: (consolidated DataFrame, set of consolidated parent category IDs)
   """
   total_count = len(df)
-  consolidated_parent_ids = set()
+  if df.empty:
+    return df.copy(), set()
   
   parent_to_leaf_categories = get_parents_with_leaves_as_dict_categories()
-  df_consolidated = df.copy()
-  rows_to_remove = []
-  rows_to_add = []
-  
-  # Group by start_date to process each date separately
-  for start_date, date_group in df.groupby('start_date'):
-    # For each parent category, check if all children are present
-    for parent_id, children_ids in parent_to_leaf_categories.items():
-      # Get children category IDs (excluding the parent itself)
-      child_ids = [cid for cid in children_ids if cid != parent_id]
-      
-      if not child_ids:
-        continue
-      
-      # Check if all children are present in this date group
-      children_in_group = date_group[date_group['ai_category_id'].isin(child_ids)]
-      if len(children_in_group) == len(child_ids):
-        # All children are present - consolidate into parent
-        # Only consolidate if df has more than 10 rows, OR if this is a filtered query
-        # (we can detect filtered queries by checking if parent is not in the original df)
-        parent_in_df = date_group[date_group['ai_category_id'] == parent_id]
-        should_consolidate = total_count > 10 or parent_in_df.empty
-        
-        if should_consolidate:
-          # Use original_forecasted_amount from parent if available, otherwise sum children
-          if not parent_in_df.empty and 'original_forecasted_amount' in parent_in_df.columns:
-            parent_forecast = parent_in_df['original_forecasted_amount'].iloc[0]
-          else:
-            parent_forecast = children_in_group['forecasted_amount'].sum()
-          
-          # Get parent category name
-          parent_category_name = get_name(parent_id)
-          if not parent_category_name:
-            continue
-          
-          # Mark child rows for removal
-          child_indices = children_in_group.index.tolist()
-          rows_to_remove.extend(child_indices)
-          
-          # Create parent row
-          parent_row = children_in_group.iloc[0].copy()
-          parent_row['ai_category_id'] = parent_id
-          parent_row['category'] = parent_category_name
-          parent_row['forecasted_amount'] = parent_forecast
-          # Set original_forecasted_amount if it exists
-          if 'original_forecasted_amount' in parent_row:
-            parent_row['original_forecasted_amount'] = parent_forecast
-          rows_to_add.append(parent_row)
-          consolidated_parent_ids.add(parent_id)
-          
-          log(f"**Consolidating Parent Category**: Replacing {len(child_ids)} children of parent {parent_id} ({parent_category_name}) with parent forecast ${parent_forecast:.0f} for {start_date}")
-  
-  # Remove child rows and add parent rows
-  if rows_to_remove:
-    df_consolidated = df_consolidated.drop(index=rows_to_remove)
-    if rows_to_add:
-      parent_df = pd.DataFrame(rows_to_add)
-      df_consolidated = pd.concat([df_consolidated, parent_df], ignore_index=True)
-  
+  child_to_parent = child_to_parent_category_ids()
+  groups = children_by_date_and_parent(df, child_to_parent)
+  
+  # A (start_date, parent) group is consolidated when every child is present, and either the frame is
+  # large or the parent has no row of its own that date (a filtered query)
+  parent_ids = groups.index.get_level_values('ai_category_id')
+  expected_counts = parent_ids.map(lambda parent_id: sum(cid != parent_id for cid in parent_to_leaf_categories[parent_id]))
+  is_parent_row = df['ai_category_id'].isin(parent_to_leaf_categories.keys()) & df['start_date'].notna()
+  parent_rows = df[is_parent_row].drop_duplicates(['start_date', 'ai_category_id'])
+  parent_rows_by_key = parent_rows.set_index(['start_date', 'ai_category_id'])
+  has_parent_row = groups.index.isin(parent_rows_by_key.index)
+  parent_names = parent_ids.map(lambda parent_id: get_name(parent_id))
+  groups['parent_name'] = parent_names
+  consolidate = (groups['children_count'].to_numpy() == np.asarray(expected_counts)) & (total_count > 10 or ~has_parent_row)
+  consolidate &= np.array([bool(name) for name in parent_names])
+  groups = groups[consolidate]
+  if groups.empty:
+    return df.copy(), set()
+  
+  # Use original_forecasted_amount from the parent's row if available, otherwise the sum of children
+  parent_forecasts = groups['children_sum'].copy()
+  if 'original_forecasted_amount' in df.columns:
+    parent_originals = parent_rows_by_key['original_forecasted_amount'].reindex(groups.index)
+    has_original = groups.index.isin(parent_rows_by_key.index)
+    parent_forecasts[has_original] = parent_originals[has_original]
+  
+  # Emit parents by date, then in categories.py order, each built from the group's first child row
+  parent_order = {parent_id: i for i, parent_id in enumerate(parent_to_leaf_categories)}
+  groups = groups.assign(
+    parent_forecast=parent_forecasts,
+    _date=groups.index.get_level_values('start_date'),
+    _parent_order=groups.index.get_level_values('ai_category_id').map(parent_order),
+  ).sort_values(['_date', '_parent_order'], kind='stable')
+  
+  parent_df = df.iloc[groups['first_child_position'].to_numpy()].copy()
+  parent_df['ai_category_id'] = groups.index.get_level_values('ai_category_id').to_numpy()
+  parent_df['category'] = groups['parent_name'].to_numpy()
+  parent_df['forecasted_amount'] = groups['parent_forecast'].to_numpy()
+  if 'original_forecasted_amount' in parent_df.columns:
+    parent_df['original_forecasted_amount'] = groups['parent_forecast'].to_numpy()
+  
+  # Remove every child row of a consolidated group and append the parent rows
+  row_keys = pd.MultiIndex.from_arrays([df['start_date'], df['ai_category_id'].map(child_to_parent)])
+  is_consolidated_child = row_keys.isin(groups.index) & df['ai_category_id'].isin(child_to_parent.keys()).to_numpy()
+  df_consolidated = pd.concat([df[~is_consolidated_child], parent_df], ignore_index=True)
+  
+  consolidated_parent_ids = set(groups.index.get_level_values('ai_category_id').tolist())
+  log(f"**Consolidating Parent Categories**: Replaced the children of {len(groups)} parent forecasts with the parent ({', '.join(sorted(set(groups['parent_name'])))})")
   return df_consolidated, consolidated_parent_ids
 
 
@@ -0,0 +1,61 @@
+"""
+Process-wide registry of google-genai clients.
+A genai.Client owns an httpx connection pool, so agents that are created per request (or per skill call) share one
+client per API key and HTTP options instead of repeating connection and TLS setup to the model endpoint on every
+chat turn. Idle connections are kept open for PENNY_GENAI_KEEPALIVE_SECONDS (default 120; httpx closes them after
+5). Clients are safe to use from several threads. Model calls go through the transport selected by
+PENNY_LLM_TRANSPORT (see llm_transport), so agents can be recorded and replayed offline.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+import json
+import os
+import threading
+import httpx
+from google import genai
+from penny.tool_funcs.llm_transport import transport_client
+
+_DEFAULT_KEEPALIVE_SECONDS = 120.0
+_DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+
+_CLIENTS: Dict[Tuple[Optional[str], str], genai.Client] = {}
+_LOCK = threading.Lock()
+
+
+def _client_args() -> Dict[str, Any]:
+  return {
+    'limits': httpx.Limits(
+      max_keepalive_connections=_DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+      keepalive_expiry=float(os.environ.get("PENNY_GENAI_KEEPALIVE_SECONDS", _DEFAULT_KEEPALIVE_SECONDS)),
+    ),
+  }
+
+
+def get_genai_client(api_key: Optional[str] = None, http_options: Optional[Dict[str, Any]] = None) -> genai.Client:
+  """Shared client for ``api_key`` (default: GEMINI_API_KEY) and ``http_options`` (a genai HttpOptions dict), created on first use"""
+  if api_key is None:
+    api_key = os.getenv('GEMINI_API_KEY')
+  options = dict(http_options or {})
+  key = (api_key, json.dumps(options, sort_keys=True, default=repr))
+  with _LOCK:
+    client = _CLIENTS.get(key)
+    if client is None:
+      options.setdefault('client_args', _client_args())
+      client = transport_client(lambda: genai.Client(api_key=api_key, http_options=options))
+      _CLIENTS[key] = client
+    return client
+
+
+def get_genai_client_stats() -> Dict[str, int]:
+  """Number of shared clients"""
+  with _LOCK:
+    return {'clients': len(_CLIENTS)}
+
+
+def close_genai_clients() -> None:
+  """Close and forget every shared client (the next ``get_genai_client`` creates a new one)"""
+  with _LOCK:
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+  for client in clients:
+    client.close()
@@ -0,0 +1,274 @@
+"""
+Record/replay transport for Gemini calls, so agents can be benchmarked and profiled without the network.
+Shared clients from ``get_genai_client`` route ``models.generate_content`` and ``models.generate_content_stream``
+through the transport selected by PENNY_LLM_TRANSPORT:
+
+  live    (default) calls go to the API unchanged
+  record  calls go to the API; each response is appended to PENNY_LLM_RECORDING as one JSONL line holding the
+          request hash and every chunk with the delay before it
+  replay  calls are answered from PENNY_LLM_RECORDING without network access; PENNY_LLM_REPLAY_TIMING=recorded
+          (default) sleeps the recorded delays, zero returns every chunk at once, isolating our own overhead
+
+Requests are matched by a hash of the method, model, contents and config. ``cached_content`` is left out of the
+hash, because handle names differ between runs. Prompts that embed today's date (the code-gen system prompt) hash
+differently on another day; with PENNY_LLM_REPLAY_STRICT=0 a request without an exact match gets the next unused
+recording for the same method and model, in recorded order. Otherwise it raises ReplayMissError.
+
+Replay never creates a network client for model calls; other client attributes (e.g. ``caches``) still go to the
+API, so run replays with PENNY_PROMPT_CACHE off or fake.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_RECORDING = "llm_recording.jsonl"
+# Response fields that describe the HTTP exchange rather than the model output
+_EXCLUDED_RESPONSE_FIELDS = {'sdk_http_response'}
+
+
+class ReplayMissError(LookupError):
+  """A replayed request has no recording"""
+
+
+def _jsonable(value: Any) -> Any:
+  if hasattr(value, "model_dump"):
+    return value.model_dump(mode="json", exclude_none=True)
+  if isinstance(value, dict):
+    return {key: _jsonable(item) for key, item in value.items()}
+  if isinstance(value, (list, tuple)):
+    return [_jsonable(item) for item in value]
+  return value
+
+
+def request_key(method: str, model: str, contents: Any, config: Any) -> str:
+  """Hash identifying a request across runs"""
+  config = _jsonable(config) or {}
+  if isinstance(config, dict):
+    config = {name: value for name, value in config.items() if name not in ("cached_content", "http_options")}
+  payload = json.dumps({'method': method, 'model': model, 'contents': _jsonable(contents), 'config': config}, sort_keys=True)
+  return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMTransport:
+  """Recordings and counters shared by every client of a process"""
+
+  def __init__(self, mode: str = "live", path: str = _DEFAULT_RECORDING, replay_timing: str = "recorded", strict: bool = True):
+    self.mode = mode
+    self.path = path
+    self.replay_timing = replay_timing
+    self.strict = strict
+    self._lock = threading.Lock()
+    self._by_key: Dict[str, List[dict]] = defaultdict(list)
+    self._by_model: Dict[Tuple[str, str], List[dict]] = defaultdict(list)
+    self._used: set = set()
+    self.recorded = 0
+    self.replayed = 0
+    self.fallbacks = 0
+    self.misses = 0
+    if mode == "replay":
+      self._load()
+
+  def _load(self) -> None:
+    with open(self.path, encoding="utf-8") as f:
+      for index, line in enumerate(f):
+        if line.strip():
+          recording = json.loads(line)
+          recording['index'] = index
+          self._by_key[recording['key']].append(recording)
+          self._by_model[(recording['method'], recording['model'])].append(recording)
+
+  def record(self, key: str, method: str, model: str, chunks: List[dict], complete: bool) -> None:
+    line = json.dumps({
+      'key': key,
+      'method': method,
+      'model': model,
+      'recorded_at': datetime.now(timezone.utc).isoformat(),
+      'complete': complete,
+      'chunks': chunks,
+    })
+    with self._lock:
+      with open(self.path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+      self.recorded += 1
+
+  def lookup(self, key: str, method: str, model: str) -> dict:
+    """Recording for ``key``: unused ones in recorded order, then the last one again"""
+    with self._lock:
+      recordings = self._by_key.get(key)
+      if recordings:
+        recording = next((r for r in recordings if r['index'] not in self._used), recordings[-1])
+      elif not self.strict:
+        recording = next((r for r in self._by_model.get((method, model), []) if r['index'] not in self._used), None)
+        if recording is not None:
+          self.fallbacks += 1
+      else:
+        recording = None
+      if recording is None:
+        self.misses += 1
+        raise ReplayMissError(f"No recording of {method} for {model} (request {key[:12]}) in {self.path}")
+      self._used.add(recording['index'])
+      self.replayed += 1
+      return recording
+
+  def rewind(self) -> None:
+    """Make every recording available again, e.g. before another replay pass"""
+    with self._lock:
+      self._used.clear()
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      return {
+        'mode': self.mode,
+        'path': self.path if self.mode != "live" else None,
+        'recorded': self.recorded,
+        'replayed': self.replayed,
+        'fallbacks': self.fallbacks,
+        'misses': self.misses,
+      }
+
+
+class _RecordingModels:
+  def __init__(self, models, transport: LLMTransport):
+    self._models = models
+    self._transport = transport
+
+  def generate_content_stream(self, *, model: str, contents: Any, config: Any = None, **kwargs) -> Iterator:
+    key = request_key("generate_content_stream", model, contents, config)
+    stream = self._models.generate_content_stream(model=model, contents=contents, config=config, **kwargs)
+    return self._record_stream(key, model, stream)
+
+  def _record_stream(self, key: str, model: str, stream) -> Iterator:
+    chunks = []
+    complete = False
+    last = time.perf_counter()
+    try:
+      for chunk in stream:
+        now = time.perf_counter()
+        chunks.append({'delay_ms': (now - last) * 1000, 'response': chunk.model_dump(mode="json", exclude_none=True, exclude=_EXCLUDED_RESPONSE_FIELDS)})
+        last = now
+        yield chunk
+        last = time.perf_counter()
+      complete = True
+    finally:
+      # Abandoned streams are recorded too, marked incomplete
+      if chunks:
+        self._transport.record(key, "generate_content_stream", model, chunks, complete)
+
+  def generate_content(self, *, model: str, contents: Any, config: Any = None, **kwargs):
+    key = request_key("generate_content", model, contents, config)
+    start = time.perf_counter()
+    response = self._models.generate_content(model=model, contents=contents, config=config, **kwargs)
+    chunk = {'delay_ms': (time.perf_counter() - start) * 1000, 'response': response.model_dump(mode="json", exclude_none=True, exclude=_EXCLUDED_RESPONSE_FIELDS)}
+    self._transport.record(key, "generate_content", model, [chunk], True)
+    return response
+
+  def __getattr__(self, name: str):
+    return getattr(self._models, name)
+
+
+class _ReplayModels:
+  def __init__(self, transport: LLMTransport, client_factory: Callable[[], Any]):
+    self._transport = transport
+    self._client_factory = client_factory
+
+  def _sleep(self, chunk: dict) -> None:
+    if self._transport.replay_timing == "recorded":
+      time.sleep(chunk['delay_ms'] / 1000)
+
+  def generate_content_stream(self, *, model: str, contents: Any, config: Any = None, **kwargs) -> Iterator:
+    recording = self._transport.lookup(request_key("generate_content_stream", model, contents, config), "generate_content_stream", model)
+    return self._replay_stream(recording)
+
+  def _replay_stream(self, recording: dict) -> Iterator:
+    for chunk in recording['chunks']:
+      self._sleep(chunk)
+      yield types.GenerateContentResponse.model_validate(chunk['response'])
+
+  def generate_content(self, *, model: str, contents: Any, config: Any = None, **kwargs):
+    recording = self._transport.lookup(request_key("generate_content", model, contents, config), "generate_content", model)
+    for chunk in recording['chunks']:
+      self._sleep(chunk)
+    return types.GenerateContentResponse.model_validate(recording['chunks'][-1]['response'])
+
+  def __getattr__(self, name: str):
+    return getattr(self._client_factory().models, name)
+
+
+class TransportClient:
+  """genai.Client stand-in whose model calls go through ``transport``; everything else goes to the real client"""
+
+  def __init__(self, transport: LLMTransport, client_factory: Callable[[], Any]):
+    self._transport = transport
+    self._client_factory = client_factory
+    self._client = None
+    self._client_lock = threading.Lock()
+    if transport.mode == "record":
+      self.models = _RecordingModels(self._real_client().models, transport)
+    else:
+      self.models = _ReplayModels(transport, self._real_client)
+
+  def _real_client(self):
+    with self._client_lock:
+      if self._client is None:
+        self._client = self._client_factory()
+      return self._client
+
+  def close(self) -> None:
+    if self._client is not None:
+      self._client.close()
+
+  def __getattr__(self, name: str):
+    return getattr(self._real_client(), name)
+
+
+_TRANSPORT: Optional[LLMTransport] = None
+_TRANSPORT_LOCK = threading.Lock()
+
+
+def get_llm_transport() -> LLMTransport:
+  """Process-wide transport selected by PENNY_LLM_TRANSPORT (read on first use)"""
+  global _TRANSPORT
+  with _TRANSPORT_LOCK:
+    if _TRANSPORT is None:
+      mode = os.environ.get("PENNY_LLM_TRANSPORT", "live").lower()
+      if mode not in ("live", "record", "replay"):
+        raise ValueError(f"PENNY_LLM_TRANSPORT must be live, record or replay, not {mode!r}")
+      _TRANSPORT = LLMTransport(
+        mode=mode,
+        path=os.environ.get("PENNY_LLM_RECORDING", _DEFAULT_RECORDING),
+        replay_timing=os.environ.get("PENNY_LLM_REPLAY_TIMING", "recorded").lower(),
+        strict=os.environ.get("PENNY_LLM_REPLAY_STRICT", "1") != "0",
+      )
+    return _TRANSPORT
+
+
+def set_llm_transport(transport: Optional[LLMTransport]) -> None:
+  """Replace the process-wide transport (None: read the environment again on next use).
+  Clients already handed out keep their transport; call ``close_genai_clients`` first to get new ones.
+  """
+  global _TRANSPORT
+  with _TRANSPORT_LOCK:
+    _TRANSPORT = transport
+
+
+def transport_client(client_factory: Callable[[], Any]):
+  """``client_factory()`` when the transport is live, otherwise a TransportClient around it"""
+  transport = get_llm_transport()
+  if transport.mode == "live":
+    return client_factory()
+  return TransportClient(transport, client_factory)
+
+
+def get_llm_transport_stats() -> Optional[Dict[str, Any]]:
+  """Counters of the process-wide transport, or None when it has not been used"""
+  return _TRANSPORT.stats() if _TRANSPORT is not None else None
@@ -0,0 +1,108 @@
+"""
+Per-user prompt sections for the code-generation agents.
+Agents build the static part of their prompt (system instructions, few-shot examples) once; the per-user part
+(account and subscription names) is built from the database on first use and then cached per user and data version,
+so later turns skip those queries. Entries also expire after a TTL, because writes made by other processes do not
+change this process's data versions.
+
+PENNY_USER_PROMPT_CACHE_SIZE sets the number of users kept (default 256; 0 disables the cache) and
+PENNY_USER_PROMPT_CACHE_TTL_SECONDS the TTL (default 300).
+"""
+
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+import os
+import threading
+import time
+from database import Database
+
+_DEFAULT_MAX_ENTRIES = 256
+_DEFAULT_TTL_SECONDS = 300.0
+
+# Rough size of a Gemini token in UTF-8 bytes, for estimates made without calling the API
+_BYTES_PER_TOKEN = 4
+
+
+def prompt_section_stats(sections: Dict[str, str]) -> Dict[str, Dict[str, int]]:
+  """UTF-8 bytes and estimated tokens of each named prompt section"""
+  stats = {}
+  for name, text in sections.items():
+    size = len(text.encode("utf-8"))
+    stats[name] = {'bytes': size, 'estimated_tokens': -(-size // _BYTES_PER_TOKEN)}
+  return stats
+
+
+class UserPromptCache:
+  """LRU of per-user prompt text with per-entry TTL and hit/miss counters"""
+
+  def __init__(self, max_entries: int = _DEFAULT_MAX_ENTRIES, ttl_seconds: float = _DEFAULT_TTL_SECONDS):
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self._entries: "OrderedDict[Hashable, Tuple[str, float]]" = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key: Hashable) -> Optional[str]:
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None and time.monotonic() - entry[1] > self.ttl_seconds:
+        del self._entries[key]
+        entry = None
+      if entry is None:
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry[0]
+
+  def put(self, key: Hashable, text: str) -> None:
+    with self._lock:
+      self._entries[key] = (text, time.monotonic())
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self) -> Dict[str, float]:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        'hits': self.hits,
+        'misses': self.misses,
+        'hit_rate': self.hits / lookups if lookups else 0.0,
+        'entries': len(self._entries),
+        'max_entries': self.max_entries,
+      }
+
+
+_CACHE = UserPromptCache(
+  max_entries=int(os.environ.get("PENNY_USER_PROMPT_CACHE_SIZE", _DEFAULT_MAX_ENTRIES)),
+  ttl_seconds=float(os.environ.get("PENNY_USER_PROMPT_CACHE_TTL_SECONDS", _DEFAULT_TTL_SECONDS)),
+)
+
+
+def get_user_prompt_cache_stats() -> Dict[str, float]:
+  """Hit/miss counters and size of the process-wide per-user prompt cache"""
+  return _CACHE.stats()
+
+
+def clear_user_prompt_cache() -> None:
+  """Drop every cached section (counters are kept)"""
+  _CACHE.clear()
+
+
+def cached_user_prompt(name: str, user_id: int, build: Callable[[], str]) -> str:
+  """``build()``, or the text it returned for ``name`` and ``user_id`` while the user's data was unchanged"""
+  if _CACHE.max_entries <= 0:
+    return build()
+  db = Database()
+  key = (name, db.db_path, user_id, db.get_data_version(user_id))
+  text = _CACHE.get(key)
+  if text is None:
+    text = build()
+    _CACHE.put(key, text)
+  return text
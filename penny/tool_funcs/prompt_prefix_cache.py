@@ -0,0 +1,257 @@
+"""
+Provider-side caching of the static prompt prefix shared by every user of an agent.
+The code-gen and planner system prompts (plus the code-gen few-shot examples) are thousands of tokens that the model
+would otherwise ingest on every turn. With caching on, each (model, prompt version) gets a cached-content handle that
+requests reference instead of resending the prefix. Handles are created on first use, have their TTL extended
+shortly before they expire, and are recreated when the backend no longer knows them. Whenever the cache is
+unavailable, and for a while after creating or using a handle failed, callers get None and send the full prompt.
+
+Settings (environment):
+  PENNY_PROMPT_CACHE              off (default), genai (Gemini context caching) or fake (in-memory, no network)
+  PENNY_PROMPT_CACHE_TTL_SECONDS  lifetime requested for each handle (default 3600)
+"""
+
+from dataclasses import dataclass
+from datetime import timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import itertools
+import logging
+import os
+import threading
+import time
+from google.genai import types
+from penny.tool_funcs.genai_clients import get_genai_client
+from penny.tool_funcs.prompt_cache import prompt_section_stats
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_TTL_SECONDS = 3600.0
+# Seconds after a failed create before the same prefix is tried again
+_FAILURE_BACKOFF_SECONDS = 300.0
+
+
+def _prompt_text(system_instruction: str, contents: Optional[List[types.Content]]) -> str:
+  texts = [system_instruction]
+  for content in contents or []:
+    texts.extend(part.text or "" for part in content.parts or [])
+  return "\n".join(texts)
+
+
+class GenaiCacheBackend:
+  """Gemini context caching through ``client.caches``"""
+
+  def __init__(self, client):
+    self.client = client
+
+  def create(self, model: str, system_instruction: str, contents: Optional[List[types.Content]], ttl_seconds: float) -> Tuple[str, float]:
+    """Name and expiry (epoch seconds) of a new cached-content handle"""
+    cached = self.client.caches.create(
+      model=model,
+      config=types.CreateCachedContentConfig(
+        system_instruction=system_instruction,
+        contents=contents,
+        ttl=f"{int(ttl_seconds)}s",
+        display_name="penny-prompt-prefix",
+      ),
+    )
+    return cached.name, self._expiry(cached, ttl_seconds)
+
+  def refresh(self, name: str, ttl_seconds: float) -> float:
+    """Extend ``name``'s lifetime; returns its new expiry"""
+    cached = self.client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{int(ttl_seconds)}s"))
+    return self._expiry(cached, ttl_seconds)
+
+  def delete(self, name: str) -> None:
+    self.client.caches.delete(name=name)
+
+  @staticmethod
+  def _expiry(cached, ttl_seconds: float) -> float:
+    if cached.expire_time is not None:
+      expire_time = cached.expire_time
+      if expire_time.tzinfo is None:
+        expire_time = expire_time.replace(tzinfo=timezone.utc)
+      return expire_time.timestamp()
+    return time.time() + ttl_seconds
+
+
+class FakeCacheBackend:
+  """In-memory stand-in for Gemini context caching, for tests and benchmarks without network access.
+
+  ``cached_tokens(name)`` reports the estimated size of a live handle's prefix, so a fake model can skip
+  "ingesting" it. ``clock`` can be replaced to exercise expiry.
+  """
+
+  def __init__(self, clock: Callable[[], float] = time.time):
+    self.clock = clock
+    self.creates = 0
+    self.refreshes = 0
+    self._names = itertools.count(1)
+    self._entries: Dict[str, Tuple[str, int, float]] = {}
+    self._lock = threading.Lock()
+
+  def create(self, model: str, system_instruction: str, contents: Optional[List[types.Content]], ttl_seconds: float) -> Tuple[str, float]:
+    tokens = prompt_section_stats({'prefix': _prompt_text(system_instruction, contents)})['prefix']['estimated_tokens']
+    with self._lock:
+      name = f"cachedContents/fake-{next(self._names)}"
+      expiry = self.clock() + ttl_seconds
+      self._entries[name] = (model, tokens, expiry)
+      self.creates += 1
+    return name, expiry
+
+  def refresh(self, name: str, ttl_seconds: float) -> float:
+    with self._lock:
+      entry = self._live(name)
+      if entry is None:
+        raise KeyError(f"{name} not found")
+      expiry = self.clock() + ttl_seconds
+      self._entries[name] = (entry[0], entry[1], expiry)
+      self.refreshes += 1
+    return expiry
+
+  def delete(self, name: str) -> None:
+    with self._lock:
+      self._entries.pop(name, None)
+
+  def cached_tokens(self, name: str) -> Optional[int]:
+    """Estimated prefix tokens behind ``name``, or None when it does not exist or has expired"""
+    with self._lock:
+      entry = self._live(name)
+      return entry[1] if entry is not None else None
+
+  def _live(self, name: str) -> Optional[Tuple[str, int, float]]:
+    entry = self._entries.get(name)
+    if entry is not None and entry[2] <= self.clock():
+      del self._entries[name]
+      entry = None
+    return entry
+
+
+@dataclass
+class _Handle:
+  name: Optional[str] = None
+  expiry: float = 0.0
+  failed_at: Optional[float] = None
+
+
+class PromptPrefixCache:
+  """Cached-content handles per (model, prompt version), created and refreshed through ``backend``"""
+
+  def __init__(self, backend, ttl_seconds: float = _DEFAULT_TTL_SECONDS, refresh_margin_seconds: Optional[float] = None, clock: Callable[[], float] = time.time):
+    self.backend = backend
+    self.clock = clock
+    self.ttl_seconds = ttl_seconds
+    # Refresh once less than this much lifetime is left, so a request never references an expiring handle
+    self.refresh_margin_seconds = refresh_margin_seconds if refresh_margin_seconds is not None else max(60.0, ttl_seconds * 0.1)
+    self._handles: Dict[Tuple[str, str], _Handle] = {}
+    self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.creates = 0
+    self.refreshes = 0
+    self.failures = 0
+    self.invalidations = 0
+
+  def handle(self, model: str, system_instruction: str, contents: Optional[List[types.Content]] = None) -> Optional[str]:
+    """Name of a live handle caching this prefix for ``model``, or None when caching is unavailable"""
+    version = hashlib.sha256(_prompt_text(system_instruction, contents).encode("utf-8")).hexdigest()
+    key = (model, version)
+    with self._lock:
+      key_lock = self._locks.setdefault(key, threading.Lock())
+    with key_lock:
+      handle = self._handles.setdefault(key, _Handle())
+      now = self.clock()
+      if handle.name is not None and handle.expiry - now > self.refresh_margin_seconds:
+        self._count('hits')
+        return handle.name
+      if handle.name is None and handle.failed_at is not None and now - handle.failed_at < _FAILURE_BACKOFF_SECONDS:
+        return None
+      if handle.name is not None:
+        try:
+          handle.expiry = self.backend.refresh(handle.name, self.ttl_seconds)
+          self._count('refreshes')
+          return handle.name
+        except Exception as e:
+          logger.warning(f"Refreshing cached prompt prefix {handle.name} failed, creating a new one: {e}")
+          handle.name = None
+      try:
+        handle.name, handle.expiry = self.backend.create(model, system_instruction, contents, self.ttl_seconds)
+        handle.failed_at = None
+        self._count('creates')
+        return handle.name
+      except Exception as e:
+        logger.warning(f"Caching the prompt prefix for {model} failed, sending full prompts: {e}")
+        handle.failed_at = now
+        self._count('failures')
+        return None
+
+  def invalidate(self, name: str) -> None:
+    """Forget handle ``name`` after a request referencing it failed; its prefix is not cached again until the
+    failure backoff has passed, so a handle the backend keeps rejecting does not cost a failed request every turn"""
+    with self._lock:
+      handles = [handle for handle in self._handles.values() if handle.name == name]
+    now = self.clock()
+    for handle in handles:
+      handle.name = None
+      handle.failed_at = now
+    self._count('invalidations')
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      return {
+        'backend': type(self.backend).__name__,
+        'handles': sum(1 for handle in self._handles.values() if handle.name is not None),
+        'hits': self.hits,
+        'creates': self.creates,
+        'refreshes': self.refreshes,
+        'failures': self.failures,
+        'invalidations': self.invalidations,
+      }
+
+  def _count(self, counter: str) -> None:
+    with self._lock:
+      setattr(self, counter, getattr(self, counter) + 1)
+
+
+def start_stream(open_stream: Callable[[Optional[str]], Iterable], cache: Optional[PromptPrefixCache], cached_content: Optional[str]) -> Tuple[Iterator, Optional[str]]:
+  """``open_stream(cached_content)`` once its first chunk has arrived, and the handle it used.
+
+  When a request referencing ``cached_content`` fails before any output (e.g. the handle was deleted elsewhere),
+  the handle is invalidated and the request is sent again with the full prompt, ``open_stream(None)``; later turns
+  send the full prompt until the cache's failure backoff has passed.
+  """
+  try:
+    stream = iter(open_stream(cached_content))
+    first = next(stream, None)
+  except Exception as e:
+    if cached_content is None or cache is None:
+      raise
+    logger.warning(f"Request with cached prompt prefix {cached_content} failed, resending the full prompt: {e}")
+    cache.invalidate(cached_content)
+    return start_stream(open_stream, cache, None)
+  return itertools.chain([] if first is None else [first], stream), cached_content
+
+
+_CACHE: Optional[PromptPrefixCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_prompt_prefix_cache() -> Optional[PromptPrefixCache]:
+  """Process-wide prefix cache selected by PENNY_PROMPT_CACHE, or None when caching is off"""
+  global _CACHE
+  mode = os.environ.get("PENNY_PROMPT_CACHE", "off").lower()
+  if mode not in ("genai", "fake"):
+    return None
+  with _CACHE_LOCK:
+    if _CACHE is None:
+      if mode == "fake":
+        backend = FakeCacheBackend()
+      else:
+        backend = GenaiCacheBackend(get_genai_client())
+      _CACHE = PromptPrefixCache(backend, ttl_seconds=float(os.environ.get("PENNY_PROMPT_CACHE_TTL_SECONDS", _DEFAULT_TTL_SECONDS)))
+    return _CACHE
+
+
+def get_prompt_prefix_cache_stats() -> Optional[Dict[str, Any]]:
+  """Counters of the process-wide prefix cache, or None when it has not been used"""
+  return _CACHE.stats() if _CACHE is not None else None
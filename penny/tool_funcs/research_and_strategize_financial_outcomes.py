@@ -1,8 +1,8 @@
-from google import genai
 from google.genai import types
 import os
 from typing import Tuple
 from dotenv import load_dotenv
+from penny.tool_funcs.genai_clients import get_genai_client
 
 # Load environment variables
 load_dotenv()
@@ -55,7 +55,7 @@ class ResearchAndStrategizeOptimizer:
     api_key = os.getenv('GEMINI_API_KEY')
     if not api_key:
       raise ValueError("GEMINI_API_KEY environment variable is not set. Please set it in your .env file or environment.")
-    self.client = genai.Client(api_key=api_key)
+    self.client = get_genai_client(api_key)
     
     # Model Configuration
     self.thinking_budget = 4096
@@ -0,0 +1,195 @@
+"""
+Cache of RestrictedPython-compiled code objects for the sandbox.
+compile_restricted's AST transform runs on every sandbox execution, while generated programs for common
+questions are often byte-identical, so compiled code is kept in a bounded LRU keyed by a hash of the source,
+filename and mode. Setting PENNY_COMPILE_CACHE_DIR together with PENNY_COMPILE_CACHE_SECRET also persists entries
+to disk so a restarted process starts warm. Disk entries are HMAC-signed with the secret and only loaded when the
+signature verifies, so bytecode that did not come from compile_restricted is never run; the directory must be owned
+by this user and closed to group and others, otherwise disk persistence is disabled.
+"""
+
+from collections import OrderedDict
+from types import CodeType
+from typing import Dict, Optional
+from importlib import metadata
+import hashlib
+import hmac
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+from RestrictedPython import compile_restricted
+
+logger = logging.getLogger(__name__)
+
+# Compiled programs kept in memory (PENNY_COMPILE_CACHE_SIZE; 0 disables caching)
+_DEFAULT_MAX_ENTRIES = 256
+
+
+def _restricted_python_version() -> str:
+  try:
+    return metadata.version("RestrictedPython")
+  except metadata.PackageNotFoundError:
+    return "unknown"
+
+
+# Disk entries are only valid for the interpreter and RestrictedPython release that produced them
+_DISK_CACHE_TAG = f"{sys.implementation.cache_tag}-restrictedpython-{_restricted_python_version()}"
+
+
+# HMAC-SHA256 signature prepended to every disk entry
+_SIGNATURE_BYTES = 32
+
+
+def _private_directory(path: str) -> bool:
+  """Create ``path`` (mode 0700) if needed; True when it is a directory owned by this user without group/other access"""
+  try:
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.stat(path)
+  except OSError:
+    return False
+  return os.path.isdir(path) and st.st_uid == os.getuid() and st.st_mode & 0o077 == 0
+
+
+class RestrictedCompileCache:
+  """LRU of compiled code objects with hit/miss counters and time spent compiling"""
+
+  def __init__(self, max_entries: int = _DEFAULT_MAX_ENTRIES, cache_dir: Optional[str] = None, secret: Optional[bytes] = None):
+    self.max_entries = max_entries
+    self.cache_dir = None
+    self._secret = secret
+    if cache_dir:
+      if not secret:
+        logger.warning("PENNY_COMPILE_CACHE_DIR is set without PENNY_COMPILE_CACHE_SECRET; not persisting compiled code")
+      elif _private_directory(cache_dir):
+        self.cache_dir = cache_dir
+      else:
+        logger.warning(f"{cache_dir} is not a directory owned by this user with mode 0700; not persisting compiled code")
+    self._entries: "OrderedDict[str, CodeType]" = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.disk_hits = 0
+    self.misses = 0
+    self.compile_seconds = 0.0
+
+  def compile(self, source: str, filename: str = "<inline>", mode: str = "exec") -> CodeType:
+    """``compile_restricted(source, filename, mode)``, reusing the code object for source seen before.
+
+    Compilation errors propagate exactly as from ``compile_restricted`` and are not cached.
+    """
+    if self.max_entries <= 0:
+      with self._lock:
+        self.misses += 1
+      return self._compile(source, filename, mode)
+    key = hashlib.sha256(f"{mode}\0{filename}\0{source}".encode("utf-8")).hexdigest()
+    with self._lock:
+      code = self._entries.get(key)
+      if code is not None:
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return code
+
+    code = self._load_from_disk(key)
+    if code is not None:
+      with self._lock:
+        self.disk_hits += 1
+    else:
+      with self._lock:
+        self.misses += 1
+      code = self._compile(source, filename, mode)
+      self._save_to_disk(key, code)
+
+    with self._lock:
+      self._entries[key] = code
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+    return code
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self) -> Dict[str, float]:
+    with self._lock:
+      lookups = self.hits + self.disk_hits + self.misses
+      return {
+        'hits': self.hits,
+        'disk_hits': self.disk_hits,
+        'misses': self.misses,
+        'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        'entries': len(self._entries),
+        'max_entries': self.max_entries,
+        'compile_ms_total': self.compile_seconds * 1000,
+        'compile_ms_avg': self.compile_seconds * 1000 / self.misses if self.misses else 0.0,
+      }
+
+  def _compile(self, source: str, filename: str, mode: str) -> CodeType:
+    start = time.perf_counter()
+    try:
+      return compile_restricted(source, filename=filename, mode=mode)
+    finally:
+      elapsed = time.perf_counter() - start
+      with self._lock:
+        self.compile_seconds += elapsed
+
+  def _disk_path(self, key: str) -> str:
+    return os.path.join(self.cache_dir, f"{key}.{_DISK_CACHE_TAG}.marshal")
+
+  def _signature(self, key: str, data: bytes) -> bytes:
+    return hmac.new(self._secret, key.encode("ascii") + b"\0" + data, hashlib.sha256).digest()
+
+  def _load_from_disk(self, key: str) -> Optional[CodeType]:
+    if not self.cache_dir:
+      return None
+    try:
+      with open(self._disk_path(key), "rb") as f:
+        signed = f.read()
+    except OSError:
+      return None
+    signature, data = signed[:_SIGNATURE_BYTES], signed[_SIGNATURE_BYTES:]
+    if not hmac.compare_digest(signature, self._signature(key, data)):
+      logger.warning(f"Ignoring compiled code with an invalid signature: {self._disk_path(key)}")
+      return None
+    try:
+      code = marshal.loads(data)
+    except (EOFError, ValueError, TypeError):
+      return None
+    return code if isinstance(code, CodeType) else None
+
+  def _save_to_disk(self, key: str, code: CodeType) -> None:
+    if not self.cache_dir:
+      return
+    try:
+      data = marshal.dumps(code)
+      # Write then rename so concurrent readers never see a partial file
+      tmp_path = f"{self._disk_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+      with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+        f.write(self._signature(key, data) + data)
+      os.replace(tmp_path, self._disk_path(key))
+    except OSError:
+      pass
+
+
+_CACHE = RestrictedCompileCache(
+  max_entries=int(os.environ.get("PENNY_COMPILE_CACHE_SIZE", _DEFAULT_MAX_ENTRIES)),
+  cache_dir=os.environ.get("PENNY_COMPILE_CACHE_DIR") or None,
+  secret=os.environ.get("PENNY_COMPILE_CACHE_SECRET", "").encode("utf-8") or None,
+)
+
+
+def compile_restricted_cached(source: str, filename: str = "<inline>", mode: str = "exec") -> CodeType:
+  """Drop-in for ``compile_restricted`` backed by the process-wide compile cache"""
+  return _CACHE.compile(source, filename=filename, mode=mode)
+
+
+def get_compile_cache_stats() -> Dict[str, float]:
+  """Hit/miss counters and compile time of the process-wide compile cache"""
+  return _CACHE.stats()
+
+
+def clear_compile_cache() -> None:
+  """Drop every in-memory entry (counters and disk entries are kept)"""
+  _CACHE.clear()
@@ -2,6 +2,7 @@ import json
 import re
 from database import Database
 import pandas as pd
+from penny.tool_funcs.dataframe_cache import cached_user_frame
 from penny.tool_funcs.sandbox_logging import log
 
 
@@ -21,8 +22,7 @@ ACCOUNT_STRING_TO_TYPE = {v: k for k, v in ACCOUNT_TYPE_TO_STRING.items()}
 def _get_accounts_with_mapping(user_id: int = 1) -> pd.DataFrame:
   """Helper function to retrieve accounts from the database and map account types"""
   db = Database()
-  accounts = db.get_accounts_by_user(user_id=user_id)
-  df = pd.DataFrame(accounts)
+  df = db.get_accounts_df_by_user(user_id=user_id)
   
   if 'account_type' in df.columns and 'account_subtype' in df.columns:
     # Mapping dictionary: (account_type, account_subtype) -> standardized_account_type
@@ -49,6 +49,7 @@ def _get_accounts_with_mapping(user_id: int = 1) -> pd.DataFrame:
   return df
 
 
+@cached_user_frame("depository_accounts")
 def retrieve_depository_accounts_function_code_gen(user_id: int = 1) -> pd.DataFrame:
   """Function to retrieve depository accounts (checking, savings, money market) from the database for a specific user"""
   df = _get_accounts_with_mapping(user_id=user_id)
@@ -65,6 +66,7 @@ def retrieve_depository_accounts_function_code_gen(user_id: int = 1) -> pd.DataF
   return depository_df
 
 
+@cached_user_frame("credit_accounts")
 def retrieve_credit_accounts_function_code_gen(user_id: int = 1) -> pd.DataFrame:
   """Function to retrieve credit card and loan accounts from the database for a specific user"""
   df = _get_accounts_with_mapping(user_id=user_id)
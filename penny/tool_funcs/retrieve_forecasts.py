@@ -1,8 +1,9 @@
 from database import Database
 import pandas as pd
+from penny.tool_funcs.dataframe_cache import cached_user_frame
+from penny.tool_funcs.forecast_utils import child_to_parent_category_ids, children_by_date_and_parent
 from penny.tool_funcs.sandbox_logging import log
 from penny.tools.utils import to_all_category_name
-from categories import get_parents_with_leaves_as_dict_categories
 
 def _adjust_parent_forecasts(df: pd.DataFrame) -> pd.DataFrame:
   """Post-process forecasts: adjust parent category forecasts to be difference of original minus sum of children.
@@ -15,41 +16,29 @@ def _adjust_parent_forecasts(df: pd.DataFrame) -> pd.DataFrame:
   if df.empty:
     return df
   
-  # Get parent-to-leaf mapping from categories.py
-  parent_to_leaf_categories = get_parents_with_leaves_as_dict_categories()
-  
-  # Get all parent category IDs
-  parent_category_ids = set(parent_to_leaf_categories.keys())
-  
   # Create a copy to avoid modifying the original
   df = df.copy()
   
   # Add original_forecasted_amount column to preserve original values
   df['original_forecasted_amount'] = df['forecasted_amount'].copy()
   
-  # Group by start_date to process each date separately
-  for start_date, date_group in df.groupby('start_date'):
-    # For each parent category that exists in this date group
-    for parent_id in parent_category_ids:
-      # Get children category IDs (excluding the parent itself)
-      children_ids = [cid for cid in parent_to_leaf_categories[parent_id] if cid != parent_id]
-      
-      # Sum forecasts of all children categories for this date
-      children_rows = date_group[date_group['ai_category_id'].isin(children_ids)]
-      children_sum = children_rows['forecasted_amount'].sum() if not children_rows.empty else 0.0
-      
-      # Adjust parent forecast: original - sum of children
-      parent_mask = (df['start_date'] == start_date) & (df['ai_category_id'] == parent_id)
-      if parent_mask.any():
-        original_forecast = df.loc[parent_mask, 'forecasted_amount'].iloc[0]
-        adjusted_forecast = original_forecast - children_sum
-        df.loc[parent_mask, 'forecasted_amount'] = adjusted_forecast
-        # original_forecasted_amount already contains the original value, no need to update
-        log(f"**Adjusted Parent Forecast**: Category {parent_id} on {start_date}: {original_forecast:.2f} -> {adjusted_forecast:.2f} (original - sum of children: {children_sum:.2f})")
+  # Sum children per (start_date, parent) in one pass over the child rows
+  child_to_parent = child_to_parent_category_ids()
+  children_sums = children_by_date_and_parent(df, child_to_parent)['children_sum']
+  
+  # Adjust parent forecast: original - sum of children (0 when none of its children are forecast that date)
+  is_parent = df['ai_category_id'].isin(set(child_to_parent.values())) & df['start_date'].notna()
+  if is_parent.any():
+    parent_keys = pd.MultiIndex.from_frame(df.loc[is_parent, ['start_date', 'ai_category_id']])
+    df.loc[is_parent, 'forecasted_amount'] = (
+      df.loc[is_parent, 'forecasted_amount'].to_numpy() - children_sums.reindex(parent_keys, fill_value=0.0).to_numpy()
+    )
+    log(f"**Adjusted Parent Forecasts**: {int(is_parent.sum())} parent forecasts across {df.loc[is_parent, 'start_date'].nunique()} dates (original - sum of children)")
   
   return df
 
 
+@cached_user_frame("spending_forecasts")
 def retrieve_spending_forecasts_function_code_gen(user_id: int = 1, granularity: str = 'monthly') -> pd.DataFrame:
   """Function to retrieve spending forecasts from the database for a specific user"""
   db = Database()
@@ -89,6 +78,7 @@ def retrieve_spending_forecasts_function_code_gen(user_id: int = 1, granularity:
   return df
 
 
+@cached_user_frame("income_forecasts")
 def retrieve_income_forecasts_function_code_gen(user_id: int = 1, granularity: str = 'monthly') -> pd.DataFrame:
   """Function to retrieve income forecasts from the database for a specific user"""
   db = Database()
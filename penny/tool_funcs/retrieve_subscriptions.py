@@ -2,27 +2,23 @@ from database import Database
 import json
 import pandas as pd
 import re
+from penny.tool_funcs.dataframe_cache import cached_user_frame
 from penny.tool_funcs.sandbox_logging import log
 
 # Maximum number of subscriptions to return in subscription_names_and_amounts
 MAX_SUBSCRIPTIONS = 10
 
 
+@cached_user_frame("subscriptions")
 def retrieve_subscriptions_function_code_gen(user_id: int = 1) -> pd.DataFrame:
   """Function to retrieve subscription transactions by joining transactions with user_recurring_transactions"""
   db = Database()
-  subscription_transactions = db.get_subscription_transactions(user_id=user_id, confidence_score_bills_threshold=0.5)
+  df = db.get_subscription_transactions_df(user_id=user_id, confidence_score_bills_threshold=0.5)
   
-  if not subscription_transactions:
+  if df.empty:
     log(f"**Retrieved Subscription Transactions** of `U-{user_id}`: No subscription transactions found")
     return pd.DataFrame(columns=['transaction_id', 'user_id', 'account_id', 'date', 'transaction_name', 'amount', 'category', 'subscription_name', 'confidence_score_bills', 'reviewer_bills'])
   
-  df = pd.DataFrame(subscription_transactions)
-  
-  # Convert date column to datetime for proper comparisons
-  if 'date' in df.columns and len(df) > 0:
-    df['date'] = pd.to_datetime(df['date'])
-  
   # Add output_category column (format category for display)
   if 'category' in df.columns:
     def format_category(cat):
@@ -37,7 +33,8 @@ def retrieve_subscriptions_function_code_gen(user_id: int = 1) -> pd.DataFrame:
           break
       return formatted
     
-    df['output_category'] = df['category'].apply(format_category)
+    # Format each distinct category once, then map
+    df['output_category'] = df['category'].map({cat: format_category(cat) for cat in df['category'].unique()})
   
   cols_str = "`, `".join(df.columns)
   log(f"**Retrieved Subscription Transactions** of `U-{user_id}`: `df: {df.shape}` w/ **cols**:\n  - `{cols_str}`")
@@ -3,6 +3,8 @@ import json
 import os
 import pandas as pd
 import re
+import threading
+from penny.tool_funcs.dataframe_cache import cached_user_frame
 from penny.tool_funcs.sandbox_logging import log
 
 # Maximum number of transactions to return in transaction_names_and_amounts
@@ -10,57 +12,119 @@ MAX_TRANSACTIONS = 10
 
 # Local SQLite demo DBs are seeded once; shift all dates forward when newest tx is older than this.
 _DEMO_TX_MAX_STALE_DAYS = 35
+# (db_path, user_id) -> ((day, data version), offset_days) of the last computed demo date roll
+_DEMO_DATE_ROLLS = {}
+_DEMO_DATE_ROLLS_LOCK = threading.Lock()
 
 
-def retrieve_transactions_function_code_gen(user_id: int = 1) -> pd.DataFrame:
-  """Function to retrieve transactions from the database for a specific user"""
+# Income category names; income retrievals keep only these and spending retrievals exclude them.
+_INCOME_CATEGORIES = ['income_salary', 'income_sidegig', 'income_business', 'income_interest', 'income']
+
+
+def _demo_date_roll_days(db: Database, user_id: int) -> int:
+  """Days to shift a stale demo user's transactions forward so the newest one lands on today (zero if fresh).
+
+  Read-only: derived from the user's latest transaction date and kept in memory per day and data version, so a
+  reseed or reset through this process (which bumps the version) is picked up on the next retrieval.
+  """
+  if os.environ.get("PENNY_DISABLE_DEMO_TX_DATE_ROLL", "").lower() in ("1", "true", "yes"):
+    return 0
+  today = pd.Timestamp.now().normalize()
+  key = (db.db_path, user_id)
+  stamp = (today, db.get_data_version(user_id))
+  with _DEMO_DATE_ROLLS_LOCK:
+    cached = _DEMO_DATE_ROLLS.get(key)
+  if cached is not None and cached[0] == stamp:
+    return cached[1]
+
+  offset_days = 0
+  latest_date = db.get_latest_transaction_date(user_id)
+  max_d = pd.to_datetime(latest_date, errors="coerce") if latest_date else pd.NaT
+  if not pd.isna(max_d):
+    max_d = max_d.normalize()
+    if max_d < today - pd.Timedelta(days=_DEMO_TX_MAX_STALE_DAYS):
+      offset_days = (today - max_d).days
+  with _DEMO_DATE_ROLLS_LOCK:
+    _DEMO_DATE_ROLLS[key] = (stamp, offset_days)
+  return offset_days
+
+
+def transactions_within_window(df: pd.DataFrame, start_date=None, end_date=None) -> pd.DataFrame:
+  """Rows of a retrieved transactions frame whose ``date`` falls in the inclusive window (unchanged when no bounds)"""
+  if (start_date is None and end_date is None) or df.empty or "date" not in df.columns:
+    return df
+  in_window = pd.Series(True, index=df.index)
+  if start_date is not None:
+    in_window &= df["date"] >= pd.Timestamp(start_date).normalize()
+  if end_date is not None:
+    in_window &= df["date"] <= pd.Timestamp(end_date).normalize()
+  return df[in_window]
+
+
+def _filter_label(start_date, end_date, categories, exclude_categories) -> str:
+  """Log label naming the filters a retrieval applied, e.g. ``Transactions (excluding income)``"""
+  filters = []
+  if categories:
+    filters.append("income only" if list(categories) == _INCOME_CATEGORIES else f"only {', '.join(categories)}")
+  if exclude_categories:
+    filters.append("excluding income" if list(exclude_categories) == _INCOME_CATEGORIES else f"excluding {', '.join(exclude_categories)}")
+  if start_date is not None:
+    filters.append(f"from {pd.Timestamp(start_date).date()}")
+  if end_date is not None:
+    filters.append(f"to {pd.Timestamp(end_date).date()}")
+  return f"Transactions ({'; '.join(filters)})" if filters else "All Transactions"
+
+
+def retrieve_transactions_function_code_gen(user_id: int = 1, start_date=None, end_date=None,
+                                            categories: list = None, exclude_categories: list = None) -> pd.DataFrame:
+  """Function to retrieve transactions from the database for a specific user.
+
+  ``start_date`` / ``end_date`` (inclusive) and the category filters are pushed down into SQL so only the
+  requested window is loaded. Dates are in the same (demo-rolled) time frame as the returned ``date`` column.
+  Because filtering happens in SQL, the frame has a fresh 0..n-1 index rather than the row labels of the user's
+  full history (generated ``.loc`` code can observe this).
+  """
   db = Database()
-  transactions = db.get_transactions_by_user(user_id=user_id)
-  df = pd.DataFrame(transactions)
-
-  if "date" in df.columns and not df.empty:
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df = df.dropna(subset=["date"])
-    if not df.empty:
-      if pd.api.types.is_datetime64tz_dtype(df["date"]):
-        df["date"] = df["date"].dt.tz_convert(None)
-      df["date"] = df["date"].dt.normalize()
-      if os.environ.get("PENNY_DISABLE_DEMO_TX_DATE_ROLL", "").lower() not in ("1", "true", "yes"):
-        max_d = df["date"].max()
-        today = pd.Timestamp.now().normalize()
-        if max_d < today - pd.Timedelta(days=_DEMO_TX_MAX_STALE_DAYS):
-          delta = today - max_d
-          df = df.copy()
-          # Seeded lookup amount-band fixtures (user_seeder) keep literal calendar dates for tests.
-          if "transaction_id" in df.columns:
-            is_lookup_fixture = df["transaction_id"].between(900001, 900009, inclusive="both")
-            df.loc[~is_lookup_fixture, "date"] = df.loc[~is_lookup_fixture, "date"] + delta
-          else:
-            df["date"] = df["date"] + delta
-          log(
-            f"**Demo date roll** for `U-{user_id}`: shifted transaction dates by {delta.days} days "
-            f"(max was {max_d.date()}, now {df['date'].max().date()}); "
-            f"ids 900001–900009 unchanged."
-          )
+  # The demo date roll is applied in SQL, so the frame arrives with its final dates and needs no copy here.
+  offset_days = _demo_date_roll_days(db, user_id)
+  df = db.query_transactions_df(
+    user_id=user_id,
+    start=pd.Timestamp(start_date).date() if start_date is not None else None,
+    end=pd.Timestamp(end_date).date() if end_date is not None else None,
+    categories=categories,
+    exclude_categories=exclude_categories,
+    date_offset_days=offset_days,
+  )
+
+  if not df.empty:
+    # `date` is already datetime64[ns] at midnight; drop rows whose stored date did not parse.
+    if df["date"].isna().any():
+      df = df.dropna(subset=["date"])
+    if offset_days and not df.empty:
+      log(
+        f"**Demo date roll** for `U-{user_id}`: transaction dates shifted by {offset_days} days "
+        f"(newest now {df['date'].max().date()}); ids 900001–900009 unchanged."
+      )
 
   cols_str = "`, `".join(df.columns)
-  log(f"**Retrieved All Transactions** of `U-{user_id}`: `df: {df.shape}` w/ **cols**:\n  - `{cols_str}`")
+  label = _filter_label(start_date, end_date, categories, exclude_categories)
+  log(f"**Retrieved {label}** of `U-{user_id}`: `df: {df.shape}` w/ **cols**:\n  - `{cols_str}`")
   return df
 
 
-def retrieve_income_transactions_function_code_gen(user_id: int = 1) -> pd.DataFrame:
-  """Function to retrieve income transactions from the database for a specific user"""
-  df = retrieve_transactions_function_code_gen(user_id=user_id)
-  
-  if df.empty:
+@cached_user_frame("income_transactions")
+def retrieve_income_transactions_function_code_gen(user_id: int = 1, start_date=None, end_date=None) -> pd.DataFrame:
+  """Function to retrieve income transactions from the database for a specific user, optionally within a date window"""
+  income_df = retrieve_transactions_function_code_gen(
+    user_id=user_id, start_date=start_date, end_date=end_date, categories=_INCOME_CATEGORIES
+  )
+  
+  if income_df.empty:
     log(f"**Retrieved Income Transactions** of `U-{user_id}`: empty DataFrame")
-    return df
+    return income_df
   
-  # Filter for income categories
-  income_categories = ['income_salary', 'income_sidegig', 'income_business', 'income_interest', 'income']
-  income_df = df[df['category'].isin(income_categories)].copy()
-
   # Flip amount for income transactions
+  income_df = income_df.copy()
   income_df['amount'] = income_df['amount'] * -1
   
   cols_str = "`, `".join(income_df.columns)
@@ -68,22 +132,92 @@ def retrieve_income_transactions_function_code_gen(user_id: int = 1) -> pd.DataF
   return income_df
 
 
-def retrieve_spending_transactions_function_code_gen(user_id: int = 1) -> pd.DataFrame:
-  """Function to retrieve spending transactions from the database for a specific user"""
-  df = retrieve_transactions_function_code_gen(user_id=user_id)
-  
-  if df.empty:
+@cached_user_frame("spending_transactions")
+def retrieve_spending_transactions_function_code_gen(user_id: int = 1, start_date=None, end_date=None) -> pd.DataFrame:
+  """Function to retrieve spending transactions from the database for a specific user, optionally within a date window"""
+  # Spending is everything outside the income categories
+  spending_df = retrieve_transactions_function_code_gen(
+    user_id=user_id, start_date=start_date, end_date=end_date, exclude_categories=_INCOME_CATEGORIES
+  )
+  
+  if spending_df.empty:
     log(f"**Retrieved Spending Transactions** of `U-{user_id}`: empty DataFrame")
-    return df
-  
-  # Filter for spending categories (exclude income categories)
-  income_categories = ['income_salary', 'income_sidegig', 'income_business', 'income_interest', 'income']
-  spending_df = df[~df['category'].isin(income_categories)]
+    return spending_df
   
   cols_str = "`, `".join(spending_df.columns)
   log(f"**Retrieved Spending Transactions** of `U-{user_id}`: `df: {spending_df.shape}` w/ **cols**:\n  - `{cols_str}`")
   return spending_df
 
+# Template handling shared by the formatters, compiled once per process
+_BRACKETED_TEXT_RE = re.compile(r'\s*\[.*?\]\s*')
+_PLACEHOLDER_NAME_RE = re.compile(r'\{([^}:]+)')
+_DATE_FORMAT_PLACEHOLDER_RE = re.compile(r'\{date:([^}]+)\}')
+# Placeholders filled by _amount_phrases
+_AMOUNT_PLACEHOLDERS = ('amount_with_direction', 'amount', 'income_total_amount', 'income_amount', 'spending_total_amount', 'spending_amount')
+
+
+def _amount_phrases(amount: float, category) -> dict:
+  """Display strings for one amount: plain, with direction (by category), and income/spending verb forms"""
+  # Determine the verb phrase based on amount sign and category
+  if category in _INCOME_CATEGORIES:
+    verb_phrase = "earned" if amount >= 0 else "lost"
+  else:  # spending categories
+    verb_phrase = "spent" if amount >= 0 else "received"
+
+  if amount >= 0:
+    income_verb = "earned"
+    spending_verb = "spent"
+  else:  # amount < 0
+    income_verb = "lost"
+    spending_verb = "received"
+
+  # Format amount as positive for display
+  amount_str = f"${abs(amount):.0f}"
+  income_amount_str = f"{income_verb} {amount_str}"
+  spending_amount_str = f"{spending_verb} {amount_str}"
+  return {
+    'amount_with_direction': f"{amount_str} {verb_phrase}",
+    'amount': amount_str,
+    'income_total_amount': income_amount_str,
+    'income_amount': income_amount_str,
+    'spending_total_amount': spending_amount_str,
+    'spending_amount': spending_amount_str,
+  }
+
+
+def _format_transaction_date(date, strftime_format: str = None) -> str:
+  """Render a transaction date with ``strftime_format`` (from a ``{date:...}`` placeholder) or as YYYY-MM-DD"""
+  if strftime_format is not None:
+    # Format the date if it's a datetime object, otherwise use as-is
+    if hasattr(date, 'strftime'):
+      return date.strftime(strftime_format)
+    if isinstance(date, str):
+      # If date is already a string, try to parse and reformat if needed
+      from datetime import datetime
+      # Try common date formats
+      for fmt in ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d']:
+        try:
+          return datetime.strptime(date, fmt).strftime(strftime_format)
+        except ValueError:
+          continue
+      # If parsing fails, use date as-is
+      return date
+    return str(date)
+  
+  # No date format specifier - format as date only (YYYY-MM-DD)
+  if hasattr(date, 'strftime'):
+    # pandas Timestamp or datetime object - format as date only
+    return date.strftime('%Y-%m-%d')
+  # If the date (or its string form) includes a time, extract just the date part
+  date_str = date if isinstance(date, str) else str(date)
+  return date_str.split(' ')[0] if ' ' in date_str else date_str
+
+
+def _column_values(df: pd.DataFrame, column: str, default) -> list:
+  """Values of ``column`` as a list, or ``default`` for every row when the column is absent"""
+  return df[column].tolist() if column in df.columns else [default] * len(df)
+
+
 def transaction_category_grouped(df: pd.DataFrame, template: str) -> str:
   """Generate a formatted string describing transaction categories and amounts using the provided template.
   
@@ -120,74 +254,25 @@ def transaction_category_grouped(df: pd.DataFrame, template: str) -> str:
   has_more = total_count > MAX_TRANSACTIONS
   grouped = grouped.head(MAX_TRANSACTIONS)
   
+  # Placeholders naming other df columns cannot be filled from grouped data; checked once per template
+  for placeholder in _PLACEHOLDER_NAME_RE.findall(template):
+    placeholder_name = placeholder.split(':')[0]
+    if placeholder_name not in ('category', *_AMOUNT_PLACEHOLDERS) and placeholder_name in df.columns:
+      log(f"  - **Warning**: Placeholder `{placeholder_name}` requested but not available for grouped data.")
+  
   utterances = []
   
   log(f"**Listing Category Groups**: Processing up to {MAX_TRANSACTIONS} categories (out of {total_count} total).")
-  for i in range(len(grouped)):
-    category_row = grouped.iloc[i]
-    category = category_row.get('category', 'Unknown Category')
-    amount = category_row.get('amount', 0.0)
-    
+  for category, amount in zip(grouped['category'].tolist(), grouped['amount'].tolist()):
     amount_log = f"${abs(amount):.0f}" if amount else "Unknown"
     log(f"  - **Category**: `{category}`  |  **Total Amount**: `{amount_log}`")
     
-    # Determine category based on amount sign and category
-    income_categories = ['income_salary', 'income_sidegig', 'income_business', 'income_interest', 'income']
-    is_income = category in income_categories
-    
-    # Format amount as positive for display
-    amount_abs = abs(amount)
-    
-    # Determine the verb phrase based on amount sign and category
-    if is_income:
-      verb_phrase = "earned" if amount >= 0 else "lost"
-    else:  # spending categories
-      verb_phrase = "spent" if amount >= 0 else "received"
-
-    if amount >= 0:
-      income_verb = "earned"
-      spending_verb = "spent"
-    else:  # amount < 0
-      income_verb = "lost"
-      spending_verb = "received"
-
-    # Build amount_with_direction string
-    amount_str = f"${amount_abs:.0f}"
-    amount_with_direction = f"{amount_str} {verb_phrase}"
-    income_amount_str = f"{income_verb} {amount_str}"
-    spending_amount_str = f"{spending_verb} {amount_str}"
-    
-    temp_template = template
-    
-    # Build format dictionary with available columns
-    format_dict = {
-      'category': category,
-      'amount_with_direction': amount_with_direction,
-      'amount': amount_str,
-      'income_amount': income_amount_str,
-      'spending_amount': spending_amount_str,
-      'income_total_amount': income_amount_str,
-      'spending_total_amount': spending_amount_str,
-    }
-    
-    # Check for any additional columns in the DataFrame that might be referenced in the template
-    # Extract all placeholder names from the template (e.g., {category}, {amount})
-    template_placeholders = re.findall(r'\{([^}:]+)', temp_template)
-    for placeholder in template_placeholders:
-      # Remove any format specifiers (e.g., "amount:.0f" -> "amount")
-      placeholder_name = placeholder.split(':')[0]
-      
-      # If the placeholder is not already in format_dict and exists as a column in the original DataFrame
-      if placeholder_name not in format_dict and placeholder_name in df.columns:
-        # For grouped data, we can't use individual transaction values
-        # But we can provide aggregate values if needed
-        log(f"  - **Warning**: Placeholder `{placeholder_name}` requested but not available for grouped data.")
-    
+    format_dict = {'category': category, **_amount_phrases(amount, category)}
     try:
-      utterance = temp_template.format(**format_dict)
+      utterance = template.format(**format_dict)
     except (ValueError, KeyError) as e:
       # If formatting fails, log error and re-raise
-      log(f"**Template Formatting Error**: {e}. Template: {temp_template}, Format dict keys: {list(format_dict.keys())}")
+      log(f"**Template Formatting Error**: {e}. Template: {template}, Format dict keys: {list(format_dict.keys())}")
       raise
     
     utterances.append(utterance)
@@ -231,145 +316,70 @@ def transaction_names_and_amounts(df: pd.DataFrame, template: str) -> str:
       log(error_msg)
       raise ValueError(error_msg)
   
-  # Limit both utterances and metadata to MAX_TRANSACTIONS
+  # Only the first MAX_TRANSACTIONS rows are ever rendered, so everything below works on that slice
   total_count = len(df)
   has_more = total_count > MAX_TRANSACTIONS
+  top = df.head(MAX_TRANSACTIONS)
+  
+  # Prepare the template once: a {date:%%Y-%%m-%%d}-style specifier becomes a plain {date} rendered with that format
+  temp_template = template
+  strftime_format = None
+  date_format_match = _DATE_FORMAT_PLACEHOLDER_RE.search(temp_template)
+  if date_format_match:
+    # Replace %% with % for strftime format
+    strftime_format = date_format_match.group(1).replace('%%', '%')
+    temp_template = _DATE_FORMAT_PLACEHOLDER_RE.sub('{date}', temp_template)
+  
+  # Other df columns referenced by the template (e.g., {account_id} is built in, {merchant} would be extra)
+  builtin_placeholders = {'name', 'transaction_name', 'date', 'category', 'transaction_id', 'account_id', *_AMOUNT_PLACEHOLDERS}
+  extra_columns = []
+  for placeholder in _PLACEHOLDER_NAME_RE.findall(temp_template):
+    # Remove any format specifiers (e.g., "amount:.0f" -> "amount")
+    placeholder_name = placeholder.split(':')[0]
+    if placeholder_name not in builtin_placeholders and placeholder_name in top.columns and placeholder_name not in extra_columns:
+      extra_columns.append(placeholder_name)
+  
+  # Clean up transaction names by removing text inside brackets (e.g., "Local Restaurant [DOWNTOWN BISTRO]" -> "Local Restaurant")
+  names = top['transaction_name']
+  cleaned_names = names.str.replace(_BRACKETED_TEXT_RE, '', regex=True).str.strip().tolist()
+  rows = zip(
+    names.tolist(),
+    cleaned_names,
+    top['amount'].tolist(),
+    _column_values(top, 'date', 'Unknown Date'),
+    _column_values(top, 'category', 'Unknown Category'),
+    _column_values(top, 'transaction_id', None),
+    _column_values(top, 'account_id', None),
+    *(top[col].tolist() for col in extra_columns),
+  )
   
   utterances = []
-  metadata = []
   
   log(f"**Listing Individual Transactions**: Processing up to {MAX_TRANSACTIONS} items (out of {total_count} total).")
-  for i in range(len(df)):
-    transaction = df.iloc[i]
-    transaction_name = transaction.get('transaction_name', 'Unknown Transaction')
-    # Clean up transaction name by removing text inside brackets (e.g., "Local Restaurant [DOWNTOWN BISTRO]" -> "Local Restaurant")
-    transaction_name_cleaned = re.sub(r'\s*\[.*?\]\s*', '', transaction_name).strip()
-    amount = transaction.get('amount', 0.0)
-    date = transaction.get('date', 'Unknown Date')
-    category = transaction.get('category', 'Unknown Category')
-    transaction_id = transaction.get('transaction_id', None)
-    account_id = transaction.get('account_id', None)
-    
+  for transaction_name, transaction_name_cleaned, amount, date, category, transaction_id, account_id, *extra_values in rows:
     amount_log = f"${abs(amount):.0f}" if amount else "Unknown"
     log(f"  - `T-{transaction_id}`]  **Name**: `{transaction_name}`  |  **Amount**: `{amount_log}`  |  **Date**: `{date}`  |  **Category**: `{category}`  |  **Account ID**: `{account_id}`")
     
-    # Determine amount_with_direction based on amount sign and category
-    # Rules:
-    # - Spending (Outflow): amount > 0 → "$X.XX was paid to"
-    # - Income (Inflow): amount < 0, category is income → "$X.XX was received from"
-    # - Spending (Inflow): amount < 0, category is spending → "$X.XX was refunded from"
-    # - Income Outflow (Refund): amount > 0, category is income → "$X.XX was returned to"
-    income_categories = ['income_salary', 'income_sidegig', 'income_business', 'income_interest', 'income']
-    is_income = category in income_categories
-    
-    # Format amount as positive for display
-    amount_abs = abs(amount)
-    
-    # Determine the verb phrase based on amount sign and category
-    if is_income:
-      verb_phrase = "earned" if amount >= 0 else "lost"
-    else:  # spending categories
-      verb_phrase = "spent" if amount >= 0 else "received"
-
-    if amount >= 0:
-      income_verb = "earned"
-      spending_verb = "spent"
-    else:  # amount < 0
-      income_verb = "lost"
-      spending_verb = "received"
-
-    # Build amount_with_direction string
-    amount_str = f"${amount_abs:.0f}"
-    amount_with_direction = f"{amount_str} {verb_phrase}"
-    income_amount_str = f"{income_verb} {amount_str}"
-    spending_amount_str = f"{spending_verb} {amount_str}"
-    
-    temp_template = template
-    
-    # Check if template has date format specifiers (like {date:%%Y-%%m-%%d})
-    # If so, replace them with simple {date} and format the date accordingly
-    date_format_pattern = r'\{date:([^}]+)\}'
-    date_format_match = re.search(date_format_pattern, temp_template)
-    date_str = date
-    
-    if date_format_match:
-      # Extract the format specifier (e.g., "%%Y-%%m-%%d")
-      format_spec = date_format_match.group(1)
-      # Replace %% with % for strftime format
-      strftime_format = format_spec.replace('%%', '%')
-      # Replace the format specifier in template with simple {date}
-      temp_template = re.sub(date_format_pattern, '{date}', temp_template)
-      
-      # Format the date if it's a datetime object, otherwise use as-is
-      if hasattr(date, 'strftime'):
-        date_str = date.strftime(strftime_format)
-      elif isinstance(date, str):
-        # If date is already a string, try to parse and reformat if needed
-        try:
-          from datetime import datetime
-          # Try common date formats
-          for fmt in ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d']:
-            try:
-              parsed_date = datetime.strptime(date, fmt)
-              date_str = parsed_date.strftime(strftime_format)
-              break
-            except ValueError:
-              continue
-        except (ValueError, TypeError):
-          # If parsing fails, use date as-is
-          date_str = date
-      else:
-        date_str = str(date)
-    else:
-      # No date format specifier - format as date only (YYYY-MM-DD)
-      if hasattr(date, 'strftime'):
-        # pandas Timestamp or datetime object - format as date only
-        date_str = date.strftime('%Y-%m-%d')
-      elif isinstance(date, str):
-        # If date string includes time, extract just the date part
-        if ' ' in date:
-          date_str = date.split(' ')[0]
-        else:
-          date_str = date
-      else:
-        # Convert to string and extract date part if it includes time
-        date_str = str(date)
-        if ' ' in date_str:
-          date_str = date_str.split(' ')[0]
-    
-    # Build format dictionary with available columns
+    # amount_with_direction depends on amount sign and category:
+    # - Spending (Outflow): amount > 0 → "$X spent";   Spending (Inflow): amount < 0 → "$X received"
+    # - Income (Inflow): amount >= 0 → "$X earned";    Income Outflow (Refund): amount < 0 → "$X lost"
     format_dict = {
       'name': transaction_name,
       'transaction_name': transaction_name_cleaned,
-      'amount_with_direction': amount_with_direction,
-      'date': date_str,
+      'date': _format_transaction_date(date, strftime_format),
       'category': category,
-      'transaction_id': transaction_id if transaction_id is not None else None,
-      'account_id': account_id if account_id is not None else None,
-      'amount': amount_str,
-      'income_total_amount': income_amount_str,
-      'income_amount': income_amount_str,
-      'spending_total_amount': spending_amount_str,
-      'spending_amount': spending_amount_str,
+      'transaction_id': transaction_id,
+      'account_id': account_id,
+      **_amount_phrases(amount, category),
     }
-    
-    # Check for any additional columns in the DataFrame that might be referenced in the template
-    # Extract all placeholder names from the template (e.g., {account_id}, {transaction_id})
-    template_placeholders = re.findall(r'\{([^}:]+)', temp_template)
-    for placeholder in template_placeholders:
-      # Remove any format specifiers (e.g., "amount:.0f" -> "amount")
-      placeholder_name = placeholder.split(':')[0]
-      
-      # If the placeholder is not already in format_dict and exists as a column in the DataFrame
-      if placeholder_name not in format_dict and placeholder_name in df.columns:
-        value = transaction.get(placeholder_name, '')
-        # Convert to native Python type for JSON serialization
-        if pd.isna(value):
-          format_dict[placeholder_name] = None
-        elif isinstance(value, (pd.Timestamp, pd.DatetimeTZDtype)):
-          format_dict[placeholder_name] = value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else str(value)
-        else:
-          format_dict[placeholder_name] = value
+    for column, value in zip(extra_columns, extra_values):
+      # Convert to native Python type for JSON serialization
+      if pd.isna(value):
+        format_dict[column] = None
+      elif isinstance(value, pd.Timestamp):
+        format_dict[column] = value.strftime('%Y-%m-%d')
+      else:
+        format_dict[column] = value
     
     try:
       utterance = temp_template.format(**format_dict)
@@ -378,30 +388,7 @@ def transaction_names_and_amounts(df: pd.DataFrame, template: str) -> str:
       log(f"**Template Formatting Error**: {e}. Template: {temp_template}, Format dict keys: {list(format_dict.keys())}")
       raise
     
-    # Convert date to string for JSON serialization
-    date_for_metadata = date
-    if hasattr(date, 'strftime'):
-      # pandas Timestamp or datetime object
-      date_for_metadata = date.strftime('%Y-%m-%d')
-    elif not isinstance(date, str):
-      # Convert to string if not already
-      date_for_metadata = str(date)
-    
-    # Add to metadata only if under the limit (max MAX_TRANSACTIONS)
-    if len(metadata) < MAX_TRANSACTIONS:
-      metadata.append({
-        "transaction_id": int(transaction_id) if transaction_id is not None else None,
-        "account_id": int(account_id) if account_id is not None else None,
-        "transaction_name": transaction_name_cleaned
-      })
-    
-    # Add to utterances only if under the limit (max MAX_TRANSACTIONS)
-    if len(utterances) < MAX_TRANSACTIONS:
-      utterances.append(utterance)
-    
-    # Break early if we've reached both limits
-    if len(metadata) >= MAX_TRANSACTIONS and len(utterances) >= MAX_TRANSACTIONS:
-      break
+    utterances.append(utterance)
   
   # Add message about remaining transactions if there are more
   utterance_text = "\n".join(utterances)
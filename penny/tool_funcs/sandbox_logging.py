@@ -1,41 +1,106 @@
 """
 Sandbox logging module for capturing logs during restricted code execution.
 This module provides a log() function that can be used within sandboxed code.
+
+Each sandbox execution captures into its own bounded buffer (see ``log_capture``), held in a context variable so
+concurrent runs in threads or asyncio tasks never mix their logs. Code logging outside of any capture falls back
+to a per-thread buffer.
 """
 
-from typing import List
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+import os
 import threading
 
-# Thread-local storage for log messages
+# Messages kept per execution; older ones are dropped (PENNY_SANDBOX_LOG_MAX_ENTRIES, 0 = unbounded)
+_DEFAULT_MAX_ENTRIES = 1000
+# Characters kept per message (PENNY_SANDBOX_LOG_MAX_CHARS, 0 = unbounded)
+_DEFAULT_MAX_CHARS = 20000
+
+
+class LogBuffer:
+  """Ring buffer of the most recent log messages, remembering how many were dropped"""
+
+  def __init__(self, max_entries: Optional[int] = None, max_chars: Optional[int] = None):
+    self.max_entries = int(os.environ.get("PENNY_SANDBOX_LOG_MAX_ENTRIES", _DEFAULT_MAX_ENTRIES)) if max_entries is None else max_entries
+    self.max_chars = int(os.environ.get("PENNY_SANDBOX_LOG_MAX_CHARS", _DEFAULT_MAX_CHARS)) if max_chars is None else max_chars
+    self.dropped = 0
+    self._entries = deque(maxlen=self.max_entries if self.max_entries > 0 else None)
+    self._lock = threading.Lock()
+
+  def append(self, message: str) -> None:
+    if isinstance(message, str) and 0 < self.max_chars < len(message):
+      message = f"{message[:self.max_chars]}… [truncated {len(message) - self.max_chars} characters]"
+    with self._lock:
+      if self._entries.maxlen is not None and len(self._entries) == self._entries.maxlen:
+        self.dropped += 1
+      self._entries.append(message)
+
+  def messages(self) -> List[str]:
+    """Captured messages, led by a truncation marker when older ones were dropped"""
+    with self._lock:
+      entries = list(self._entries)
+      dropped = self.dropped
+    if dropped:
+      entries.insert(0, f"… [{dropped} earlier log messages dropped; keeping the last {self.max_entries}]")
+    return entries
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+      self.dropped = 0
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+
+_current_buffer: ContextVar[Optional[LogBuffer]] = ContextVar("penny_sandbox_log_buffer", default=None)
+
+# Thread-local fallback for logging outside of a capture
 _local_storage = threading.local()
 
 
-def _get_log_list() -> List[str]:
-  """Get or create the thread-local log list"""
+def _get_buffer() -> LogBuffer:
+  """Buffer of the active capture, or the current thread's fallback buffer"""
+  buffer = _current_buffer.get()
+  if buffer is not None:
+    return buffer
   if not hasattr(_local_storage, 'logs'):
-    _local_storage.logs = []
+    _local_storage.logs = LogBuffer()
   return _local_storage.logs
 
 
+@contextmanager
+def log_capture() -> Iterator[LogBuffer]:
+  """Capture ``log`` calls made in this context (including nested calls) into a fresh buffer for the block"""
+  buffer = LogBuffer()
+  token = _current_buffer.set(buffer)
+  try:
+    yield buffer
+  finally:
+    _current_buffer.reset(token)
+
+
 def log(message: str):
   """
   Log a message that will be captured and returned separately from sandbox execution.
-  
+
   Args:
     message: The log message to capture
   """
-  _get_log_list().append(message)
+  _get_buffer().append(message)
 
 
 def get_logs() -> List[str]:
-  """Get all captured logs for the current thread"""
-  return _get_log_list().copy()
+  """Get all captured logs for the current execution"""
+  return _get_buffer().messages()
 
 
 def clear_logs():
-  """Clear all captured logs for the current thread"""
-  if hasattr(_local_storage, 'logs'):
-    _local_storage.logs.clear()
+  """Clear all captured logs for the current execution"""
+  _get_buffer().clear()
 
 
 def get_logs_as_string() -> str:
@@ -45,6 +110,4 @@ def get_logs_as_string() -> str:
 
 def get_logs_count() -> int:
   """Get the count of captured logs"""
-  return len(_get_log_list())
-
-
+  return len(_get_buffer())
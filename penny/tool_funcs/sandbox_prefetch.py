@@ -0,0 +1,149 @@
+"""
+Static prefetch of the datasets a generated program will retrieve.
+Before a sandbox run the program's AST is scanned for calls to the retrieval tools, and the datasets they read are
+loaded concurrently on a small thread pool into the run's UserDataSnapshot. The restricted code then finds them
+warm instead of reading the database one tool call at a time. Code that is still being streamed from the model can
+be scanned as it arrives, so loads start while the rest of the program is generated.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+import ast
+import contextvars
+import os
+import re
+import threading
+import time
+import pandas as pd
+from penny.tool_funcs.sandbox_logging import log
+from penny.tool_funcs.user_data_snapshot import UserDataSnapshot
+
+# Threads loading datasets (PENNY_PREFETCH_WORKERS; 0 disables prefetching)
+_DEFAULT_WORKERS = 4
+
+# Retrieval tools whose dataset depends on a granularity argument, and its default
+_GRANULARITY_TOOLS = {
+  "retrieve_spending_forecasts": "monthly",
+  "retrieve_income_forecasts": "monthly",
+}
+# Retrieval tools taking a date window; only calls without one read the full history, so only those are prefetched
+_WINDOW_TOOLS = frozenset({"retrieve_income_transactions", "retrieve_spending_transactions"})
+
+# A call's name and, when its parentheses close without nesting, its argument list
+_STREAMED_CALL = re.compile(r"\b([A-Za-z_]\w*)\s*\(([^()]*\))?")
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _literal_argument(call: ast.Call, position: int, keyword: str, default: str) -> Optional[str]:
+  """String literal passed as ``keyword`` (or positionally), ``default`` when omitted, None when not a literal"""
+  node = None
+  if len(call.args) > position:
+    node = call.args[position]
+  for kw in call.keywords:
+    if kw.arg == keyword:
+      node = kw.value
+  if node is None:
+    return default
+  if isinstance(node, ast.Constant) and isinstance(node.value, str):
+    return node.value
+  return None
+
+
+@lru_cache(maxsize=256)
+def retrieval_calls(code_str: str, tools: FrozenSet[str]) -> FrozenSet[Tuple[str, Optional[str]]]:
+  """``(tool, granularity)`` for every call to one of ``tools`` in ``code_str`` (granularity is None for other tools).
+
+  Calls whose granularity is not a string literal are skipped, as are transaction calls with a date window (they
+  read just that window when they run); unparsable code yields nothing.
+  """
+  try:
+    tree = ast.parse(code_str)
+  except (SyntaxError, ValueError):
+    return frozenset()
+  calls = set()
+  for node in ast.walk(tree):
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in tools):
+      continue
+    tool = node.func.id
+    if tool in _GRANULARITY_TOOLS:
+      granularity = _literal_argument(node, 0, "granularity", _GRANULARITY_TOOLS[tool])
+      if granularity is None:
+        continue
+      calls.add((tool, granularity))
+    elif tool in _WINDOW_TOOLS and (node.args or node.keywords):
+      continue
+    else:
+      calls.add((tool, None))
+  return frozenset(calls)
+
+
+def streamed_retrieval_calls(partial_code: str, tools: FrozenSet[str]) -> FrozenSet[Tuple[str, Optional[str]]]:
+  """``retrieval_calls`` for code that is still being generated (and need not parse yet).
+
+  A call is reported once its name has arrived, or, for tools that take a granularity or a date window, once its
+  argument list is complete; calls ``retrieval_calls`` would skip (or arguments with nested calls) are skipped.
+  """
+  calls = set()
+  for match in _STREAMED_CALL.finditer(partial_code):
+    tool, arguments = match.groups()
+    if tool not in tools:
+      continue
+    if tool in _GRANULARITY_TOOLS or tool in _WINDOW_TOOLS:
+      if arguments is not None:
+        calls |= retrieval_calls(f"{tool}({arguments}", tools)
+    else:
+      calls.add((tool, None))
+  return frozenset(calls)
+
+
+def _get_executor() -> Optional[ThreadPoolExecutor]:
+  global _EXECUTOR
+  workers = int(os.environ.get("PENNY_PREFETCH_WORKERS", _DEFAULT_WORKERS))
+  if workers <= 0:
+    return None
+  with _EXECUTOR_LOCK:
+    if _EXECUTOR is None:
+      _EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="penny-prefetch")
+    return _EXECUTOR
+
+
+def start_prefetch(snapshot: UserDataSnapshot, datasets: Dict[str, Callable[[], pd.DataFrame]]) -> List[Future]:
+  """Start loading ``datasets`` into ``snapshot`` in the background and return without waiting.
+
+  A ``get`` for a dataset that is still loading waits for it; a failed load is retried by that ``get``.
+  """
+  executor = _get_executor()
+  if executor is None:
+    return []
+  return [
+    executor.submit(contextvars.copy_context().run, snapshot.prefetch, key, loader)
+    for key, loader in datasets.items()
+    if not snapshot.is_loaded(key)
+  ]
+
+
+def prefetch_into_snapshot(snapshot: UserDataSnapshot, datasets: Dict[str, Callable[[], pd.DataFrame]]) -> None:
+  """Load ``datasets`` (snapshot key -> loader) concurrently into ``snapshot`` and wait for them.
+
+  The snapshot is passed explicitly and each load runs in a copy of the caller's context, so its logs land in
+  the current execution's buffer. A failed load is only logged: the program's own call retries it and reports
+  the error as usual. Nothing is done for fewer than two datasets, as there is nothing to overlap.
+  """
+  pending = {key: loader for key, loader in datasets.items() if not snapshot.is_loaded(key)}
+  executor = _get_executor()
+  if len(pending) < 2 or executor is None:
+    return
+  start = time.perf_counter()
+  futures = {
+    key: executor.submit(contextvars.copy_context().run, snapshot.prefetch, key, loader)
+    for key, loader in pending.items()
+  }
+  for key, future in futures.items():
+    try:
+      future.result()
+    except Exception as e:
+      log(f"**Prefetch Failed** `{key}` of `U-{snapshot.user_id}`: `{type(e).__name__}: {e}`")
+  log(f"**Prefetched** {', '.join(f'`{key}`' for key in futures)} of `U-{snapshot.user_id}` in `{(time.perf_counter() - start) * 1000:.1f} ms`")
@@ -0,0 +1,176 @@
+"""
+Opt-in memo of sandbox execution results.
+The same generated code run for the same user against unchanged data on the same day returns the same result
+(retries, duplicate submissions from the UI, optimizer reruns), so successful results are kept in an LRU keyed by
+(kind, code hash, user, the user's data version, current date). Code that references a mutating or
+non-deterministic tool is never cached. Entries also expire after a TTL, because writes made by other processes
+do not change this process's data versions.
+
+Enable with PENNY_SANDBOX_RESULT_CACHE_SIZE (entries, default 0 = off); PENNY_SANDBOX_RESULT_CACHE_TTL_SECONDS
+sets the TTL (default 300).
+"""
+
+from collections import OrderedDict
+from datetime import date
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Hashable, List, Optional, Tuple
+import ast
+import copy
+import hashlib
+import os
+import threading
+import time
+from database import Database
+
+_DEFAULT_TTL_SECONDS = 300.0
+
+# Tools with side effects, or whose output is not a function of code and data
+_UNCACHEABLE_TOOLS = frozenset({
+  "create_budget_or_goal",
+  "create_category_spending_limit",
+  "create_category_budget",
+  "create_income_goal",
+  "create_savings_goal",
+  "create_reminder",
+  "create_budget_or_goal_or_reminder",
+  "update_transaction_category_or_create_category_rules",
+  "lookup_user_accounts_transactions_income_and_spending_patterns",
+  "research_and_strategize_financial_outcomes",
+  "utter_delta_from_now",
+})
+
+
+@lru_cache(maxsize=256)
+def referenced_names(code_str: str) -> Optional[FrozenSet[str]]:
+  """Every bare name ``code_str`` references (None when it does not parse)"""
+  try:
+    tree = ast.parse(code_str)
+  except (SyntaxError, ValueError):
+    return None
+  return frozenset(node.id for node in ast.walk(tree) if isinstance(node, ast.Name))
+
+
+class SandboxResultCache:
+  """LRU of successful sandbox results with per-entry TTL and hit/miss/bypass counters"""
+
+  def __init__(self, max_entries: int = 0, ttl_seconds: float = _DEFAULT_TTL_SECONDS):
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self._entries: "OrderedDict[Hashable, Tuple[tuple, float]]" = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.bypasses = 0
+
+  def get(self, key: Hashable) -> Optional[tuple]:
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is not None and time.monotonic() - entry[1] > self.ttl_seconds:
+        del self._entries[key]
+        entry = None
+      if entry is None:
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry[0]
+
+  def put(self, key: Hashable, result: tuple) -> None:
+    with self._lock:
+      self._entries[key] = (result, time.monotonic())
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def count_bypass(self) -> None:
+    with self._lock:
+      self.bypasses += 1
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self) -> Dict[str, float]:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        'hits': self.hits,
+        'misses': self.misses,
+        'bypasses': self.bypasses,
+        'hit_rate': self.hits / lookups if lookups else 0.0,
+        'entries': len(self._entries),
+        'max_entries': self.max_entries,
+      }
+
+
+_CACHE = SandboxResultCache(
+  max_entries=int(os.environ.get("PENNY_SANDBOX_RESULT_CACHE_SIZE", 0)),
+  ttl_seconds=float(os.environ.get("PENNY_SANDBOX_RESULT_CACHE_TTL_SECONDS", _DEFAULT_TTL_SECONDS)),
+)
+
+
+def get_sandbox_result_cache_stats() -> Dict[str, float]:
+  """Hit/miss/bypass counters and size of the process-wide result cache"""
+  return _CACHE.stats()
+
+
+def clear_sandbox_result_cache() -> None:
+  """Drop every cached result (counters are kept)"""
+  _CACHE.clear()
+
+
+def disable_sandbox_result_cache() -> None:
+  """Stop caching in this process, e.g. in sandbox pool workers that cannot see other processes' data versions"""
+  _CACHE.max_entries = 0
+  _CACHE.clear()
+
+
+def _cache_hit_profile_entry(kind: str) -> Dict[str, Any]:
+  """Profile entry standing for a turn answered from the result cache"""
+  return {
+    'tool': f"<{kind} result cache>",
+    'args': [],
+    'kwargs': {},
+    'rows_in': None,
+    'rows_out': None,
+    'bytes_allocated': None,
+    'wall_ms': 0.0,
+    'error': None,
+    'cached': True,
+  }
+
+
+def cached_sandbox_result(kind: str, code_str: str, user_id: int, run: Callable[[], tuple], profile: Optional[List[Dict[str, Any]]] = None) -> tuple:
+  """``run()``, or the result of an earlier identical run of ``code_str`` for ``user_id`` on unchanged data.
+
+  Only results whose first element (success) is True are stored, together with the tool profile entries the run
+  appended to ``profile``. Hits return a deep copy with a **Cached Result** line prepended to the logs (the logs
+  element differs by ``kind``); ``profile`` then receives a cache-hit entry followed by the stored entries, each
+  marked ``'cached': True``, so a hit is not mistaken for a run that called no tools.
+  """
+  if _CACHE.max_entries <= 0:
+    return run()
+  names = referenced_names(code_str)
+  if names is None or names & _UNCACHEABLE_TOOLS:
+    _CACHE.count_bypass()
+    return run()
+  db = Database()
+  version = db.get_data_version(user_id)
+  code_hash = hashlib.sha256(code_str.encode("utf-8")).hexdigest()
+  key = (kind, code_hash, db.db_path, user_id, version, date.today().isoformat())
+  cached = _CACHE.get(key)
+  if cached is not None:
+    cached_result, cached_profile = copy.deepcopy(cached)
+    if profile is not None:
+      profile.append(_cache_hit_profile_entry(kind))
+      profile.extend({**entry, 'cached': True} for entry in cached_profile)
+    result = list(cached_result)
+    logs_index = 3 if kind == "planner" else 2
+    marker = f"**Cached Result** of `U-{user_id}` (v{version})"
+    result[logs_index] = f"{marker}\n\n{result[logs_index]}" if result[logs_index] else marker
+    return tuple(result)
+  profile_start = len(profile) if profile is not None else 0
+  result = run()
+  if result[0] is True:
+    _CACHE.put(key, copy.deepcopy((result, profile[profile_start:] if profile is not None else [])))
+  return result
@@ -0,0 +1,272 @@
+"""
+Opt-in cache of generated ``process_input`` programs for repeated requests.
+Many turns are the same intent in different words ("What's my checking balance?", "what is my checking balance"),
+and the model writes effectively the same program for them. Programs that executed successfully are kept under a
+normalized form of the conversation (lowercased, punctuation and contractions removed, numbers and dates in one
+canonical spelling), scoped to the model and the exact prompt the agent would have sent besides the conversation
+(static prompt with today's date plus the user's account and subscription sections). A later request with the same
+normalized form skips the model call and runs the stored program in the sandbox.
+
+Fuzzy matching is a separate opt-in (PENNY_CODE_CACHE_MIN_SIMILARITY). Its confidence is the overlap (Jaccard) of the
+two requests' ordered word bigrams, so reordered requests ("dining compared to groceries" / "groceries compared to
+dining") do not match. Numbers, dates, month names and negations must match exactly whatever the threshold, since
+they change what a program computes. Programs that reference a mutating or LLM-backed tool are never stored.
+
+Settings (environment):
+  PENNY_CODE_CACHE_SIZE             programs kept (default 0 = off)
+  PENNY_CODE_CACHE_TTL_SECONDS      lifetime of each program (default 3600)
+  PENNY_CODE_CACHE_MIN_SIMILARITY   enables fuzzy matching: bigram overlap a differently worded request needs to reuse
+                                    a stored program (default unset: exact normalized match only)
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, List, Optional, Tuple
+import os
+import re
+import threading
+import time
+from penny.tool_funcs.sandbox_result_cache import _UNCACHEABLE_TOOLS, referenced_names
+
+_DEFAULT_TTL_SECONDS = 3600.0
+
+_MONTHS = {
+  "jan": "january", "feb": "february", "mar": "march", "apr": "april", "jun": "june", "jul": "july",
+  "aug": "august", "sep": "september", "sept": "september", "oct": "october", "nov": "november", "dec": "december",
+}
+_MONTH_NUMBERS = {name: index for index, name in enumerate(
+  ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"], 1)}
+_NUMBER_WORDS = {
+  "zero": "0", "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6", "seven": "7",
+  "eight": "8", "nine": "9", "ten": "10", "eleven": "11", "twelve": "12",
+}
+_CONTRACTIONS = [
+  (re.compile(r"\bcan't\b"), "can not"),
+  (re.compile(r"\bwon't\b"), "will not"),
+  (re.compile(r"\b(what|where|how|who|that|it|there|here)'s\b"), r"\1 is"),
+  (re.compile(r"\b(\w+)n't\b"), r"\1 not"),
+  (re.compile(r"\bi'm\b"), "i am"),
+  (re.compile(r"\b(\w+)'ve\b"), r"\1 have"),
+  (re.compile(r"\b(\w+)'re\b"), r"\1 are"),
+  (re.compile(r"\b(\w+)'ll\b"), r"\1 will"),
+  (re.compile(r"\b(\w+)'d\b"), r"\1 would"),
+]
+_PREVIOUS_PERIOD = re.compile(r"\b(?:previous|prior)\s+(day|week|month|quarter|year)\b")
+_ISO_DATE = re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b")
+_US_DATE = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b")
+# Amounts, but not the parts of an already canonical date
+_AMOUNT = re.compile(r"(?:\$\s?)?(?<![\d\-])(\d{1,3}(?:,\d{3})+|\d+)(?:\.(\d+))?(?![\d\-])")
+_ORDINAL = re.compile(r"\b(\d+)(?:st|nd|rd|th)\b")
+_NON_WORD = re.compile(r"[^a-z0-9\-\s]+")
+_DATE_TOKEN = re.compile(r"^\d{4}-\d{2}-\d{2}$|^\d{2}-\d{2}$")
+_NEGATIONS = frozenset({"not", "no", "never", "without", "except", "excluding", "exclude", "but"})
+
+
+def _canonical_amount(match: re.Match) -> str:
+  whole = match.group(1).replace(",", "")
+  fraction = (match.group(2) or "").rstrip("0")
+  return f"{int(whole)}.{fraction}" if fraction else str(int(whole))
+
+
+def _canonical_us_date(match: re.Match) -> str:
+  month, day, year = int(match.group(1)), int(match.group(2)), match.group(3)
+  if not (1 <= month <= 12 and 1 <= day <= 31):
+    return match.group(0)
+  if year is None:
+    return f"{month:02d}-{day:02d}"
+  return f"{int(year) + 2000 if len(year) == 2 else int(year):04d}-{month:02d}-{day:02d}"
+
+
+def normalize_request(text: str) -> str:
+  """Lowercased ``text`` with punctuation and contractions removed, and numbers and dates in one canonical spelling.
+
+  Dates become ISO (``2025-03-05``, or ``03-05`` without a year), month abbreviations become full names, amounts lose
+  currency signs, thousands separators and trailing zero cents, number words up to twelve become digits, and
+  "previous/prior month" becomes "last month".
+  """
+  text = text.lower().replace("’", "'")
+  for pattern, replacement in _CONTRACTIONS:
+    text = pattern.sub(replacement, text)
+  text = _ISO_DATE.sub(lambda m: f"{int(m.group(1)):04d}-{int(m.group(2)):02d}-{int(m.group(3)):02d}", text)
+  text = _US_DATE.sub(_canonical_us_date, text)
+  text = _ORDINAL.sub(r"\1", text)
+  text = _AMOUNT.sub(_canonical_amount, text)
+  text = _PREVIOUS_PERIOD.sub(r"last \1", text)
+  text = _NON_WORD.sub(" ", text.replace("'", ""))
+  words = []
+  for word in text.split():
+    word = word.strip("-")
+    if not word:
+      continue
+    word = _MONTHS.get(word, word)
+    words.append(_NUMBER_WORDS.get(word, word))
+  return " ".join(words)
+
+
+def _value_tokens(words: FrozenSet[str]) -> FrozenSet[str]:
+  """Words that change what a program computes: numbers, dates, months and negations"""
+  return frozenset(
+    word for word in words
+    if word[0].isdigit() or _DATE_TOKEN.match(word) or word in _MONTH_NUMBERS or word in _NEGATIONS
+  )
+
+
+def _bigrams(words: List[str]) -> FrozenSet[Tuple[str, str]]:
+  padded = ["<s>", *words, "</s>"]
+  return frozenset(zip(padded, padded[1:]))
+
+
+def _request_features(normalized: str) -> Optional[Tuple[FrozenSet[Tuple[str, str]], FrozenSet[str]]]:
+  """Word bigrams and value tokens of a normalized request (None when it has no words)"""
+  words = normalized.split()
+  if not words:
+    return None
+  return _bigrams(words), _value_tokens(frozenset(words))
+
+
+def _feature_similarity(features_a, features_b) -> float:
+  if features_a is None or features_b is None or features_a[1] != features_b[1]:
+    return 0.0
+  bigrams_a, bigrams_b = features_a[0], features_b[0]
+  return len(bigrams_a & bigrams_b) / len(bigrams_a | bigrams_b)
+
+
+def request_similarity(normalized_a: str, normalized_b: str) -> float:
+  """Confidence that two normalized requests are the same intent: overlap of their ordered word bigrams, or 0.0
+  when their values differ"""
+  return _feature_similarity(_request_features(normalized_a), _request_features(normalized_b))
+
+
+def is_cacheable_program(code_str: str) -> bool:
+  """Whether ``code_str`` defines ``process_input`` and calls no mutating or LLM-backed tool"""
+  names = referenced_names(code_str)
+  return names is not None and not names & _UNCACHEABLE_TOOLS and "def process_input" in code_str
+
+
+class SemanticCodeCache:
+  """LRU of generated programs per (scope, normalized request) with per-entry TTL and counters.
+  ``min_similarity`` enables fuzzy matching; without it only an identical normalized request hits. Each entry keeps
+  its request's bigrams and value tokens, computed once when it is stored.
+  """
+
+  def __init__(self, max_entries: int = 0, ttl_seconds: float = _DEFAULT_TTL_SECONDS, min_similarity: Optional[float] = None):
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self.min_similarity = min_similarity
+    self._entries: "OrderedDict[Tuple[Hashable, str], Tuple[str, float, Any]]" = OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.similar_hits = 0
+    self.misses = 0
+    self.stores = 0
+    self.rejections = 0
+    self.invalidations = 0
+
+  def get(self, scope: Hashable, request: str) -> Optional[Tuple[str, float, str]]:
+    """Stored program, its confidence and the normalized request it was stored under, or None"""
+    normalized = normalize_request(request)
+    features = _request_features(normalized) if self.min_similarity is not None else None
+    with self._lock:
+      now = time.monotonic()
+      self._expire_least_recent(now)
+      key = (scope, normalized)
+      entry = self._entries.get(key)
+      if entry is not None and now - entry[1] > self.ttl_seconds:
+        del self._entries[key]
+        entry = None
+      best = (key, 1.0) if entry is not None else None
+      if best is None and self.min_similarity is not None:
+        # Same scope, different wording: the closest stored request that clears the threshold
+        expired = []
+        for key, entry in self._entries.items():
+          if key[0] != scope:
+            continue
+          if now - entry[1] > self.ttl_seconds:
+            expired.append(key)
+            continue
+          similarity = _feature_similarity(features, entry[2])
+          if similarity >= self.min_similarity and (best is None or similarity > best[1]):
+            best = (key, similarity)
+        for key in expired:
+          del self._entries[key]
+      if best is None:
+        self.misses += 1
+        return None
+      key, similarity = best
+      self._entries.move_to_end(key)
+      self.hits += 1
+      if key[1] != normalized:
+        self.similar_hits += 1
+      return self._entries[key][0], similarity, key[1]
+
+  def put(self, scope: Hashable, request: str, code_str: str) -> bool:
+    """Store ``code_str`` (a successfully executed program) for ``request``; False when it is not cacheable"""
+    if not is_cacheable_program(code_str):
+      with self._lock:
+        self.rejections += 1
+      return False
+    normalized = normalize_request(request)
+    key = (scope, normalized)
+    entry = (code_str, time.monotonic(), _request_features(normalized))
+    with self._lock:
+      self._entries[key] = entry
+      self._entries.move_to_end(key)
+      self.stores += 1
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+    return True
+
+  def _expire_least_recent(self, now: float) -> None:
+    """Drop expired entries from the least recently used end (entries touched since storing are checked on lookup)"""
+    while self._entries:
+      key, entry = next(iter(self._entries.items()))
+      if now - entry[1] <= self.ttl_seconds:
+        return
+      del self._entries[key]
+
+  def invalidate(self, scope: Hashable, normalized_request: str) -> None:
+    """Drop the program stored under ``normalized_request`` (e.g. after it failed to execute)"""
+    with self._lock:
+      if self._entries.pop((scope, normalized_request), None) is not None:
+        self.invalidations += 1
+
+  def clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+        'hits': self.hits,
+        'similar_hits': self.similar_hits,
+        'misses': self.misses,
+        'hit_rate': self.hits / lookups if lookups else 0.0,
+        'stores': self.stores,
+        'rejections': self.rejections,
+        'invalidations': self.invalidations,
+        'entries': len(self._entries),
+        'max_entries': self.max_entries,
+        'min_similarity': self.min_similarity,
+      }
+
+
+_CACHE = SemanticCodeCache(
+  max_entries=int(os.environ.get("PENNY_CODE_CACHE_SIZE", 0)),
+  ttl_seconds=float(os.environ.get("PENNY_CODE_CACHE_TTL_SECONDS", _DEFAULT_TTL_SECONDS)),
+  min_similarity=float(os.environ["PENNY_CODE_CACHE_MIN_SIMILARITY"]) if os.environ.get("PENNY_CODE_CACHE_MIN_SIMILARITY") else None,
+)
+
+
+def get_semantic_code_cache() -> Optional[SemanticCodeCache]:
+  """The process-wide program cache, or None when it is disabled"""
+  return _CACHE if _CACHE.max_entries > 0 else None
+
+
+def get_semantic_code_cache_stats() -> Dict[str, Any]:
+  """Hit/miss/store counters and size of the process-wide program cache"""
+  return _CACHE.stats()
+
+
+def clear_semantic_code_cache() -> None:
+  """Drop every cached program (counters are kept)"""
+  _CACHE.clear()
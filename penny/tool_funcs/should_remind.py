@@ -1,4 +1,3 @@
-from google import genai
 from google.genai import types
 import sys
 import os
@@ -39,6 +38,7 @@ if parent_dir not in sys.path:
   sys.path.insert(0, parent_dir)
 
 from database import Database
+from penny.tool_funcs.genai_clients import get_genai_client
 
 # Load environment variables
 load_dotenv()
@@ -283,7 +283,7 @@ class ShouldRemindGenerator:
   def __init__(self, model_name="gemini-2.0-flash"):
     """Initialize the Gemini agent with API configuration"""
     # API Configuration
-    self.client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+    self.client = get_genai_client()
     
     # Model Configuration
     if "-thinking" in model_name:
@@ -0,0 +1,62 @@
+"""
+Per-call profile of the tools generated code calls in the sandbox.
+Each call records the tool name, a summary of its arguments, wall time, DataFrame rows in and out, and (when
+tracemalloc is tracing, e.g. with PYTHONTRACEMALLOC=1) the bytes it left allocated, so a slow turn can be
+attributed to SQL, pandas or formatting.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import time
+import tracemalloc
+import pandas as pd
+
+# Characters kept from each argument's repr
+_MAX_ARGUMENT_CHARS = 200
+
+
+def _rows(value: Any) -> Optional[int]:
+  if isinstance(value, (pd.DataFrame, pd.Series)):
+    return len(value)
+  return None
+
+
+def summarize_argument(value: Any) -> str:
+  """Short, JSON-safe description of a tool argument (frames are described by shape, not content)"""
+  if isinstance(value, pd.DataFrame):
+    return f"<DataFrame {value.shape[0]}x{value.shape[1]}>"
+  if isinstance(value, pd.Series):
+    return f"<Series {len(value)}>"
+  text = repr(value)
+  if len(text) > _MAX_ARGUMENT_CHARS:
+    text = f"{text[:_MAX_ARGUMENT_CHARS]}…"
+  return text
+
+
+def profile_tool_call(profile: List[Dict[str, Any]], tool: str, func: Callable, args: tuple, kwargs: dict) -> Any:
+  """Call ``func(*args, **kwargs)`` and append its profile entry to ``profile`` (also when it raises)"""
+  rows_in = [rows for rows in map(_rows, (*args, *kwargs.values())) if rows is not None]
+  entry = {
+    'tool': tool,
+    'args': [summarize_argument(arg) for arg in args],
+    'kwargs': {name: summarize_argument(value) for name, value in kwargs.items()},
+    'rows_in': sum(rows_in) if rows_in else None,
+    'rows_out': None,
+    'bytes_allocated': None,
+    'wall_ms': None,
+    'error': None,
+  }
+  tracing = tracemalloc.is_tracing()
+  memory_before = tracemalloc.get_traced_memory()[0] if tracing else 0
+  start = time.perf_counter()
+  try:
+    result = func(*args, **kwargs)
+    entry['rows_out'] = _rows(result)
+    return result
+  except Exception as e:
+    entry['error'] = type(e).__name__
+    raise
+  finally:
+    entry['wall_ms'] = (time.perf_counter() - start) * 1000
+    if tracing:
+      entry['bytes_allocated'] = tracemalloc.get_traced_memory()[0] - memory_before
+    profile.append(entry)
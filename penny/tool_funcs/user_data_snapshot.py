@@ -0,0 +1,99 @@
+"""
+Request-scoped snapshot of a user's data for sandbox execution.
+Each retrieval tool loads its dataset at most once per sandbox run and then hands out copies,
+so generated code calling several tools (or the same tool twice) does not hit the database again.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional
+import threading
+import pandas as pd
+from penny.tool_funcs.sandbox_logging import log
+
+
+class UserDataSnapshot:
+  """Per-execution cache of the DataFrames returned by the retrieval tools for one user"""
+
+  def __init__(self, user_id: int):
+    self.user_id = user_id
+    self.loads = 0
+    self.hits = 0
+    self._frames: Dict[str, pd.DataFrame] = {}
+    self._lock = threading.Lock()
+    self._key_locks: Dict[str, threading.Lock] = {}
+
+  def get(self, key: str, loader: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """Return a copy of dataset ``key``, calling ``loader`` only the first time it is requested.
+
+    Callers get their own copy so generated code can add columns or assign values without
+    affecting later retrievals in the same run.
+    """
+    with self._lock:
+      key_lock = self._key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+      if key in self._frames:
+        self.hits += 1
+        frame = self._frames[key]
+        log(f"**Reused Snapshot** `{key}` of `U-{self.user_id}`: `df: {frame.shape}`")
+      else:
+        frame = loader()
+        self._frames[key] = frame
+        self.loads += 1
+    return frame.copy()
+
+  def prefetch(self, key: str, loader: Callable[[], pd.DataFrame]) -> None:
+    """Load dataset ``key`` ahead of its first ``get`` (no-op when already loaded); a concurrent ``get`` waits for it"""
+    with self._lock:
+      key_lock = self._key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+      if key not in self._frames:
+        self._frames[key] = loader()
+        self.loads += 1
+
+  def is_loaded(self, key: str) -> bool:
+    """True when ``key`` has already been loaded into this snapshot"""
+    return key in self._frames
+
+  def frames(self) -> Dict[str, pd.DataFrame]:
+    """Datasets loaded so far, by key (the snapshot's own frames, which must not be modified)"""
+    with self._lock:
+      return dict(self._frames)
+
+  @classmethod
+  def from_frames(cls, user_id: int, frames: Dict[str, pd.DataFrame]) -> "UserDataSnapshot":
+    """Snapshot preloaded with ``frames``; ``get`` hands out copies, so several snapshots can share the same frames"""
+    snapshot = cls(user_id)
+    snapshot._frames.update(frames)
+    return snapshot
+
+
+_current_snapshot: ContextVar[Optional[UserDataSnapshot]] = ContextVar("penny_user_data_snapshot", default=None)
+
+
+def get_current_snapshot(user_id: Optional[int] = None) -> Optional[UserDataSnapshot]:
+  """Active snapshot for this execution, or None (also None when it belongs to a different ``user_id``)"""
+  snapshot = _current_snapshot.get()
+  if snapshot is not None and user_id is not None and snapshot.user_id != user_id:
+    return None
+  return snapshot
+
+
+@contextmanager
+def user_data_snapshot(user_id: int, snapshot: Optional[UserDataSnapshot] = None) -> Iterator[UserDataSnapshot]:
+  """Activate a snapshot for ``user_id`` for the duration of the block.
+
+  Nested runs for the same user (e.g. planner skills executing agent code) share the enclosing snapshot.
+  Passing ``snapshot`` activates that one instead (e.g. a batch snapshot loaded ahead of several runs).
+  """
+  if snapshot is None:
+    snapshot = get_current_snapshot(user_id)
+    if snapshot is not None:
+      yield snapshot
+      return
+    snapshot = UserDataSnapshot(user_id)
+  token = _current_snapshot.set(snapshot)
+  try:
+    yield snapshot
+  finally:
+    _current_snapshot.reset(token)
@@ -1,11 +1,15 @@
 from google import genai
 from google.genai import types
 import os
+import threading
 import time
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
 import sandbox
 from database import Database
+from penny.tool_funcs.genai_clients import get_genai_client
+from penny.tool_funcs.prompt_cache import prompt_section_stats
+from penny.tool_funcs.prompt_prefix_cache import get_prompt_prefix_cache, start_stream
 
 # Load environment variables
 load_dotenv()
@@ -158,7 +162,7 @@ class PlannerCodeGen:
   def __init__(self, model_name="gemini-flash-lite-latest"):
     """Initialize the Gemini agent with API configuration for planner code generation"""
     # API Configuration
-    self.client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
+    self.client = get_genai_client()
     
     # Model Configuration
     if "-thinking" in model_name:
@@ -183,6 +187,18 @@ class PlannerCodeGen:
     
     # System Prompt
     self.system_prompt = SYSTEM_PROMPT
+    
+    # The configuration does not depend on the request
+    self.generate_content_config = types.GenerateContentConfig(
+      temperature=self.temperature,
+      top_p=self.top_p,
+      max_output_tokens=self.max_output_tokens,
+      safety_settings=self.safety_settings,
+      system_instruction=[types.Part.from_text(text=self.system_prompt)],
+      thinking_config=types.ThinkingConfig(thinking_budget=self.thinking_budget),
+    )
+    # With provider-side prompt caching, requests reference the cached system prompt instead
+    self.prompt_prefix_cache = get_prompt_prefix_cache()
 
   def _format_conversation_for_planner(self, messages: List[Dict]) -> tuple[str, str]:
     """
@@ -280,27 +296,35 @@ class PlannerCodeGen:
 
 output:""")
     
-    # Create content and configuration
+    # Create content
     contents = [types.Content(role="user", parts=[request_text])]
-    
-    generate_content_config = types.GenerateContentConfig(
-      temperature=self.temperature,
-      top_p=self.top_p,
-      max_output_tokens=self.max_output_tokens,
-      safety_settings=self.safety_settings,
-      system_instruction=[types.Part.from_text(text=self.system_prompt)],
-      thinking_config=types.ThinkingConfig(thinking_budget=self.thinking_budget),
-    )
+    timing_data['prompt_sections'] = prompt_section_stats({
+      'system_prompt': self.system_prompt,
+      'request': request_text.text,
+    })
+
+    cached_content = None
+    if self.prompt_prefix_cache is not None:
+      cached_content = self.prompt_prefix_cache.handle(self.model_name, self.system_prompt)
+
+    def open_stream(cached_content):
+      generate_content_config = self.generate_content_config
+      if cached_content is not None:
+        generate_content_config = generate_content_config.model_copy(update={'system_instruction': None, 'cached_content': cached_content})
+      return self.client.models.generate_content_stream(
+        model=self.model_name,
+        contents=contents,
+        config=generate_content_config,
+      )
 
     # Generate response
     output_text = ""
     output_tokens = 0
+    prompt_tokens = None
     last_chunk = None
-    for chunk in self.client.models.generate_content_stream(
-      model=self.model_name,
-      contents=contents,
-      config=generate_content_config,
-    ):
+    stream, cached_content = start_stream(open_stream, self.prompt_prefix_cache, cached_content)
+    timing_data['cached_prompt_prefix'] = cached_content
+    for chunk in stream:
       if chunk.text is not None:
         output_text += chunk.text
       last_chunk = chunk
@@ -309,22 +333,26 @@ output:""")
     if last_chunk:
       if hasattr(last_chunk, 'usage_metadata') and last_chunk.usage_metadata:
         output_tokens = getattr(last_chunk.usage_metadata, 'output_token_count', 0) or getattr(last_chunk.usage_metadata, 'candidates_token_count', 0)
+        prompt_tokens = getattr(last_chunk.usage_metadata, 'prompt_token_count', None)
       elif hasattr(last_chunk, 'candidates') and last_chunk.candidates:
         for candidate in last_chunk.candidates:
           if hasattr(candidate, 'usage_metadata') and candidate.usage_metadata:
             output_tokens = getattr(candidate.usage_metadata, 'output_token_count', 0) or getattr(candidate.usage_metadata, 'candidates_token_count', 0)
+            prompt_tokens = getattr(candidate.usage_metadata, 'prompt_token_count', None)
             break
     
     gemini_end = time.time()
     
-    # Store output tokens in timing data
+    # Store token counts in timing data
     timing_data['output_tokens'] = output_tokens
+    timing_data['prompt_tokens'] = prompt_tokens
     
-    # Execute the generated code in sandbox
+    # Execute the generated code in sandbox, profiling each tool call
+    tool_profile = []
     # Note: execute_planner_with_tools will extract code from markdown if needed,
     # but we've already wrapped it, so we pass the wrapped code directly
     try:
-      success, message, captured_output, logs = sandbox.execute_planner_with_tools(output_text, user_id)
+      success, message, captured_output, logs = sandbox.execute_planner_with_tools(output_text, user_id, profile=tool_profile)
     except Exception as e:
       # Extract logs from error message if available
       error_str = str(e)
@@ -347,7 +375,8 @@ output:""")
       'call_number': 1,
       'start_time': gemini_end,
       'end_time': execution_end,
-      'duration_ms': (execution_end - gemini_end) * 1000
+      'duration_ms': (execution_end - gemini_end) * 1000,
+      'profile': tool_profile
     })
     
     return {
@@ -374,7 +403,16 @@ output:""")
       raise Exception(f"Failed to get models: {str(e)}")
 
 
+_PLANNERS: Dict[str, PlannerCodeGen] = {}
+_PLANNERS_LOCK = threading.Lock()
+
+
 def create_planner_code_gen(model_name="gemini-flash-lite-latest"):
-  """Create a new Planner code gen instance with the specified model"""
-  return PlannerCodeGen(model_name)
+  """Planner code gen instance for the specified model, shared across requests (planners keep no per-request state)"""
+  with _PLANNERS_LOCK:
+    planner = _PLANNERS.get(model_name)
+    if planner is None:
+      planner = PlannerCodeGen(model_name)
+      _PLANNERS[model_name] = planner
+    return planner
 
@@ -1,8 +1,13 @@
-from typing import Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache, partial, wraps
+from types import MappingProxyType
 from AccessControl.ZopeGuards import guarded_filter, guarded_reduce, guarded_max, guarded_min, guarded_map, guarded_zip, guarded_getitem, guarded_hasattr
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from RestrictedPython import compile_restricted
 from RestrictedPython.Guards import safe_builtins, safe_globals, full_write_guard, guarded_iter_unpack_sequence, guarded_unpack_sequence
 from RestrictedPython.Limits import limited_builtins
 from RestrictedPython.Utilities import utility_builtins
@@ -10,8 +15,10 @@ from RestrictedPython import PrintCollector
 import datetime as dt
 import dateutil
 import pandas as pd
+import sys
 import traceback
 import json
+import time
 from penny.tool_funcs.retrieve_accounts import (
     retrieve_depository_accounts_function_code_gen,
     retrieve_credit_accounts_function_code_gen,
@@ -22,6 +29,7 @@ from penny.tool_funcs.retrieve_transactions import (
     retrieve_income_transactions_function_code_gen,
     retrieve_spending_transactions_function_code_gen,
     transaction_names_and_amounts,
+    transactions_within_window,
     utter_transaction_total
 )
 from penny.tool_funcs.retrieve_forecasts import retrieve_spending_forecasts_function_code_gen, retrieve_income_forecasts_function_code_gen
@@ -39,7 +47,13 @@ from penny.tool_funcs.date_utils import (
     get_after_periods,
     get_date_string
 )
-from penny.tool_funcs.sandbox_logging import log as sandbox_log, clear_logs as clear_sandbox_logs, get_logs_as_string
+from penny.tool_funcs.restricted_compile_cache import compile_restricted_cached
+from penny.tool_funcs.sandbox_logging import LogBuffer, log as sandbox_log, clear_logs as clear_sandbox_logs, get_logs_as_string, log_capture
+from penny.tool_funcs.sandbox_result_cache import cached_sandbox_result
+from penny.tool_funcs.sandbox_prefetch import prefetch_into_snapshot, retrieval_calls, start_prefetch, streamed_retrieval_calls
+from penny.tool_funcs.tool_profiler import profile_tool_call
+from penny.tool_funcs.user_data_snapshot import UserDataSnapshot, get_current_snapshot, user_data_snapshot
+from sandbox_pool import CPULimitExceeded, SharedSnapshot, get_sandbox_pool, in_sandbox_worker, process_pool_enabled
 
 
 def _get_date_for_transaction_dataframe(year: int, month: int, day: int) -> pd.Timestamp:
@@ -71,7 +85,60 @@ def _is_json_serializable(obj):
   except (TypeError, ValueError):
     return False
 
+# Per-type guard decisions: the pandas/callable/datetime checks run once per type instead of on every access
+_PANDAS_TYPE = 1
+_CALLABLE_TYPE = 2
+_ITERABLE_TYPE = 4
+_SPECIAL_ATTR_TYPE = 8  # types the attribute guard must always inspect (classes, PrintHandler, method descriptors)
+# Only classes reachable by name from an imported module (builtins, pandas, numpy, ...) are cached; classes defined
+# by generated code are new on every run, and keeping them would keep their code and globals alive
+_TYPE_TRAITS: Dict[type, int] = {}
+
+def _defines(cls: type, attribute: str) -> bool:
+  return any(attribute in vars(base) for base in cls.__mro__)
+
+def _type_traits(cls: type) -> int:
+  """Guard-relevant traits of ``cls``, computed on a ``_TYPE_TRAITS`` miss"""
+  module = getattr(cls, '__module__', None)
+  if not isinstance(module, str):
+    # Leave unusual classes to the general guards
+    traits = _SPECIAL_ATTR_TYPE
+  else:
+    traits = 0
+    if module.startswith('pandas'):
+      traits |= _PANDAS_TYPE
+    if _defines(cls, '__call__'):
+      traits |= _CALLABLE_TYPE
+    if _defines(cls, '__iter__'):
+      traits |= _ITERABLE_TYPE
+    if issubclass(cls, type) or cls.__name__ in ('PrintHandler', 'method_descriptor'):
+      traits |= _SPECIAL_ATTR_TYPE
+  if isinstance(module, str) and getattr(sys.modules.get(module), cls.__qualname__, None) is cls:
+    _TYPE_TRAITS[cls] = traits
+  return traits
+
 def _getitem_(obj, key):
+  """Guard for item getting: direct subscript for pandas objects and non-callable types"""
+  traits = _TYPE_TRAITS.get(type(obj))
+  if traits is None:
+    traits = _type_traits(type(obj))
+  # Decided per type before subscripting, so the access is evaluated exactly once
+  if traits & _PANDAS_TYPE or not traits & (_CALLABLE_TYPE | _SPECIAL_ATTR_TYPE):
+    try:
+      return obj[key]
+    except Exception as e:
+      raise _getitem_error(obj, key, e, bool(traits & _PANDAS_TYPE)) from e
+  return _checked_getitem(obj, key)
+
+def _getitem_error(obj, key, error: Exception, is_pandas: bool) -> Exception:
+  """Exception the guard raises for a failed subscript: pandas lookup errors unchanged, others as TypeError with context"""
+  if isinstance(error, (TypeError, KeyError, IndexError)):
+    if is_pandas:
+      return error
+    return TypeError(f"_getitem_ guard: Failed to access {type(obj).__name__} with key {key}. Object: {obj}, Error: {error}")
+  return TypeError(f"_getitem_ guard: Unexpected error accessing {type(obj).__name__} with key {key}. Object: {obj}, Error: {error}")
+
+def _checked_getitem(obj, key):
   """Custom guard for item getting that allows pandas objects"""
   try:
     # Allow pandas objects (DataFrame, Series, etc.)
@@ -102,30 +169,51 @@ def _getitem_(obj, key):
     # For other objects, try to use subscript notation
     return obj[key]
   except (TypeError, KeyError, IndexError) as e:
-    # For pandas objects, let the original error propagate naturally
-    if hasattr(obj, '__class__') and obj.__class__.__module__.startswith('pandas'):
-      raise e
-    # For other objects, provide more context
-    raise TypeError(f"_getitem_ guard: Failed to access {type(obj).__name__} with key {key}. Object: {obj}, Error: {e}") from e
+    # For pandas objects, let the original error propagate naturally; for other objects, provide more context
+    error = _getitem_error(obj, key, e, hasattr(obj, '__class__') and obj.__class__.__module__.startswith('pandas'))
+    if error is e:
+      raise
+    raise error from e
   except Exception as e:
-    raise TypeError(f"_getitem_ guard: Unexpected error accessing {type(obj).__name__} with key {key}. Object: {obj}, Error: {e}") from e
+    raise _getitem_error(obj, key, e, False) from e
 
 def _hasattr_(obj, name):
   """Custom guard for hasattr that allows pandas objects"""
   try:
-    # Allow pandas objects (DataFrame, Series, etc.)
-    if hasattr(obj, '__class__') and obj.__class__.__module__.startswith('pandas'):
-      return hasattr(obj, name)
-    # For function objects and other objects, use standard hasattr
     return hasattr(obj, name)
-  except Exception as e:
+  except Exception:
     return False
 
 class _DataFrameGuard:
   """Guard class for DataFrame operations"""
   @staticmethod
   def _getattr_(obj, name):
-    """Guard for attribute access"""
+    """Guard for attribute access: direct getattr for public attributes of ordinary types and any attribute of pandas objects"""
+    traits = _TYPE_TRAITS.get(type(obj))
+    if traits is None:
+      traits = _type_traits(type(obj))
+    # Decided per type before the lookup, so the attribute is evaluated exactly once
+    if not traits & _SPECIAL_ATTR_TYPE and obj is not dt and (traits & _PANDAS_TYPE or not name.startswith('_')):
+      try:
+        return getattr(obj, name)
+      except Exception as e:
+        return _DataFrameGuard._getattr_failure(obj, name, e)
+    return _DataFrameGuard._checked_getattr(obj, name)
+
+  @staticmethod
+  def _getattr_failure(obj, name, error: Exception):
+    """Outcome of a failed attribute lookup: the datetime fallback for its constructors, otherwise AttributeError with context"""
+    # If it's a datetime-related attribute error, try to get it from datetime class
+    if isinstance(error, AttributeError) and name in ('today', 'now', 'utcnow', 'fromtimestamp', 'fromordinal'):
+      try:
+        return getattr(datetime, name)
+      except AttributeError:
+        pass
+    raise AttributeError(f"_getattr_ guard: Failed to access attribute '{name}' on {type(obj).__name__}. Error: {error}") from error
+
+  @staticmethod
+  def _checked_getattr(obj, name):
+    """Attribute access with the pandas, datetime and private-name rules applied"""
     try:
       # Allow pandas objects (DataFrame, Series, etc.)
       if hasattr(obj, '__class__') and obj.__class__.__module__.startswith('pandas'):
@@ -168,20 +256,20 @@ class _DataFrameGuard:
       if name.startswith('_'):
         raise AttributeError(f"_getattr_ guard: Access to private attribute '{name}' on {type(obj).__name__} is not allowed")
       return getattr(obj, name)
-    except AttributeError as e:
-      # If it's a datetime-related attribute error, try to get it from datetime class
-      if name in ('today', 'now', 'utcnow', 'fromtimestamp', 'fromordinal'):
-        try:
-          return getattr(datetime, name)
-        except AttributeError:
-          pass
-      raise AttributeError(f"_getattr_ guard: Failed to access attribute '{name}' on {type(obj).__name__}. Error: {e}") from e
     except Exception as e:
-      raise AttributeError(f"_getattr_ guard: Failed to access attribute '{name}' on {type(obj).__name__}. Error: {e}") from e
+      return _DataFrameGuard._getattr_failure(obj, name, e)
   
   @staticmethod
   def _getiter_(obj):
     """Guard for iteration"""
+    traits = _TYPE_TRAITS.get(type(obj))
+    if traits is None:
+      traits = _type_traits(type(obj))
+    if traits & (_PANDAS_TYPE | _ITERABLE_TYPE):
+      try:
+        return iter(obj)
+      except Exception:
+        pass
     try:
       # Allow pandas objects (DataFrame, Series, etc.)
       if hasattr(obj, '__class__') and obj.__class__.__module__.startswith('pandas'):
@@ -241,215 +329,317 @@ class _DataFrameGuard:
     raise Exception(f"InPlaceVar Failure: {left} {op} {right}")
 
 
-def _get_safe_globals(user_id,use_full_datetime=False):
-  """Create a safe globals dictionary with limited functionality"""
-  all_builtins = safe_builtins.copy()
-  all_builtins.update(safe_globals)
-  all_builtins.update(utility_builtins)
-  all_builtins.update(limited_builtins)
-  all_builtins["__import__"] = _DataFrameGuard.restricted_import
-  
-  # Add additional safe built-ins that are commonly needed
-  additional_builtins = {
-    "sum": sum,
-    "len": len,
-    "range": range,
-    "enumerate": enumerate,
-    "sorted": sorted,
-    "reversed": reversed,
-    "any": any,
-    "all": all,
-    "abs": abs,
-    "round": round,
-    "pow": pow,
-    "divmod": divmod,
-    "isinstance": isinstance,
-    "type": type,
-    "str": str,
-    "int": int,
-    "float": float,
-    "bool": bool,
-    "list": list,
-    "tuple": tuple,
-    "set": set,
-    "dict": dict,
-  }
-  
+class SandboxContext:
+  """Per-execution state read by the prebuilt sandbox globals: the user, print output, log buffer and tool profile of one run"""
 
-  all_builtins.update(additional_builtins)
-  
-  def retrieve_depository_accounts_wrapper():
-    return retrieve_depository_accounts(user_id)
-  
-  def retrieve_credit_accounts_wrapper():
-    return retrieve_credit_accounts(user_id)
-  
-  # Create wrapper functions for account utility functions
-  def account_names_and_balances_wrapper(df: pd.DataFrame, template: str):
-    return account_names_and_balances(df, template)
-  
-  def utter_account_totals_wrapper(df: pd.DataFrame, template: str):
-    return utter_account_totals(df, template)
-  
-  # Create wrapper functions for transaction retrieval
-  def retrieve_income_transactions_wrapper():
-    return retrieve_income_transactions(user_id)
-  
-  def retrieve_spending_transactions_wrapper():
-    return retrieve_spending_transactions(user_id)
-  
-  # Create wrapper functions for forecast retrieval
-  def retrieve_spending_forecasts_wrapper(granularity: str = 'monthly'):
-    return retrieve_spending_forecasts(user_id, granularity)
-  
-  def retrieve_income_forecasts_wrapper(granularity: str = 'monthly'):
-    return retrieve_income_forecasts(user_id, granularity)
-  
-  # Create wrapper function for subscriptions
-  def retrieve_subscriptions_wrapper():
-    return retrieve_subscriptions(user_id)
-  
-  # Create wrapper functions for subscription utility functions
-  def subscription_names_and_amounts_wrapper(df: pd.DataFrame, template: str):
-    return subscription_names_and_amounts(df, template)
-  
-  def utter_subscription_totals_wrapper(df: pd.DataFrame, template: str):
-    return utter_subscription_totals(df, template)
+  __slots__ = ('user_id', 'print_collector', 'logs', 'profile')
+
+  def __init__(self, user_id: int, logs: LogBuffer, profile: Optional[list] = None):
+    self.user_id = user_id
+    self.print_collector = None
+    self.logs = logs
+    self.profile = profile
+
+
+_current_sandbox_context: ContextVar[Optional[SandboxContext]] = ContextVar("penny_sandbox_context", default=None)
+
+
+@contextmanager
+def sandbox_context(user_id: int, profile: Optional[list] = None) -> Iterator[SandboxContext]:
+  """Bind ``user_id``, a fresh print collector and a fresh log buffer for the duration of the block.
+
+  Concurrent runs (threads or asyncio tasks) each see their own context, as do nested runs. When ``profile``
+  is a list, every tool call made by sandboxed code appends its profile entry to it. A run cut short by a pool
+  worker's CPU or memory limit hands its logs to the enclosing capture, which reports them with the limit error.
+  """
+  try:
+    with log_capture() as logs:
+      context = SandboxContext(user_id, logs, profile)
+      token = _current_sandbox_context.set(context)
+      try:
+        yield context
+      finally:
+        _current_sandbox_context.reset(token)
+  except (CPULimitExceeded, MemoryError):
+    for message in logs.messages():
+      sandbox_log(message)
+    raise
+
+
+def _current_user_id() -> int:
+  context = _current_sandbox_context.get()
+  if context is None:
+    raise RuntimeError("Sandbox tool called outside of a sandbox execution")
+  return context.user_id
+
+
+# Builtins are identical for every run; restricted code cannot reach ``__builtins__`` so one dict is shared
+_SAFE_BUILTINS = {
+  **safe_builtins,
+  **safe_globals,
+  **utility_builtins,
+  **limited_builtins,
+  "__import__": _DataFrameGuard.restricted_import,
+  # Additional safe built-ins that are commonly needed
+  "sum": sum,
+  "len": len,
+  "range": range,
+  "enumerate": enumerate,
+  "sorted": sorted,
+  "reversed": reversed,
+  "any": any,
+  "all": all,
+  "abs": abs,
+  "round": round,
+  "pow": pow,
+  "divmod": divmod,
+  "isinstance": isinstance,
+  "type": type,
+  "str": str,
+  "int": int,
+  "float": float,
+  "bool": bool,
+  "list": list,
+  "tuple": tuple,
+  "set": set,
+  "dict": dict,
+}
+
+
+def retrieve_depository_accounts_wrapper():
+  return retrieve_depository_accounts(_current_user_id())
+
+def retrieve_credit_accounts_wrapper():
+  return retrieve_credit_accounts(_current_user_id())
+
+# Wrapper functions for account utility functions
+def account_names_and_balances_wrapper(df: pd.DataFrame, template: str):
+  return account_names_and_balances(df, template)
+
+def utter_account_totals_wrapper(df: pd.DataFrame, template: str):
+  return utter_account_totals(df, template)
+
+# Wrapper functions for transaction retrieval
+def retrieve_income_transactions_wrapper(start_date=None, end_date=None):
+  return retrieve_income_transactions(_current_user_id(), start_date, end_date)
+
+def retrieve_spending_transactions_wrapper(start_date=None, end_date=None):
+  return retrieve_spending_transactions(_current_user_id(), start_date, end_date)
+
+# Wrapper functions for forecast retrieval
+def retrieve_spending_forecasts_wrapper(granularity: str = 'monthly'):
+  return retrieve_spending_forecasts(_current_user_id(), granularity)
+
+def retrieve_income_forecasts_wrapper(granularity: str = 'monthly'):
+  return retrieve_income_forecasts(_current_user_id(), granularity)
+
+# Wrapper function for subscriptions
+def retrieve_subscriptions_wrapper():
+  return retrieve_subscriptions(_current_user_id())
+
+# Wrapper functions for subscription utility functions
+def subscription_names_and_amounts_wrapper(df: pd.DataFrame, template: str):
+  return subscription_names_and_amounts(df, template)
+
+def utter_subscription_totals_wrapper(df: pd.DataFrame, template: str):
+  return utter_subscription_totals(df, template)
+
+# Wrapper functions for transaction utility functions
+def transaction_names_and_amounts_wrapper(df: pd.DataFrame, template: str):
+  return transaction_names_and_amounts(df, template)
+
+def utter_transaction_total_wrapper(df: pd.DataFrame, template: str):
+  return utter_transaction_total(df, template)
+
+def forecast_dates_and_amount_wrapper(df: pd.DataFrame, template: str):
+  return forecast_dates_and_amount(df, template)
+
+def utter_forecast_amount_wrapper(amount: float, template: str):
+  return utter_forecast_amount(amount, template)
+
+def utter_absolute_amount_wrapper(amount: float, template: str):
+  return utter_absolute_amount(amount, template)
+
+def compare_income_or_spending_wrapper(df: pd.DataFrame, template: str, metadata: dict = None):
+  return compare_income_or_spending(df, template, metadata)
+
+def respond_to_app_inquiry_wrapper(inquiry: str):
+  return respond_to_app_inquiry(inquiry)
+
+# Wrapper functions for create_budget_or_goal, create_category_spending_limit, create_savings_goal, and create_reminder
+# Signature matches penny2: (category, granularity, start_date, end_date, amount, title, **kwargs). Extra kwargs (e.g. match_category from LLM-generated code) absorbed; category = match_category or category when calling backend.
+def create_budget_or_goal_wrapper(
+  category: str = "",
+  granularity: str = "",
+  start_date: str = "",
+  end_date: str = "",
+  amount: float = 0.0,
+  title: str = "",
+  **kwargs
+):
+  cat = kwargs.pop("match_category", None) or category
+  return create_budget_or_goal(cat, granularity, start_date, end_date, amount, title)
+
+def create_category_spending_limit_wrapper(category: str, granularity: str, start_date: str, end_date: str, amount: float, title: str):
+  return create_category_spending_limit(category, granularity, start_date, end_date, amount, title)
+
+def create_income_goal_wrapper(category: str, granularity: str, start_date: str, end_date: str, amount: float, title: str):
+  return create_income_goal(category, granularity, start_date, end_date, amount, title)
+
+def create_savings_goal_wrapper(amount: float, end_date: str, title: str, goal_type: str = "save_X_amount", granularity: Optional[str] = None, start_date: str = "", account_ids: Optional[list] = None):
+  return create_savings_goal(amount, end_date, title, goal_type=goal_type, granularity=granularity, start_date=start_date, account_ids=account_ids)
+
+# validate_budget_or_goal function (used by generated code from P:Func:CreateBudgetOrGoal)
+def validate_budget_or_goal(category: str, match_category: str, match_caveats: Optional[str], type: str, granularity: str, start_date: str, end_date: str, amount: float, title: str, budget_or_goal: str):
+  """Validate a budget or goal with individual parameters.
   
-  # Create wrapper functions for transaction utility functions
-  def transaction_names_and_amounts_wrapper(df: pd.DataFrame, template: str):
-    return transaction_names_and_amounts(df, template)
+  This function validates the goal parameters and returns success/error message.
+  Implementation copied from finance-ai-llm-server/penny/tools/create_budget_or_goal_combined.py
+  """
+  from datetime import datetime
   
-  def utter_transaction_total_wrapper(df: pd.DataFrame, template: str):
-    return utter_transaction_total(df, template)
+  VALID_GRANULARITIES = ["weekly", "monthly", "yearly"]
   
-  def forecast_dates_and_amount_wrapper(df: pd.DataFrame, template: str):
-    return forecast_dates_and_amount(df, template)
+  # Build goal dictionary from parameters
+  goal = {
+    "category": category,
+    "match_category": match_category,
+    "match_caveats": match_caveats,
+    "type": type,
+    "granularity": granularity,
+    "start_date": start_date,
+    "end_date": end_date,
+    "amount": amount,
+    "title": title,
+    "budget_or_goal": budget_or_goal
+  }
   
-  def utter_forecast_amount_wrapper(amount: float, template: str):
-    return utter_forecast_amount(amount, template)
+  goal_name = (goal["title"] if "title" in goal and goal["title"]
+               else goal["category"] if "category" in goal and goal["category"] else "")
+  user_asks = []
   
-  def utter_absolute_amount_wrapper(amount: float, template: str):
-    return utter_absolute_amount(amount, template)
+  # Check granularity
+  if "granularity" not in goal or goal["granularity"] not in VALID_GRANULARITIES:
+    suffix = f" {goal_name} budget" if goal_name else ""
+    user_asks.append(f"What time periods are you looking to track for this{suffix}, like monthly?")
   
-  def compare_income_or_spending_wrapper(df: pd.DataFrame, template: str, metadata: dict = None):
-    return compare_income_or_spending(df, template, metadata)
+  # Check amount
+  if "amount" not in goal or goal["amount"] is None or int(goal["amount"]) < 0:
+    suffix = f" of the {goal_name}?" if goal_name else "?"
+    user_asks.append(f"What is the target amount{suffix}")
+
+  # Check category - only required for category type goals
+  goal_type = goal.get("type", "category")
+  if goal_type == "category":
+    # Category is required for category type goals
+    if ("match_category" not in goal or not goal["match_category"]):
+      user_asks.append(f"Could you clarify the category for {goal_name}?")
   
-  def respond_to_app_inquiry_wrapper(inquiry: str):
-    return respond_to_app_inquiry(inquiry)
+  # Check dates
+  if "start_date" in goal and goal["start_date"]:
+    try:
+      starting_date = datetime.strptime(goal["start_date"], "%Y-%m-%d")
+    except ValueError:
+      user_asks.append("Please clarify when do you want this to start?")
   
-  # Create wrapper functions for create_budget_or_goal, create_category_spending_limit, create_savings_goal, and create_reminder
-  # Signature matches penny2: (category, granularity, start_date, end_date, amount, title, **kwargs). Extra kwargs (e.g. match_category from LLM-generated code) absorbed; category = match_category or category when calling backend.
-  def create_budget_or_goal_wrapper(
-    category: str = "",
-    granularity: str = "",
-    start_date: str = "",
-    end_date: str = "",
-    amount: float = 0.0,
-    title: str = "",
-    **kwargs
-  ):
-    cat = kwargs.pop("match_category", None) or category
-    return create_budget_or_goal(cat, granularity, start_date, end_date, amount, title)
-
-  def create_category_spending_limit_wrapper(category: str, granularity: str, start_date: str, end_date: str, amount: float, title: str):
-    return create_category_spending_limit(category, granularity, start_date, end_date, amount, title)
-
-  def create_income_goal_wrapper(category: str, granularity: str, start_date: str, end_date: str, amount: float, title: str):
-    return create_income_goal(category, granularity, start_date, end_date, amount, title)
-
-  def create_savings_goal_wrapper(amount: float, end_date: str, title: str, goal_type: str = "save_X_amount", granularity: Optional[str] = None, start_date: str = "", account_ids: Optional[list] = None):
-    return create_savings_goal(amount, end_date, title, goal_type=goal_type, granularity=granularity, start_date=start_date, account_ids=account_ids)
-
-  # validate_budget_or_goal function (used by generated code from P:Func:CreateBudgetOrGoal)
-  def validate_budget_or_goal(category: str, match_category: str, match_caveats: Optional[str], type: str, granularity: str, start_date: str, end_date: str, amount: float, title: str, budget_or_goal: str):
-    """Validate a budget or goal with individual parameters.
-    
-    This function validates the goal parameters and returns success/error message.
-    Implementation copied from finance-ai-llm-server/penny/tools/create_budget_or_goal_combined.py
-    """
-    from datetime import datetime
-    
-    VALID_GRANULARITIES = ["weekly", "monthly", "yearly"]
-    
-    # Build goal dictionary from parameters
-    goal = {
-      "category": category,
-      "match_category": match_category,
-      "match_caveats": match_caveats,
-      "type": type,
-      "granularity": granularity,
-      "start_date": start_date,
-      "end_date": end_date,
-      "amount": amount,
-      "title": title,
-      "budget_or_goal": budget_or_goal
-    }
-    
-    goal_name = (goal["title"] if "title" in goal and goal["title"]
-                 else goal["category"] if "category" in goal and goal["category"] else "")
-    user_asks = []
-    
-    # Check granularity
-    if "granularity" not in goal or goal["granularity"] not in VALID_GRANULARITIES:
-      suffix = f" {goal_name} budget" if goal_name else ""
-      user_asks.append(f"What time periods are you looking to track for this{suffix}, like monthly?")
-    
-    # Check amount
-    if "amount" not in goal or goal["amount"] is None or int(goal["amount"]) < 0:
-      suffix = f" of the {goal_name}?" if goal_name else "?"
-      user_asks.append(f"What is the target amount{suffix}")
-
-    # Check category - only required for category type goals
-    goal_type = goal.get("type", "category")
-    if goal_type == "category":
-      # Category is required for category type goals
-      if ("match_category" not in goal or not goal["match_category"]):
-        user_asks.append(f"Could you clarify the category for {goal_name}?")
-    
-    # Check dates
-    if "start_date" in goal and goal["start_date"]:
-      try:
-        starting_date = datetime.strptime(goal["start_date"], "%Y-%m-%d")
-      except ValueError:
-        user_asks.append("Please clarify when do you want this to start?")
-    
-    if "end_date" in goal and goal["end_date"]:
-      try:
-        ending_date = datetime.strptime(goal["end_date"], "%Y-%m-%d")
-      except ValueError:
-        user_asks.append("Please clarify when do you want this to end?")
+  if "end_date" in goal and goal["end_date"]:
+    try:
+      ending_date = datetime.strptime(goal["end_date"], "%Y-%m-%d")
+    except ValueError:
+      user_asks.append("Please clarify when do you want this to end?")
 
-    # Check date range validity
-    if ("start_date" in goal and goal["start_date"]
-        and "end_date" in goal and goal["end_date"]):
-      try:
-        starting_date = datetime.strptime(goal["start_date"], "%Y-%m-%d")
-        ending_date = datetime.strptime(goal["end_date"], "%Y-%m-%d")
-        if ending_date < starting_date:
-          user_asks.append("Please clarify the start and end dates for this, we might have reversed it.")
-        else:
-          # For weekly goals, a Sunday-to-Saturday range is 6 days difference (inclusive).
-          # Allow 6+ days for weekly; keep 7+ default for others.
-          min_days = 6 if goal.get("granularity") == "weekly" else 7
-          if (ending_date - starting_date).days < min_days:
-            user_asks.append("Please clarify the start and end dates as it is too short.  It needs to cover the full selected period.")
-      except ValueError:
-        pass
-    
-    # Return validation result
-    if user_asks:
-      return False, "\n".join(user_asks)
-    
-    # If validation passes, return success message
-    goal_name = title if title else (category if category else "goal")
-    return True, f"Successfully validated {budget_or_goal} '{goal_name}' from {start_date} to {end_date} with target amount ${amount:.2f}."
+  # Check date range validity
+  if ("start_date" in goal and goal["start_date"]
+      and "end_date" in goal and goal["end_date"]):
+    try:
+      starting_date = datetime.strptime(goal["start_date"], "%Y-%m-%d")
+      ending_date = datetime.strptime(goal["end_date"], "%Y-%m-%d")
+      if ending_date < starting_date:
+        user_asks.append("Please clarify the start and end dates for this, we might have reversed it.")
+      else:
+        # For weekly goals, a Sunday-to-Saturday range is 6 days difference (inclusive).
+        # Allow 6+ days for weekly; keep 7+ default for others.
+        min_days = 6 if goal.get("granularity") == "weekly" else 7
+        if (ending_date - starting_date).days < min_days:
+          user_asks.append("Please clarify the start and end dates as it is too short.  It needs to cover the full selected period.")
+    except ValueError:
+      pass
   
-  def create_reminder_wrapper(what: str, when: str):
-    return create_reminder(what, when)
+  # Return validation result
+  if user_asks:
+    return False, "\n".join(user_asks)
   
-  safe_globals_dict = {
-    "__builtins__": all_builtins,
+  # If validation passes, return success message
+  goal_name = title if title else (category if category else "goal")
+  return True, f"Successfully validated {budget_or_goal} '{goal_name}' from {start_date} to {end_date} with target amount ${amount:.2f}."
+
+def create_reminder_wrapper(what: str, when: str):
+  return create_reminder(what, when)
+
+# Planner skill functions
+def lookup_wrapper(lookup_request: str, input_info: str = None):
+  return lookup_user_accounts_transactions_income_and_spending_patterns(lookup_request, input_info)
+
+def create_budget_wrapper(creation_request: str, input_info: str = None):
+  return create_budget_or_goal_from_request(creation_request, input_info)
+
+def research_wrapper(strategize_request: str, input_info: str = None):
+  return research_and_strategize_financial_outcomes(strategize_request, input_info)
+
+def update_category_wrapper(categorize_request: str, input_info: str = None):
+  return update_transaction_category_or_create_category_rules(categorize_request, input_info)
+
+
+# Globals whose calls are recorded when a run is profiled (retrieval, formatting, creation and planner skills)
+_PROFILED_TOOLS = frozenset({
+  "retrieve_depository_accounts",
+  "retrieve_credit_accounts",
+  "account_names_and_balances",
+  "utter_account_totals",
+  "retrieve_income_transactions",
+  "retrieve_spending_transactions",
+  "retrieve_spending_forecasts",
+  "retrieve_income_forecasts",
+  "retrieve_subscriptions",
+  "subscription_names_and_amounts",
+  "utter_subscription_totals",
+  "transaction_names_and_amounts",
+  "utter_transaction_total",
+  "forecast_dates_and_amount",
+  "utter_forecast_amount",
+  "utter_absolute_amount",
+  "compare_income_or_spending",
+  "respond_to_app_inquiry",
+  "create_budget_or_goal",
+  "create_category_spending_limit",
+  "create_income_goal",
+  "create_savings_goal",
+  "create_category_budget",
+  "validate_budget_or_goal",
+  "create_reminder",
+  "lookup_user_accounts_transactions_income_and_spending_patterns",
+  "create_budget_or_goal_or_reminder",
+  "research_and_strategize_financial_outcomes",
+  "update_transaction_category_or_create_category_rules",
+})
+
+
+def _profiled_tool(name: str, func):
+  """``func`` recording a profile entry per call when the current run collects a profile"""
+  @wraps(func)
+  def tool(*args, **kwargs):
+    context = _current_sandbox_context.get()
+    if context is None or context.profile is None:
+      return func(*args, **kwargs)
+    return profile_tool_call(context.profile, name, func, args, kwargs)
+  return tool
+
+
+@lru_cache(maxsize=None)
+def _safe_globals_template(use_full_datetime: bool, planner: bool) -> MappingProxyType:
+  """Read-only globals shared by every run with the same flags (built on first use, after the tools below are defined)"""
+  template = {
+    "__builtins__": _SAFE_BUILTINS,
     "pd": pd,
     "pandas": pd,
     "dateutil": dateutil,
@@ -509,34 +699,28 @@ def _get_safe_globals(user_id,use_full_datetime=False):
     "validate_budget_or_goal": validate_budget_or_goal,
     "create_reminder": create_reminder_wrapper,
   }
-  return safe_globals_dict
+  if planner:
+    template.update({
+      "lookup_user_accounts_transactions_income_and_spending_patterns": lookup_wrapper,
+      "create_budget_or_goal_or_reminder": create_budget_wrapper,
+      "research_and_strategize_financial_outcomes": research_wrapper,
+      "update_transaction_category_or_create_category_rules": update_category_wrapper,
+    })
+  for name in _PROFILED_TOOLS & template.keys():
+    template[name] = _profiled_tool(name, template[name])
+  return MappingProxyType(template)
 
-def _get_safe_globals_planner(user_id, use_full_datetime=False):
-  """Create a safe globals dictionary with planner skill functions"""
-  # Start with the regular safe globals
-  safe_globals_dict = _get_safe_globals(user_id, use_full_datetime)
-  
-  # Add planner skill functions
-  def lookup_wrapper(lookup_request: str, input_info: str = None):
-    return lookup_user_accounts_transactions_income_and_spending_patterns(lookup_request, input_info)
-  
-  def create_budget_wrapper(creation_request: str, input_info: str = None):
-    return create_budget_or_goal_from_request(creation_request, input_info)
-  
-  def research_wrapper(strategize_request: str, input_info: str = None):
-    return research_and_strategize_financial_outcomes(strategize_request, input_info)
-  
-  def update_category_wrapper(categorize_request: str, input_info: str = None):
-    return update_transaction_category_or_create_category_rules(categorize_request, input_info)
-  
-  safe_globals_dict.update({
-    "lookup_user_accounts_transactions_income_and_spending_patterns": lookup_wrapper,
-    "create_budget_or_goal_or_reminder": create_budget_wrapper,
-    "research_and_strategize_financial_outcomes": research_wrapper,
-    "update_transaction_category_or_create_category_rules": update_category_wrapper,
-  })
-  
-  return safe_globals_dict
+
+def _get_safe_globals(use_full_datetime=False):
+  """Fresh globals dictionary with limited functionality (a shallow copy of the prebuilt template).
+
+  User-bound tools read the user from the active ``sandbox_context``.
+  """
+  return _safe_globals_template(bool(use_full_datetime), False).copy()
+
+def _get_safe_globals_planner(use_full_datetime=False):
+  """Fresh globals dictionary with planner skill functions"""
+  return _safe_globals_template(bool(use_full_datetime), True).copy()
 
 def _check_code_for_full_datetime(code_str: str) -> bool:
   """Use the ``datetime`` module as global ``datetime`` when code needs submodule constructors."""
@@ -547,62 +731,141 @@ def _check_code_for_full_datetime(code_str: str) -> bool:
     or "datetime.datetime" in code_str
   )
 
-# Global PrintCollector instance for capturing print outputs
-_print_collector = None
-
 def get_print_collector(_getattr_=None):
-  """Get or create the global PrintCollector instance"""
-  global _print_collector
-  if _print_collector is None:
-    _print_collector = PrintCollector(_getattr_=_getattr_ or _DataFrameGuard._getattr_)
-  return _print_collector
+  """Get or create the PrintCollector of the current execution (``_print_`` in sandboxed code)"""
+  context = _current_sandbox_context.get()
+  if context is None:
+    return PrintCollector(_getattr_=_getattr_ or _DataFrameGuard._getattr_)
+  if context.print_collector is None:
+    context.print_collector = PrintCollector(_getattr_=_getattr_ or _DataFrameGuard._getattr_)
+  return context.print_collector
 
 def get_captured_print_output():
-  """Get the accumulated print output from the PrintCollector"""
-  global _print_collector
-  if _print_collector is not None:
-    return _print_collector()
+  """Get the accumulated print output of the current execution"""
+  context = _current_sandbox_context.get()
+  if context is not None and context.print_collector is not None:
+    return context.print_collector()
   return ""
 
 def clear_captured_print_output():
-  """Clear the accumulated print output by creating a new PrintCollector"""
-  global _print_collector
-  _print_collector = PrintCollector(_getattr_=_DataFrameGuard._getattr_)
+  """Clear the accumulated print output of the current execution"""
+  context = _current_sandbox_context.get()
+  if context is not None:
+    context.print_collector = None
+
+
+def _from_snapshot(user_id: int, key: str, loader):
+  """Serve dataset ``key`` from the active request snapshot (loading it once), or call ``loader`` when none is active"""
+  snapshot = get_current_snapshot(user_id)
+  if snapshot is None:
+    return loader()
+  return snapshot.get(key, loader)
 
 
 def retrieve_depository_accounts(user_id: int = 1):
   """Internal function to retrieve depository accounts - available to executed code"""
-  return retrieve_depository_accounts_function_code_gen(user_id)
+  return _from_snapshot(user_id, "depository_accounts", lambda: retrieve_depository_accounts_function_code_gen(user_id))
 
 
 def retrieve_credit_accounts(user_id: int = 1):
   """Internal function to retrieve credit accounts - available to executed code"""
-  return retrieve_credit_accounts_function_code_gen(user_id)
+  return _from_snapshot(user_id, "credit_accounts", lambda: retrieve_credit_accounts_function_code_gen(user_id))
+
+
+def _transactions_from_snapshot(user_id: int, key: str, loader, start_date, end_date):
+  """Transactions dataset ``key`` within an inclusive window, through the active request snapshot.
 
+  The window is cut in memory when the snapshot already holds the full history (or no window is given);
+  otherwise only the window is read from SQL, once per (dataset, window). ``loader(start_date, end_date)``
+  reads from the database.
+  """
+  snapshot = get_current_snapshot(user_id)
+  if snapshot is None:
+    return loader(start_date, end_date)
+  if (start_date is None and end_date is None) or snapshot.is_loaded(key):
+    df = snapshot.get(key, lambda: loader(None, None))
+    return transactions_within_window(df, start_date, end_date)
+  start = pd.Timestamp(start_date).date() if start_date is not None else ""
+  end = pd.Timestamp(end_date).date() if end_date is not None else ""
+  return snapshot.get(f"{key}:{start}..{end}", lambda: loader(start_date, end_date))
 
-def retrieve_income_transactions(user_id: int = 1):
-  """Internal function to retrieve income transactions - available to executed code"""
-  return retrieve_income_transactions_function_code_gen(user_id)
 
+def retrieve_income_transactions(user_id: int = 1, start_date=None, end_date=None):
+  """Internal function to retrieve income transactions, optionally within an inclusive date window - available to executed code"""
+  return _transactions_from_snapshot(
+    user_id, "income_transactions",
+    lambda start, end: retrieve_income_transactions_function_code_gen(user_id, start_date=start, end_date=end),
+    start_date, end_date,
+  )
 
-def retrieve_spending_transactions(user_id: int = 1):
-  """Internal function to retrieve spending transactions - available to executed code"""
-  return retrieve_spending_transactions_function_code_gen(user_id)
+
+def retrieve_spending_transactions(user_id: int = 1, start_date=None, end_date=None):
+  """Internal function to retrieve spending transactions, optionally within an inclusive date window - available to executed code"""
+  return _transactions_from_snapshot(
+    user_id, "spending_transactions",
+    lambda start, end: retrieve_spending_transactions_function_code_gen(user_id, start_date=start, end_date=end),
+    start_date, end_date,
+  )
 
 
 def retrieve_spending_forecasts(user_id: int = 1, granularity: str = 'monthly'):
   """Internal function to retrieve spending forecasts - available to executed code"""
-  return retrieve_spending_forecasts_function_code_gen(user_id, granularity)
+  return _from_snapshot(user_id, f"spending_forecasts:{granularity}", lambda: retrieve_spending_forecasts_function_code_gen(user_id, granularity))
 
 
 def retrieve_income_forecasts(user_id: int = 1, granularity: str = 'monthly'):
   """Internal function to retrieve income forecasts - available to executed code"""
-  return retrieve_income_forecasts_function_code_gen(user_id, granularity)
+  return _from_snapshot(user_id, f"income_forecasts:{granularity}", lambda: retrieve_income_forecasts_function_code_gen(user_id, granularity))
 
 
 def retrieve_subscriptions(user_id: int = 1):
   """Internal function to retrieve subscriptions - available to executed code"""
-  return retrieve_subscriptions_function_code_gen(user_id)
+  return _from_snapshot(user_id, "subscriptions", lambda: retrieve_subscriptions_function_code_gen(user_id))
+
+
+_RETRIEVAL_TOOLS = frozenset({
+  "retrieve_depository_accounts",
+  "retrieve_credit_accounts",
+  "retrieve_income_transactions",
+  "retrieve_spending_transactions",
+  "retrieve_spending_forecasts",
+  "retrieve_income_forecasts",
+  "retrieve_subscriptions",
+})
+
+
+def _retrieval_datasets(code_str: str, user_id: int) -> dict:
+  """Loaders of the datasets ``code_str`` retrieves, by snapshot key"""
+  return _dataset_loaders(retrieval_calls(code_str, _RETRIEVAL_TOOLS), user_id)
+
+
+def _dataset_loaders(calls, user_id: int) -> dict:
+  """Loaders for ``(tool, granularity)`` retrieval calls, by snapshot key (same keys as the retrieve_* functions above)"""
+  datasets = {}
+  for tool, granularity in calls:
+    if tool == "retrieve_depository_accounts":
+      datasets["depository_accounts"] = partial(retrieve_depository_accounts_function_code_gen, user_id)
+    elif tool == "retrieve_credit_accounts":
+      datasets["credit_accounts"] = partial(retrieve_credit_accounts_function_code_gen, user_id)
+    elif tool == "retrieve_income_transactions":
+      datasets["income_transactions"] = partial(retrieve_income_transactions_function_code_gen, user_id)
+    elif tool == "retrieve_spending_transactions":
+      datasets["spending_transactions"] = partial(retrieve_spending_transactions_function_code_gen, user_id)
+    elif tool == "retrieve_spending_forecasts":
+      datasets[f"spending_forecasts:{granularity}"] = partial(retrieve_spending_forecasts_function_code_gen, user_id, granularity)
+    elif tool == "retrieve_income_forecasts":
+      datasets[f"income_forecasts:{granularity}"] = partial(retrieve_income_forecasts_function_code_gen, user_id, granularity)
+    elif tool == "retrieve_subscriptions":
+      datasets["subscriptions"] = partial(retrieve_subscriptions_function_code_gen, user_id)
+  return datasets
+
+
+def _prefetch_datasets(code_str: str, user_id: int) -> None:
+  """Load the datasets ``code_str`` retrieves into the active snapshot"""
+  snapshot = get_current_snapshot(user_id)
+  if snapshot is None:
+    return
+  prefetch_into_snapshot(snapshot, _retrieval_datasets(code_str, user_id))
 
 
 def _create_restricted_process_input(code_str: str, user_id: int = 1, additional_namespace: dict = None) -> callable:
@@ -613,15 +876,15 @@ def _create_restricted_process_input(code_str: str, user_id: int = 1, additional
     user_id: User ID for sandbox execution
     additional_namespace: Optional dictionary of additional functions/variables to add to the namespace
   """    
-  # Compile the code with restrictions
-  byte_code = compile_restricted(
+  # Compile the code with restrictions (byte-identical code reuses its cached code object)
+  byte_code = compile_restricted_cached(
     code_str,
     filename="<inline>",
     mode="exec"
   )
   # Create namespace for execution
   safe_locals = {}
-  safe_globals = _get_safe_globals(user_id=user_id, use_full_datetime=_check_code_for_full_datetime(code_str))
+  safe_globals = _get_safe_globals(use_full_datetime=_check_code_for_full_datetime(code_str))
   # Add additional namespace items if provided
   if additional_namespace:
     safe_globals.update(additional_namespace)
@@ -656,6 +919,8 @@ def _run_sandbox_process_input(code_str: str, user_id: int, additional_namespace
     
   # If the function was created successfully, run it
   if success is None:
+    # Load the datasets the program retrieves concurrently, now that it compiled and before it runs
+    _prefetch_datasets(code_str, user_id)
     # Run the function - if it fails, capture logs before exception propagates
     try:
       result = restricted_func()
@@ -684,17 +949,8 @@ def _run_sandbox_process_input(code_str: str, user_id: int, additional_namespace
   
   return success, output_string, captured_logs, goals_list
 
-# Function to process DataFrame
-def execute_agent_with_tools(code_str: str, user_id: int, additional_namespace: dict = None) -> Tuple[bool, str, str, Optional[list]]:
-  """
-  Extract Python code from generated response and execute it in restricted Python sandbox
-  Returns: (success, output_string, logs, goals_list)
-  
-  Args:
-    code_str: The generated response containing Python code
-    user_id: User ID for sandbox execution
-    additional_namespace: Optional dictionary of additional functions/variables to add to the namespace
-  """
+def extract_sandboxed_code(code_str: str) -> str:
+  """Python code of a generated response (the ```python block when present)"""
   # Extract Python code from the response (look for ```python blocks)
   code_start = code_str.find("```python")
   if code_start != -1:
@@ -710,22 +966,152 @@ def execute_agent_with_tools(code_str: str, user_id: int, additional_namespace:
     sandboxed_code = code_str.strip()
   
   # Preprocess the code to replace _print_ with print (if needed)
-  sandboxed_code = sandboxed_code.replace('_print_', 'print')
+  return sandboxed_code.replace('_print_', 'print')
+
+
+# Function to process DataFrame
+def execute_agent_with_tools(code_str: str, user_id: int, additional_namespace: dict = None, profile: Optional[list] = None) -> Tuple[bool, str, str, Optional[list]]:
+  """
+  Extract Python code from generated response and execute it in restricted Python sandbox
+  Returns: (success, output_string, logs, goals_list)
   
-  return _run_sandbox_process_input(sandboxed_code, user_id, additional_namespace)
+  Args:
+    code_str: The generated response containing Python code
+    user_id: User ID for sandbox execution
+    additional_namespace: Optional dictionary of additional functions/variables to add to the namespace
+      (must be picklable when PENNY_SANDBOX_EXECUTOR=process)
+    profile: Optional list that receives one entry per tool call (tool, args, wall_ms, rows_in, rows_out, ...); on a
+      result-cache hit, a cache-hit entry and the stored entries marked cached
+  """
+  sandboxed_code = extract_sandboxed_code(code_str)
+  run = partial(_execute_agent_code, sandboxed_code, user_id, additional_namespace, profile)
+  if additional_namespace:
+    # Namespace functions cannot be part of a result cache key
+    return run()
+  return cached_sandbox_result("agent", sandboxed_code, user_id, run, profile)
+
+
+def _execute_agent_code(sandboxed_code: str, user_id: int, additional_namespace: Optional[dict], profile: Optional[list]) -> Tuple[bool, str, str, Optional[list]]:
+  if process_pool_enabled():
+    return get_sandbox_pool().run_agent(sandboxed_code, user_id, additional_namespace, profile)
+  # Retrieval tools called during this run share one load per dataset
+  with user_data_snapshot(user_id), sandbox_context(user_id, profile):
+    return _run_sandbox_process_input(sandboxed_code, user_id, additional_namespace)
+
+
+class StreamingExecution:
+  """
+  Execute generated code while the model is still streaming its response
+  Pass each streamed text chunk to ``feed``. Datasets are prefetched into a snapshot as soon as their retrieve_*
+  calls appear, and ``feed`` returns True once the ```python block is closed, so ``execute`` can run without
+  waiting for trailing tokens. Nothing is prefetched with the process pool enabled (workers load their own data).
+  """
+
+  def __init__(self, user_id: int, profile: Optional[list] = None):
+    self.user_id = user_id
+    self.profile = profile
+    self.text = ""
+    self.code_complete = False
+    self.snapshot = None if process_pool_enabled() else UserDataSnapshot(user_id)
+    self._requested = set()
+
+  def feed(self, chunk: str) -> bool:
+    """Append ``chunk`` of the response; True once the code block is complete (later chunks are ignored)"""
+    if self.code_complete:
+      return True
+    self.text += chunk
+    code_start = self.text.find("```python")
+    # Without a fence the whole response is code, which is only complete when the stream ends
+    code = self.text[code_start + len("```python"):] if code_start != -1 else self.text
+    code_end = code.find("```") if code_start != -1 else -1
+    if code_end != -1:
+      code = code[:code_end]
+      self.text = self.text[:code_start + len("```python") + code_end + len("```")]
+      self.code_complete = True
+    if self.snapshot is not None:
+      calls = streamed_retrieval_calls(code, _RETRIEVAL_TOOLS) - self._requested
+      if calls:
+        self._requested |= calls
+        start_prefetch(self.snapshot, _dataset_loaders(calls, self.user_id))
+    return self.code_complete
+
+  def execute(self) -> Tuple[bool, str, str, Optional[list]]:
+    """``execute_agent_with_tools`` on the response received so far, using the prefetched snapshot"""
+    with user_data_snapshot(self.user_id, self.snapshot):
+      return execute_agent_with_tools(self.text, self.user_id, profile=self.profile)
+
+
+@dataclass
+class SandboxBatchResult:
+  """Outcome of one program of ``execute_batch``: the ``execute_agent_with_tools`` tuple, or the error it raised"""
+  result: Optional[Tuple[bool, str, str, Optional[list]]]
+  error: Optional[str]
+  wall_ms: float
+
+
+def execute_batch(programs: List[str], user_id: int, max_workers: Optional[int] = None, additional_namespace: dict = None, processes: bool = True) -> List[SandboxBatchResult]:
+  """
+  Execute many generated responses for one user against a single snapshot of their data
+  Returns one SandboxBatchResult per program, in order
+
+  Args:
+    programs: Generated responses (or bare code) as passed to execute_agent_with_tools
+    user_id: User ID for sandbox execution
+    max_workers: Programs running at once (default: the pool size, or 4 threads inline)
+    additional_namespace: Optional dictionary of additional functions/variables added to every program's namespace
+    processes: Run on the sandbox process pool (the snapshot is pickled once and sent to each worker once);
+      False runs on threads in this process, which share the snapshot directly
+
+  The datasets any program retrieves are loaded once up front. Each program still gets its own copies, so the
+  snapshot is read-only for them. Results are never taken from or added to the result cache.
+  """
+  codes = [extract_sandboxed_code(program) for program in programs]
+  snapshot = UserDataSnapshot(user_id)
+  datasets = {}
+  for code in codes:
+    datasets.update(_retrieval_datasets(code, user_id))
+  prefetch_into_snapshot(snapshot, datasets)
+  # prefetch_into_snapshot skips a single dataset (or runs without an executor); load what is left here. A failed
+  # load is left for the programs that need the dataset to report on their own retrieval.
+  for key, loader in datasets.items():
+    if not snapshot.is_loaded(key):
+      try:
+        snapshot.prefetch(key, loader)
+      except Exception:
+        pass
+
+  pool = get_sandbox_pool() if processes and not in_sandbox_worker() else None
+  shared = SharedSnapshot.of(snapshot) if pool is not None else None
+  if max_workers is None:
+    max_workers = pool.size if pool is not None else 4
+
+  def run(code: str) -> SandboxBatchResult:
+    start = time.perf_counter()
+    try:
+      if pool is not None:
+        result = pool.run_agent(code, user_id, additional_namespace, shared=shared)
+      else:
+        with user_data_snapshot(user_id, snapshot), sandbox_context(user_id):
+          result = _run_sandbox_process_input(code, user_id, additional_namespace)
+      return SandboxBatchResult(result, None, (time.perf_counter() - start) * 1000)
+    except Exception as e:
+      return SandboxBatchResult(None, f"{type(e).__name__}: {e}", (time.perf_counter() - start) * 1000)
+
+  with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="penny-batch") as executor:
+    return list(executor.map(run, codes))
 
 
 def _create_restricted_process_input_planner(code_str: str, user_id: int = 1) -> callable:
   """Compile and create a restricted function from a string for planner code"""
-  # Compile the code with restrictions
-  byte_code = compile_restricted(
+  # Compile the code with restrictions (byte-identical code reuses its cached code object)
+  byte_code = compile_restricted_cached(
     code_str,
     filename="<inline>",
     mode="exec"
   )
   # Create namespace for execution
   safe_locals = {}
-  safe_globals = _get_safe_globals_planner(user_id=user_id, use_full_datetime=_check_code_for_full_datetime(code_str))
+  safe_globals = _get_safe_globals_planner(use_full_datetime=_check_code_for_full_datetime(code_str))
   # Execute the compiled code in restricted environment
   exec(byte_code, safe_globals, safe_locals)
   # Return the compiled function
@@ -753,6 +1139,8 @@ def _run_sandbox_process_input_planner(code_str: str, user_id: int) -> tuple[boo
     
   # If the function was created successfully, run it
   if success is None:
+    # Load the datasets the program retrieves concurrently, now that it compiled and before it runs
+    _prefetch_datasets(code_str, user_id)
     # Run the function - if it fails, capture logs before exception propagates
     try:
       success, message = restricted_func()
@@ -778,29 +1166,22 @@ def _run_sandbox_process_input_planner(code_str: str, user_id: int) -> tuple[boo
   return success, message, captured_output,captured_logs
 
 
-def execute_planner_with_tools(code_str: str, user_id: int) -> Tuple[bool, str, str, str]:
+def execute_planner_with_tools(code_str: str, user_id: int, profile: Optional[list] = None) -> Tuple[bool, str, str, str]:
   """
   Extract Python code from generated planner response and execute it in restricted Python sandbox
   Returns: (success, message, captured_output, logs)
+  When ``profile`` is a list, it receives one entry per tool (skill) call (marked cached on a result-cache hit).
   """
-  # Extract Python code from the response (look for ```python blocks)
-  code_start = code_str.find("```python")
-  if code_start != -1:
-    code_start += len("```python")
-    code_end = code_str.find("```", code_start)
-    if code_end != -1:
-      sandboxed_code = code_str[code_start:code_end].strip()
-    else:
-      # No closing ``` found, use the entire response as code
-      sandboxed_code = code_str[code_start:].strip()
-  else:
-    # No ```python found, try to use the entire response as code
-    sandboxed_code = code_str.strip()
-  
-  # Preprocess the code to replace _print_ with print (if needed)
-  sandboxed_code = sandboxed_code.replace('_print_', 'print')
-  
-  return _run_sandbox_process_input_planner(sandboxed_code, user_id)
+  sandboxed_code = extract_sandboxed_code(code_str)
+  return cached_sandbox_result("planner", sandboxed_code, user_id, partial(_execute_planner_code, sandboxed_code, user_id, profile), profile)
+
+
+def _execute_planner_code(sandboxed_code: str, user_id: int, profile: Optional[list]) -> Tuple[bool, str, str, str]:
+  if process_pool_enabled():
+    return get_sandbox_pool().run_planner(sandboxed_code, user_id, profile)
+  # Retrieval tools called during this run (including nested agent runs) share one load per dataset
+  with user_data_snapshot(user_id), sandbox_context(user_id, profile):
+    return _run_sandbox_process_input_planner(sandboxed_code, user_id)
 
 
 # Helper functions for agent code
@@ -0,0 +1,390 @@
+"""
+Process-pool executor for sandbox runs.
+With PENNY_SANDBOX_EXECUTOR=process, execute_agent_with_tools and execute_planner_with_tools hand generated code to
+a pool of warm worker processes (forked from a server that has already imported sandbox, pandas and
+penny.tool_funcs) instead of running it in the calling thread. Each run gets a CPU-time budget, a wall-clock
+budget and optionally an address-space limit; a worker that exceeds the wall clock is killed and replaced, and workers are
+recycled after a fixed number of runs. Callers get the same tuples as the inline executor. Runs may carry a
+SharedSnapshot (pickled user data loaded once by the caller), which is sent to each worker at most once.
+
+Settings (environment):
+  PENNY_SANDBOX_EXECUTOR             inline (default) or process
+  PENNY_SANDBOX_WORKERS              worker processes (default: min(4, CPU count))
+  PENNY_SANDBOX_MAX_RUNS_PER_WORKER  runs before a worker is replaced (default 100)
+  PENNY_SANDBOX_MEMORY_MB            RLIMIT_AS per worker in MiB (default 0 = off). This caps virtual address space,
+                                     not RSS: a warm worker's VmSize (/proc/<pid>/status) already includes pandas,
+                                     numpy and per-thread BLAS arenas and grows with the CPU count, so measure it on
+                                     the target host and set the limit well above it (e.g. VmSize + 1024)
+  PENNY_SANDBOX_CPU_SECONDS          CPU seconds per run (default 20; 0 disables)
+  PENNY_SANDBOX_TIMEOUT_SECONDS      wall-clock seconds per agent run (default 30)
+  PENNY_SANDBOX_PLANNER_TIMEOUT_SECONDS  wall-clock seconds per planner run (default 300; planner skills call the LLM)
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+import atexit
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import resource
+import signal
+import threading
+import time
+import traceback
+import uuid
+
+logger = logging.getLogger(__name__)
+
+_AGENT = "agent"
+_PLANNER = "planner"
+
+# Worker reply statuses
+_OK = "ok"
+_LIMIT = "limit"
+_RAISE = "raise"
+
+# True inside pool workers, so nested runs (planner skills executing agent code) stay in the worker
+_IN_WORKER = False
+
+
+@dataclass
+class SandboxLimits:
+  """Resource budgets applied by pool workers (0 disables a budget)"""
+  memory_mb: int = 0
+  cpu_seconds: float = 20.0
+  timeout_seconds: float = 30.0
+  planner_timeout_seconds: float = 300.0
+
+  @classmethod
+  def from_env(cls) -> "SandboxLimits":
+    return cls(
+      memory_mb=int(os.environ.get("PENNY_SANDBOX_MEMORY_MB", cls.memory_mb)),
+      cpu_seconds=float(os.environ.get("PENNY_SANDBOX_CPU_SECONDS", cls.cpu_seconds)),
+      timeout_seconds=float(os.environ.get("PENNY_SANDBOX_TIMEOUT_SECONDS", cls.timeout_seconds)),
+      planner_timeout_seconds=float(os.environ.get("PENNY_SANDBOX_PLANNER_TIMEOUT_SECONDS", cls.planner_timeout_seconds)),
+    )
+
+
+@dataclass(frozen=True)
+class SharedSnapshot:
+  """Pickled frames of a UserDataSnapshot that several runs use read-only (identified by ``token``)"""
+  token: str
+  blob: bytes
+
+  @classmethod
+  def of(cls, snapshot) -> "SharedSnapshot":
+    return cls(uuid.uuid4().hex, pickle.dumps(snapshot.frames(), protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class CPULimitExceeded(BaseException):
+  """Raised in a worker on SIGXCPU; a BaseException so generated ``except Exception`` blocks cannot swallow it"""
+
+
+def in_sandbox_worker() -> bool:
+  """True inside a pool worker process"""
+  return _IN_WORKER
+
+
+def process_pool_enabled() -> bool:
+  """True when sandbox runs should be dispatched to the process pool"""
+  return not in_sandbox_worker() and os.environ.get("PENNY_SANDBOX_EXECUTOR", "inline").lower() == "process"
+
+
+def _on_cpu_limit(signum, frame):
+  raise CPULimitExceeded()
+
+
+def _limit_error(kind: str, message: str, logs: str = "") -> tuple:
+  """Failure tuple in the shape the inline executor returns for ``kind``"""
+  error = f"**Execution Error**: `{message}`"
+  if kind == _PLANNER:
+    return False, None, error, logs
+  return False, error, logs, None
+
+
+def _worker_main(conn, limits: SandboxLimits) -> None:
+  """Worker loop: run requests from ``conn`` until told to stop"""
+  global _IN_WORKER
+  _IN_WORKER = True
+  # Another process may write the database, so frames and results are not kept across runs (the per-run
+  # snapshot still applies; the parent process keeps the result cache)
+  from penny.tool_funcs.dataframe_cache import disable_dataframe_cache
+  from penny.tool_funcs.sandbox_logging import log_capture
+  from penny.tool_funcs.sandbox_result_cache import disable_sandbox_result_cache
+  from penny.tool_funcs.user_data_snapshot import UserDataSnapshot, user_data_snapshot
+  import sandbox
+  disable_dataframe_cache()
+  disable_sandbox_result_cache()
+
+  if limits.memory_mb > 0:
+    limit_bytes = limits.memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+      limit_bytes = min(limit_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, hard))
+  signal.signal(signal.SIGXCPU, _on_cpu_limit)
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+  # Frames of the last shared snapshot, kept while the parent sends runs for the same token
+  shared_token, shared_frames = None, None
+  while True:
+    try:
+      request = conn.recv()
+    except EOFError:
+      return
+    if request is None:
+      return
+    kind, code_str, user_id, additional_namespace, want_profile, shared = request
+    profile = [] if want_profile else None
+    cpu_soft, cpu_hard = resource.getrlimit(resource.RLIMIT_CPU)
+    # Logs of a run cut short by a limit are handed to this capture, so the limit error can report them
+    with log_capture() as run_logs:
+      try:
+        if limits.cpu_seconds > 0:
+          usage = resource.getrusage(resource.RUSAGE_SELF)
+          used = usage.ru_utime + usage.ru_stime
+          soft = int(used + limits.cpu_seconds) + 1
+          if cpu_hard != resource.RLIM_INFINITY:
+            soft = min(soft, cpu_hard)
+          resource.setrlimit(resource.RLIMIT_CPU, (soft, cpu_hard))
+        snapshot = None
+        if shared is not None:
+          token, blob = shared
+          if blob is not None:
+            shared_token, shared_frames = None, None
+            shared_frames, shared_token = pickle.loads(blob), token
+          elif token != shared_token:
+            raise RuntimeError("Shared snapshot was not received by this sandbox worker")
+          snapshot = UserDataSnapshot.from_frames(user_id, shared_frames)
+        with user_data_snapshot(user_id, snapshot):
+          if kind == _PLANNER:
+            reply = (_OK, sandbox.execute_planner_with_tools(code_str, user_id, profile))
+          else:
+            reply = (_OK, sandbox.execute_agent_with_tools(code_str, user_id, additional_namespace, profile))
+      except CPULimitExceeded:
+        reply = (_LIMIT, _limit_error(kind, f"Sandbox run exceeded the {limits.cpu_seconds:g}s CPU limit", "\n\n".join(run_logs.messages())))
+      except MemoryError:
+        reply = (_LIMIT, _limit_error(kind, f"Sandbox run exceeded the {limits.memory_mb} MiB memory limit", "\n\n".join(run_logs.messages())))
+      except Exception as e:
+        # The inline executor raises for invalid results; the caller re-raises this
+        reply = (_RAISE, (e, traceback.format_exc()))
+      finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_soft, cpu_hard))
+    try:
+      conn.send((*reply, profile))
+    except Exception as e:
+      # Unpicklable result or exception (e.g. a goals list holding arbitrary objects)
+      conn.send((_RAISE, (RuntimeError(f"Sandbox result could not be returned from the worker: {e}"), ""), profile))
+    if reply[0] == _LIMIT:
+      return
+
+
+@dataclass
+class _Worker:
+  process: Any
+  conn: Any
+  runs: int = 0
+  # Token of the SharedSnapshot this worker already holds
+  snapshot_token: Optional[str] = None
+
+
+@dataclass
+class SandboxPoolStats:
+  runs: int = 0
+  timeouts: int = 0
+  limit_hits: int = 0
+  crashes: int = 0
+  recycled: int = 0
+  wait_seconds: float = 0.0
+
+
+class SandboxProcessPool:
+  """Fixed-size pool of warm sandbox worker processes with per-run limits"""
+
+  def __init__(self, workers: int, max_runs_per_worker: int = 100, limits: Optional[SandboxLimits] = None):
+    self.size = max(1, workers)
+    self.max_runs_per_worker = max_runs_per_worker
+    self.limits = limits or SandboxLimits()
+    self._ctx = self._make_context()
+    self._idle: "queue.Queue[_Worker]" = queue.Queue()
+    self._lock = threading.Lock()
+    self._stats = SandboxPoolStats()
+    self._closed = False
+    # Workers that could not be replaced; each run tries to start them again first
+    self._missing = 0
+    for _ in range(self.size):
+      self._idle.put(self._start_worker())
+
+  @staticmethod
+  def _make_context():
+    # The fork server imports sandbox once and forks warm workers from it, without inheriting Flask's threads
+    if "forkserver" in multiprocessing.get_all_start_methods():
+      ctx = multiprocessing.get_context("forkserver")
+      ctx.set_forkserver_preload(["sandbox"])
+      return ctx
+    return multiprocessing.get_context("spawn")
+
+  def _start_worker(self) -> _Worker:
+    parent_conn, child_conn = self._ctx.Pipe()
+    process = self._ctx.Process(target=_worker_main, args=(child_conn, self.limits), daemon=True, name="penny-sandbox-worker")
+    process.start()
+    child_conn.close()
+    return _Worker(process=process, conn=parent_conn)
+
+  def _replace_worker(self) -> None:
+    """Put a fresh worker in place of a stopped one; when it cannot start, the slot is retried on the next run"""
+    try:
+      worker = self._start_worker()
+    except Exception as e:
+      logger.warning(f"Starting a replacement sandbox worker failed, retrying on the next run: {e}")
+      with self._lock:
+        self._missing += 1
+      return
+    self._idle.put(worker)
+
+  def _restore_workers(self) -> None:
+    """Start the workers missing after failed replacements; raises when the pool has none left to wait for"""
+    with self._lock:
+      missing, self._missing = self._missing, 0
+    for started in range(missing):
+      try:
+        self._idle.put(self._start_worker())
+      except Exception as e:
+        with self._lock:
+          self._missing += missing - started
+          none_left = self._missing >= self.size
+        if none_left:
+          raise RuntimeError(f"Sandbox process pool has no workers: starting one failed: {e}") from e
+        logger.warning(f"Starting a replacement sandbox worker failed, retrying on the next run: {e}")
+        return
+
+  @staticmethod
+  def _stop_worker(worker: _Worker, kill: bool = False) -> None:
+    if not kill:
+      try:
+        worker.conn.send(None)
+      except (OSError, ValueError):
+        kill = True
+    if kill and worker.process.is_alive():
+      worker.process.kill()
+    worker.process.join(timeout=5)
+    worker.conn.close()
+
+  def run_agent(self, code_str: str, user_id: int, additional_namespace: dict = None, profile: Optional[list] = None, shared: Optional[SharedSnapshot] = None) -> Tuple[bool, str, str, Optional[list]]:
+    """``execute_agent_with_tools`` in a worker; ``additional_namespace`` must be picklable"""
+    return self._run(_AGENT, code_str, user_id, additional_namespace, profile, self.limits.timeout_seconds, shared)
+
+  def run_planner(self, code_str: str, user_id: int, profile: Optional[list] = None, shared: Optional[SharedSnapshot] = None) -> Tuple[bool, str, str, str]:
+    """``execute_planner_with_tools`` in a worker"""
+    return self._run(_PLANNER, code_str, user_id, None, profile, self.limits.planner_timeout_seconds, shared)
+
+  def _run(self, kind: str, code_str: str, user_id: int, additional_namespace: Optional[dict], profile: Optional[list], timeout: float, shared: Optional[SharedSnapshot] = None) -> tuple:
+    if self._closed:
+      raise RuntimeError("Sandbox process pool is shut down")
+    if self._missing:
+      self._restore_workers()
+    wait_start = time.perf_counter()
+    worker = self._idle.get()
+    with self._lock:
+      self._stats.wait_seconds += time.perf_counter() - wait_start
+      self._stats.runs += 1
+    shared_request = None
+    if shared is not None:
+      shared_request = (shared.token, None if worker.snapshot_token == shared.token else shared.blob)
+    try:
+      worker.conn.send((kind, code_str, user_id, additional_namespace, profile is not None, shared_request))
+    except (EOFError, OSError):
+      return self._replace_after_crash(worker, kind)
+    except Exception:
+      # Unpicklable additional_namespace; the worker never saw the request
+      self._idle.put(worker)
+      raise
+    worker.runs += 1
+    try:
+      if not worker.conn.poll(timeout):
+        self._stop_worker(worker, kill=True)
+        self._replace_worker()
+        with self._lock:
+          self._stats.timeouts += 1
+        return _limit_error(kind, f"Sandbox run exceeded the {timeout:g}s wall-clock limit")
+      status, payload, worker_profile = worker.conn.recv()
+    except (EOFError, OSError):
+      return self._replace_after_crash(worker, kind)
+    if shared is not None:
+      # A raising run may not have loaded the snapshot, so it is sent again next time
+      worker.snapshot_token = shared.token if status == _OK else None
+
+    if status == _LIMIT:
+      with self._lock:
+        self._stats.limit_hits += 1
+      self._stop_worker(worker)
+      self._replace_worker()
+    elif worker.runs >= self.max_runs_per_worker:
+      with self._lock:
+        self._stats.recycled += 1
+      self._stop_worker(worker)
+      self._replace_worker()
+    else:
+      self._idle.put(worker)
+
+    if profile is not None and worker_profile:
+      profile.extend(worker_profile)
+    if status == _RAISE:
+      error, worker_traceback = payload
+      raise error from RuntimeError(f"Raised in sandbox worker:\n{worker_traceback}")
+    return payload
+
+  def _replace_after_crash(self, worker: _Worker, kind: str) -> tuple:
+    self._stop_worker(worker, kill=True)
+    self._replace_worker()
+    with self._lock:
+      self._stats.crashes += 1
+    return _limit_error(kind, f"Sandbox worker exited unexpectedly (exit code {worker.process.exitcode})")
+
+  def stats(self) -> Dict[str, Any]:
+    with self._lock:
+      return {
+        'workers': self.size,
+        'idle_workers': self._idle.qsize(),
+        'missing_workers': self._missing,
+        'runs': self._stats.runs,
+        'timeouts': self._stats.timeouts,
+        'limit_hits': self._stats.limit_hits,
+        'crashes': self._stats.crashes,
+        'recycled': self._stats.recycled,
+        'wait_ms_total': self._stats.wait_seconds * 1000,
+      }
+
+  def shutdown(self) -> None:
+    self._closed = True
+    while True:
+      try:
+        worker = self._idle.get_nowait()
+      except queue.Empty:
+        return
+      self._stop_worker(worker)
+
+
+_POOL: Optional[SandboxProcessPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxProcessPool:
+  """Process-wide pool, started on first use"""
+  global _POOL
+  with _POOL_LOCK:
+    if _POOL is None:
+      _POOL = SandboxProcessPool(
+        workers=int(os.environ.get("PENNY_SANDBOX_WORKERS", min(4, os.cpu_count() or 1))),
+        max_runs_per_worker=int(os.environ.get("PENNY_SANDBOX_MAX_RUNS_PER_WORKER", 100)),
+        limits=SandboxLimits.from_env(),
+      )
+      atexit.register(_POOL.shutdown)
+    return _POOL
+
+
+def get_sandbox_pool_stats() -> Optional[Dict[str, Any]]:
+  """Counters of the process-wide pool, or None when it has not been started"""
+  return _POOL.stats() if _POOL is not None else None
@@ -3,7 +3,6 @@ import sys
 from typing import List
 from database import Database
 from .task import Task, Outcome
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 import sys
@@ -16,6 +15,8 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
   sys.path.insert(0, parent_dir)
 
+from penny.tool_funcs.genai_clients import get_genai_client
+
 load_dotenv()
 
 class StrategizerEngine:
@@ -30,7 +31,7 @@ class StrategizerEngine:
         api_key = os.getenv('GEMINI_API_KEY')
         if not api_key:
             raise ValueError("GEMINI_API_KEY environment variable is not set.")
-        self.client = genai.Client(api_key=api_key)
+        self.client = get_genai_client(api_key)
         self.thinking_budget = 4096
         
         self.safety_settings = [
@@ -414,7 +414,12 @@ def render_chat_interface():
           with col4:
             if timing.get("gemini_api_calls"):
               total_gemini_time = sum(call["duration_ms"] for call in timing["gemini_api_calls"])
-              st.metric("Gemini API", f"{total_gemini_time:.1f}ms")
+              streaming_help = None
+              if timing.get("time_to_first_token_ms") is not None:
+                streaming_help = f"First token after {timing['time_to_first_token_ms']:.1f}ms, code complete after {timing['time_to_code_complete_ms']:.1f}ms"
+              st.metric("Gemini API", f"{total_gemini_time:.1f}ms", help=streaming_help)
+            elif timing.get("code_cache", {}).get("hit"):
+              st.metric("Gemini API", "cached", help=f"Reused the program generated for \"{timing['code_cache']['request']}\"")
             else:
               st.metric("Gemini API", "")      
         
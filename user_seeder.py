@@ -3,7 +3,7 @@ import os
 import random
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-from database import Database, default_chatbot_db_path, _transaction_date_to_iso
+from database import Database, default_chatbot_db_path, reset_connection_pool, _transaction_date_to_iso
 
 # Global transaction ID counters to ensure uniqueness across all users
 _transaction_id_counter = 10000
@@ -19,10 +19,16 @@ def reset_database(db_path=None):
   if db_path is None:
     db_path = default_chatbot_db_path()
 
-  # Remove existing database file
+  # Drop pooled connections before the file goes away so later reads reconnect to the new file
+  reset_connection_pool(db_path)
+
+  # Remove existing database file (and its WAL sidecars)
   if os.path.exists(db_path):
     os.remove(db_path)
     print(f"Removed existing database: {db_path}")
+  for sidecar_path in (f"{db_path}-wal", f"{db_path}-shm"):
+    if os.path.exists(sidecar_path):
+      os.remove(sidecar_path)
   
   # Reset transaction ID counters
   _transaction_id_counter = 10000